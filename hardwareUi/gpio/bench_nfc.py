@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Scan-cycle benchmark for the RC522 bridge
+
+Drives MultiReader in-process (and optionally the bridge's stdio protocol) and
+writes the numbers as JSON so runs can be compared between versions:
+
+  python3 bench_nfc.py                                  # emulated cabinet (rc522_sim)
+  python3 bench_nfc.py --backend hw --scenarios as-is   # on the cabinet, tags as placed
+  python3 bench_nfc.py --backend replay --trace cabinet.nfct.gz --scenarios as-is
+  python3 bench_nfc.py --out after.json --compare before.json
+
+Per scenario:
+  sweep        full scan of every slot: ms p50/p95/max
+  read         single read_uid per slot: ms p50/p95/p99, SPI frames and CPU ms per
+               read, split by occupied/empty slots
+  retries      extra read attempts per read; settle ms and its share of read time
+  roundtrip    (--protocol) spawn -> "ready" and spawn -> first read reply, then
+               bridge "read" request -> reply over stdin/stdout
+
+Scenarios (the emulator places the tags; on hardware only "as-is" makes sense):
+  empty, full, half (odd slots), noisy (full, 5% RF errors), churn (tags move
+  between sweeps), as-is (leave the cabinet alone).
+
+The bench uses a throwaway clock profile unless --clock-profile is given, and no
+self-test cache, so it neither reads nor disturbs the kiosk's per-slot state.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Optional
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCENARIOS = ("empty", "full", "half", "noisy", "churn", "as-is")
+SIM_ONLY = frozenset(SCENARIOS) - {"as-is"}
+
+
+def _uid_for(slot: int) -> str:
+    return f"04{slot:02X}B2C3"
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile, None for no samples."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100.0 * len(ordered) + 0.5)) - 1))
+    return round(ordered[rank], 3)
+
+
+def _dist(values: list[float]) -> dict:
+    if not values:
+        return {"n": 0}
+    return {
+        "n": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(max(values), 3),
+    }
+
+
+def _load_bridge(args):
+    """Import nfc_rc522_bridge with the backend selected through its environment."""
+    os.environ["NFC_BACKEND"] = args.backend
+    os.environ["NFC_METRICS_TEXTFILE"] = ""
+    os.environ["NFC_CLOCK_PROFILE"] = args.clock_profile
+    os.environ["NFC_SELFTEST_CACHE"] = ""  # start from a live self-test, leave the real cache alone
+    if args.backend == "sim" and args.sim_script:
+        os.environ["NFC_SIM_SCRIPT"] = args.sim_script
+    if args.backend == "replay":
+        os.environ["NFC_REPLAY_TRACE"] = args.trace
+        os.environ.setdefault("NFC_REPLAY_SPEED", "1.0")
+    sys.path.insert(0, HERE)
+    import nfc_rc522_bridge as bridge
+    return bridge
+
+
+def _set_occupancy(cabinet, slots: list[int], scenario: str, sweep: int = 0) -> None:
+    if cabinet is None:
+        return
+    cabinet.noise = 0.05 if scenario == "noisy" else 0.0
+    for slot in slots:
+        if scenario in ("full", "noisy"):
+            occupied = True
+        elif scenario == "half":
+            occupied = slot % 2 == 1
+        elif scenario == "churn":
+            occupied = (slot + sweep) % 3 == 0  # a third of the slots change every sweep
+        else:
+            occupied = False
+        cabinet.place(slot, _uid_for(slot) if occupied else None)
+
+
+def _bench_scenario(bridge, mr, cabinet, scenario: str, sweeps: int, reads: int) -> dict:
+    slots = sorted(mr.rst_lines)
+    mr.metrics = bridge.Metrics(mr.rst_lines)
+    _set_occupancy(cabinet, slots, scenario)
+    mr.scan(slots)  # warm up: clock profile, chip configuration
+
+    sweep_ms = []
+    for i in range(sweeps):
+        _set_occupancy(cabinet, slots, scenario, sweep=i)
+        t0 = time.perf_counter()
+        mr.scan(slots)
+        sweep_ms.append((time.perf_counter() - t0) * 1000)
+
+    _set_occupancy(cabinet, slots, scenario)
+    mr.metrics = bridge.Metrics(mr.rst_lines)
+    read_ms: dict[str, list[float]] = {"all": [], "occupied": [], "empty": []}
+    frames: dict[str, list[int]] = {"all": [], "occupied": [], "empty": []}
+    cpu_ms: list[float] = []
+    for _ in range(reads):
+        for slot in slots:
+            bus = mr.slot_bus[slot]
+            x0 = bus.rc522.xfers
+            c0 = time.thread_time()
+            t0 = time.perf_counter()
+            uid = mr.read_uid(slot)
+            ms = (time.perf_counter() - t0) * 1000
+            cpu_ms.append((time.thread_time() - c0) * 1000)
+            kind = "occupied" if uid else "empty"
+            for key in ("all", kind):
+                read_ms[key].append(ms)
+                frames[key].append(bus.rc522.xfers - x0)
+
+    snap = mr.metrics.snapshot(slots, mr.clock, mr.breaker)["slots"]
+    n_reads = sum(sum(s["reads"].values()) for s in snap.values())
+    retries = sum(s["retries"] for s in snap.values())
+    settle_total = sum(s["settle_ms"].get("avg", 0) * s["settle_ms"]["count"] for s in snap.values())
+    read_total = sum(read_ms["all"])
+    return {
+        "sweep_ms": _dist(sweep_ms),
+        "read_ms": {k: _dist(v) for k, v in read_ms.items()},
+        "spi_frames_per_read": {k: round(sum(v) / len(v), 2) if v else None for k, v in frames.items()},
+        "cpu_ms_per_read": _dist(cpu_ms),
+        "retries_per_read": round(retries / n_reads, 3) if n_reads else None,
+        "settle_ms_per_read": round(settle_total / n_reads, 3) if n_reads else None,
+        "settle_share": round(settle_total / read_total, 3) if read_total else None,
+        "faults": {name: sum(s[name] for s in snap.values()) for name in ("timeouts", "err_reg", "bcc_errors")},
+        "slot_hz": {slot: s["hz"] for slot, s in snap.items()},
+    }
+
+
+def _bench_roundtrip(args, requests: int) -> dict:
+    """Time startup and "read" requests through a spawned bridge (stdin/stdout JSONL)."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [HERE, os.environ.get("PYTHONPATH")])))
+    t_spawn = time.perf_counter()
+    # Spawned the way hardware.js does it
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "nfc_rc522_bridge"],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env,
+    )
+    try:
+        def call(req: dict) -> dict:
+            proc.stdin.write((json.dumps(req) + "\n").encode())
+            proc.stdin.flush()
+            while True:
+                line = proc.stdout.readline()
+                if not line:
+                    raise RuntimeError("bridge exited")
+                msg = json.loads(line)
+                if msg.get("id") == req["id"]:
+                    return msg
+
+        line = proc.stdout.readline()
+        if not line or json.loads(line).get("event") != "ready":
+            raise RuntimeError("bridge did not announce ready")
+        ready = json.loads(line)
+        ready_ms = (time.perf_counter() - t_spawn) * 1000
+        call({"id": 0, "cmd": "read", "slot": 1})
+        first_read_ms = (time.perf_counter() - t_spawn) * 1000
+        ms = []
+        for i in range(requests):
+            slot = i % 10 + 1
+            t0 = time.perf_counter()
+            call({"id": i + 1, "cmd": "read", "slot": slot, "max_age_ms": 0})
+            ms.append((time.perf_counter() - t0) * 1000)
+        return {"startup_ms": round(ready_ms, 1), "first_read_ms": round(first_read_ms, 1),
+                "bridge_startup_ms": ready["startup_ms"], "read_ms": _dist(ms)}
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=10)
+
+
+def _flatten(prefix: str, value, out: dict) -> None:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else str(k), v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = value
+
+
+def compare(old: dict, new: dict) -> list[str]:
+    """Lines "metric: old -> new (+x%)" for every number present in both runs."""
+    a: dict = {}
+    b: dict = {}
+    _flatten("", old.get("scenarios", {}), a)
+    _flatten("", new.get("scenarios", {}), b)
+    lines = []
+    for key in sorted(a.keys() & b.keys()):
+        if ".slot_hz." in key or key.endswith(".n"):
+            continue
+        before, after = a[key], b[key]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{key}: {before} -> {after} ({change})")
+    return lines
+
+
+def _git_describe() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "describe", "--always", "--dirty"], cwd=HERE,
+                             capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the RC522 bridge scan cycle")
+    parser.add_argument("--backend", choices=("sim", "hw", "replay"), default="sim")
+    parser.add_argument("--scenarios", default=None,
+                        help=f"comma-separated subset of {','.join(SCENARIOS)} (default: all the backend supports)")
+    parser.add_argument("--sweeps", type=int, default=20, help="full sweeps per scenario")
+    parser.add_argument("--reads", type=int, default=10, help="single reads per slot per scenario")
+    parser.add_argument("--protocol", type=int, default=0, metavar="N",
+                        help="also time N read requests through a spawned bridge")
+    parser.add_argument("--sim-script", help="NFC_SIM_SCRIPT for the emulator (latency, chip kinds, ...)")
+    parser.add_argument("--trace", help="trace file for --backend replay")
+    parser.add_argument("--clock-profile", default=None, help="SPI clock profile to use (default: a temp file)")
+    parser.add_argument("--out", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", metavar="JSON", help="earlier result to diff against")
+    args = parser.parse_args(argv)
+
+    if args.backend == "replay" and not args.trace:
+        parser.error("--backend replay needs --trace")
+    if args.scenarios:
+        scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+        unknown = [s for s in scenarios if s not in SCENARIOS]
+        if unknown:
+            parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+    else:
+        scenarios = list(SCENARIOS) if args.backend == "sim" else ["as-is"]
+    if args.backend != "sim" and set(scenarios) & SIM_ONLY:
+        parser.error("only the 'as-is' scenario works without the emulator")
+
+    tmp_profile = None
+    if args.clock_profile is None:
+        fd, tmp_profile = tempfile.mkstemp(prefix="kms_nfc_bench_clock_", suffix=".json")
+        os.close(fd)
+        os.unlink(tmp_profile)
+        args.clock_profile = tmp_profile
+
+    bridge = _load_bridge(args)
+    mr = bridge.MultiReader()
+    mr.refresh_selftest()  # what the bridge does in the background after "ready"
+    cabinet = getattr(bridge.lgpio, "cabinet", None)
+    result = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git": _git_describe(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "backend": args.backend,
+        "slots": len(mr.rst_lines),
+        "buses": [b.name for b in mr.buses],
+        "config": {"sweeps": args.sweeps, "reads": args.reads, "sim_script": args.sim_script, "trace": args.trace},
+        "scenarios": {},
+    }
+    try:
+        for scenario in scenarios:
+            print(f"[bench] {scenario} ...", file=sys.stderr, flush=True)
+            result["scenarios"][scenario] = _bench_scenario(bridge, mr, cabinet, scenario, args.sweeps, args.reads)
+    finally:
+        mr.close()
+    if args.protocol:
+        # The in-process reader is closed: the spawned bridge owns the bus now
+        # (with the emulator it gets its own cabinet, as laid out by --sim-script)
+        print("[bench] protocol round-trip ...", file=sys.stderr, flush=True)
+        result["roundtrip"] = _bench_roundtrip(args, args.protocol)
+    if tmp_profile and os.path.exists(tmp_profile):
+        os.unlink(tmp_profile)
+
+    text = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+        print(f"[bench] wrote {args.out}", file=sys.stderr)
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        print(f"[bench] compared with {args.compare} ({old.get('git') or old.get('timestamp')}):", file=sys.stderr)
+        for line in compare(old, result):
+            print("  " + line, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,6 +3,8 @@
 Test RC522 using hardware CE0 (Pin 24) + RST GPIO activation.
 Usage: sudo python3 diag_hw_cs.py [slot]
   slot = 1-10 (default: 1), controls which RST GPIO to activate
+If the NFC bridge is running (socket: NFC_SOCKET or /tmp/kms_nfc_bridge.sock),
+the version read and card detection go through it instead of the bus.
 """
 import sys, spidev, time
 
@@ -25,6 +27,38 @@ print("  RC522 Test — CE0 (Pin 24) + RST per reader")
 print(f"  Slot: {slot}  RST GPIO: {rst_pin}  SPI: /dev/spidev0.0")
 print("=" * 55)
 
+# --- A running bridge owns the bus: test through it instead of toggling RST ---
+from nfc_rc522_bridge import bridge_request
+
+if bridge_request({"cmd": "ping"}) is not None:
+    print(f"\n{INFO} NFC bridge กำลังทำงาน — ทดสอบ slot {slot} ผ่าน bridge (ไม่ต้องหยุด kiosk)")
+    print("\n--- Test 1: Read VersionReg ---")
+    reply = bridge_request({"cmd": "version", "slot": slot})
+    if not reply.get("ok"):
+        print(f"  {FAIL} {reply.get('error')}")
+    elif int(reply["version"], 16) in (0x00, 0xFF):
+        print(f"\n  {FAIL} Version={reply['version']} — RC522 ไม่ตอบ")
+    else:
+        print(f"  {PASS} RC522 ตอบ! Version={reply['version']} ({reply['kind']})")
+        print("\n--- Test 2: Card Detection ---")
+        print("  กรุณาวางบัตร NFC ไว้บน RC522...")
+        for attempt in range(30):
+            reply = bridge_request({"cmd": "read", "slot": slot, "max_age_ms": 0})
+            if reply.get("uid"):
+                print(f"  {PASS} UID = {reply['uid']}")
+                break
+            if not reply.get("ok"):
+                print(f"  {FAIL} {reply.get('error')}")
+            if attempt % 10 == 9:
+                print(f"  ... รอบัตร ({attempt+1}/30) ...")
+            time.sleep(0.3)
+        else:
+            print(f"  ไม่พบบัตร (timeout 30 รอบ)")
+    print("\n" + "=" * 55)
+    print("  Done")
+    print("=" * 55)
+    sys.exit(0)
+
 # --- Activate RST for the target reader ---
 chip = None
 if lgpio and rst_pin is not None:
@@ -2,6 +2,8 @@
 """
 RC522 SPI Diagnostic — ตรวจสอบทีละจุดว่าปัญหาอยู่ตรงไหน
 Usage:  sudo python3 diag_spi.py
+ถ้า NFC bridge กำลังทำงาน (socket: NFC_SOCKET หรือ /tmp/kms_nfc_bridge.sock)
+จะตรวจ reader ผ่าน bridge แทน ไม่แย่ง SPI bus กับ kiosk
 """
 import sys, time, os
 
@@ -11,6 +13,7 @@ WARN = "\033[93m[WARN]\033[0m"
 INFO = "\033[96m[INFO]\033[0m"
 
 CS_PIN = 4        # GPIO4 = Pin 7  (slot 1 CS)
+SLOT = 1          # same reader, as the bridge numbers it
 RST_PIN = 7       # GPIO7 = Pin 26 (CE1 — usually busy)
 SPI_BUS = 0
 SPI_DEV = 0
@@ -20,6 +23,30 @@ def sep(title):
     print(f"  {title}")
     print(f"{'='*50}")
 
+# ──────────────────────────────────────────────
+# Step 0: NFC bridge already running? Ask it instead
+# ──────────────────────────────────────────────
+def step0_bridge():
+    from nfc_rc522_bridge import bridge_request
+    status = bridge_request({"cmd": "status"})
+    if status is None:
+        return None
+    sep(f"Step 0: NFC bridge กำลังทำงาน — ตรวจ slot {SLOT} ผ่าน bridge")
+    print(f"  {INFO} buses={status.get('buses')} quarantined={status.get('quarantined')}")
+    reply = bridge_request({"cmd": "version", "slot": SLOT})
+    if not reply.get("ok"):
+        print(f"  {FAIL} {reply.get('error')}")
+        return False
+    print(f"  {INFO} chip kind: {reply['kind']}")
+    ok = report_version(int(reply["version"], 16))
+    if ok:
+        reply = bridge_request({"cmd": "read", "slot": SLOT, "max_age_ms": 0})
+        print(f"  {INFO} read → {reply.get('uid') or reply.get('error') or 'ไม่มีบัตร'}")
+    print()
+    print(f"  {INFO} Step 1-6 (loopback / register ดิบ) ต้องใช้ SPI bus เอง:")
+    print(f"        หยุด kiosk / bridge ก่อน แล้วรัน script นี้อีกครั้ง")
+    return ok
+
 # ──────────────────────────────────────────────
 # Step 1: Check SPI device exists
 # ──────────────────────────────────────────────
@@ -133,6 +160,9 @@ def step5_read_version(spi, chip, cs_pin):
     lgpio.gpio_write(chip, cs_pin, 1)
 
     print(f"  SPI xfer [0xEE, 0x00] → {[hex(b) for b in result]}")
+    return report_version(ver)
+
+def report_version(ver):
     print(f"  VersionReg = 0x{ver:02X}")
     print()
 
@@ -250,6 +280,13 @@ def main():
     print(f"\n  CS Pin: GPIO{CS_PIN} (Pin 7)")
     print(f"  SPI:    /dev/spidev{SPI_BUS}.{SPI_DEV}")
 
+    # Step 0: a running bridge owns the bus
+    bridge_ok = step0_bridge()
+    if bridge_ok is not None:
+        if not bridge_ok:
+            step7_multimeter_guide()
+        return
+
     # Step 1
     if not step1_spi_device():
         return
@@ -29,12 +29,20 @@ const KEY_PULL_POLL_INTERVAL_MS = 500; // ลดจาก 1000 เหลือ 4
 const KEY_PULL_REQUIRE_SEEN_TAG = true;
 const KEY_PULL_MISS_THRESHOLD = Number(process.env.KEY_PULL_MISS_THRESHOLD || 2); // หายติดกันกี่ครั้งถึงนับว่าดึงออกแล้ว
 const KEY_PULL_SEEN_GRACE_MS = Number(process.env.KEY_PULL_SEEN_GRACE_MS || 2000); // เวลารอให้เห็นแท็กครั้งแรกหลัง unlock
+// watch_removal ของ Python bridge: ต้องหายติดกันกี่ poll และนานอย่างน้อยกี่ ms ถึงนับว่าดึงออก (กัน RF หลุดแวบเดียว)
+const PY_WATCH_MISSES = Number(process.env.PY_WATCH_MISSES || 5);
+const PY_WATCH_ABSENT_MS = Number(process.env.PY_WATCH_ABSENT_MS || 500);
 // Relay module บางรุ่นเป็น Active-LOW (สั่ง LOW แล้วรีเลย์ทำงาน)
 // ตั้งค่าได้ใน gpio/.env: RELAY_ACTIVE_STATE=LOW หรือ HIGH (default HIGH)
 const RELAY_ACTIVE_STATE = (process.env.RELAY_ACTIVE_STATE || 'LOW').toUpperCase();
 const FORCE_PY_NFC = (process.env.FORCE_PY_NFC || '').toLowerCase() === '1';
 const FORCE_ESP8266_NFC = (process.env.FORCE_ESP8266_NFC || '').toLowerCase() === '1';
 const PY_NFC_READ_TIMEOUT_MS = Number(process.env.PY_NFC_READ_TIMEOUT_MS || 250);
+// รอ {"event":"ready"} จาก bridge หลัง spawn (ปกติ ~100-300ms บน Pi; ครั้งแรกหลัง boot อาจช้ากว่า)
+const PY_NFC_READY_TIMEOUT_MS = Number(process.env.PY_NFC_READY_TIMEOUT_MS || 5000);
+const PY_NFC_RESPAWN_DELAY_MS = 1000; // bridge ตาย → spawn ใหม่หลังจากนี้
+// 'jsonl' (default, อ่าน debug ง่าย) | 'bin1' (frame ไบนารี ลด JSON parse ทั้งสองฝั่ง)
+const PY_NFC_FRAMING = (process.env.PY_NFC_FRAMING || 'jsonl').toLowerCase();
 const ESP8266_READ_TIMEOUT_MS = Number(process.env.ESP8266_READ_TIMEOUT_MS || 800); // เพิ่มเป็น 800ms เพื่อความเสถียรลด Timeout หลอก
 
 
@@ -469,40 +477,123 @@ async function reinitAllNfc() {
 // ─────────────────────────────────────────────
 
 let pyProc = null;
-let pyBuffer = '';
+let pyBuffer = Buffer.alloc(0);
 let pyReqId = 0;
+let pyFraming = 'jsonl'; // framing ที่ตกลงกับ bridge แล้ว (ดู hello ใน nfc_rc522_bridge.py)
+let pyFramingGate = null; // Promise ระหว่าง negotiatePyFraming: request อื่นรอจนได้คำตอบ hello
 const pyPending = new Map(); // id -> { resolve, reject, timer }
+let pyReady = null; // Promise<ready event | null> ของ process ปัจจุบัน
+let resolvePyReady = () => {};
+let pySpawnedAt = 0;
+let pyShuttingDown = false;
+let pyPushMode = false; // startNfcPolling เลือก subscribe แล้ว (ต้อง subscribe ใหม่หลัง respawn)
+let pyExpectedSent = null; // slot -> uid ที่ส่งให้ bridge แล้ว (set_expected); null = ยังไม่เคยส่ง
+
+// bin1 frame: u16 LE length | u8 type | payload
+const PY_FRAME_JSON = 0x00;
+const PY_FRAME_READ = 0x01;
+const PY_FRAME_READ_REPLY = 0x81;
+const PY_READ_FLAG_MATCH = 0x10;
+const PY_READ_FLAG_MISMATCH = 0x20;
+
+function encodePyFrame(msg) {
+    if (msg.cmd === 'read') {
+        const buf = Buffer.alloc(10);
+        buf.writeUInt16LE(8, 0);
+        buf.writeUInt8(PY_FRAME_READ, 2);
+        buf.writeUInt32LE(msg.id >>> 0, 3);
+        buf.writeUInt8(msg.slot, 7);
+        buf.writeUInt16LE(Math.min(msg.deadline_ms || 0, 0xffff), 8);
+        return buf;
+    }
+    const body = Buffer.from(JSON.stringify(msg), 'utf8');
+    const head = Buffer.alloc(3);
+    head.writeUInt16LE(body.length + 1, 0);
+    head.writeUInt8(PY_FRAME_JSON, 2);
+    return Buffer.concat([head, body]);
+}
+
+function decodePyFrame(frame) {
+    if (frame[0] === PY_FRAME_READ_REPLY) {
+        const flags = frame.readUInt8(5);
+        const status = flags & 0x0f;
+        const uidLen = frame.readUInt8(6);
+        let match = status === 1 ? 'unknown' : 'empty';
+        if (flags & PY_READ_FLAG_MATCH) match = 'match';
+        else if (flags & PY_READ_FLAG_MISMATCH) match = 'mismatch';
+        return {
+            id: frame.readUInt32LE(1),
+            ok: status !== 2,
+            uid: status === 1 ? frame.subarray(7, 7 + uidLen).toString('hex').toUpperCase() : null,
+            match: status === 2 ? undefined : match,
+            cached: (flags & 0x80) !== 0,
+            expired: status === 2,
+            error: status === 2 ? 'deadline expired' : undefined,
+        };
+    }
+    return JSON.parse(frame.subarray(1).toString('utf8'));
+}
+
+function handlePyMessage(msg) {
+    if (msg.event) {
+        handlePyEvent(msg); // push event จาก subscribe (ไม่มี id)
+        return;
+    }
+    const pending = pyPending.get(msg.id);
+    if (pending) {
+        clearTimeout(pending.timer);
+        pyPending.delete(msg.id);
+        if (msg.ok) pending.resolve(msg);
+        else pending.reject(new Error(msg.error || 'python nfc error'));
+    }
+}
 
 function startPythonNfcBridge() {
     if (pyProc) return true;
 
-    const script = new URL('./nfc_rc522_bridge.py', import.meta.url);
-    pyProc = spawn('python3', [script.pathname], {
+    // -m แทนการรันไฟล์ตรงๆ: module ถูก import ผ่าน __pycache__ ไม่ต้อง compile ใหม่ทุกครั้งที่ spawn
+    const pyPath = [__dirname, process.env.PYTHONPATH].filter(Boolean).join(path.delimiter);
+    pySpawnedAt = Date.now();
+    pyProc = spawn('python3', ['-m', 'nfc_rc522_bridge'], {
         stdio: ['pipe', 'pipe', 'pipe'],
-        env: process.env,
+        env: { ...process.env, PYTHONPATH: pyPath },
     });
 
-    pyProc.stdout.setEncoding('utf8');
+    pyBuffer = Buffer.alloc(0);
+    pyFraming = 'jsonl';
+    pyReady = new Promise((resolve) => { resolvePyReady = resolve; });
     pyProc.stdout.on('data', (chunk) => {
-        pyBuffer += chunk;
+        pyBuffer = pyBuffer.length ? Buffer.concat([pyBuffer, chunk]) : chunk;
         while (true) {
-            const idx = pyBuffer.indexOf('\n');
-            if (idx < 0) break;
-            const line = pyBuffer.slice(0, idx).trim();
-            pyBuffer = pyBuffer.slice(idx + 1);
-            if (!line) continue;
-            try {
-                const msg = JSON.parse(line);
-                const pending = pyPending.get(msg.id);
-                if (pending) {
-                    clearTimeout(pending.timer);
-                    pyPending.delete(msg.id);
-                    if (msg.ok) pending.resolve(msg);
-                    else pending.reject(new Error(msg.error || 'python nfc error'));
+            let msg;
+            if (pyFraming === 'bin1') {
+                if (pyBuffer.length < 2) break;
+                const len = pyBuffer.readUInt16LE(0);
+                if (pyBuffer.length < 2 + len) break;
+                const frame = pyBuffer.subarray(2, 2 + len);
+                pyBuffer = pyBuffer.subarray(2 + len);
+                try {
+                    msg = decodePyFrame(frame);
+                } catch (e) {
+                    console.error('❌ Python NFC bridge frame error:', e.message);
+                    continue;
                 }
-            } catch (e) {
-                console.error('❌ Python NFC bridge parse error:', e.message);
+            } else {
+                const idx = pyBuffer.indexOf(0x0a);
+                if (idx < 0) break;
+                const line = pyBuffer.subarray(0, idx).toString('utf8').trim();
+                pyBuffer = pyBuffer.subarray(idx + 1);
+                if (!line) continue;
+                try {
+                    msg = JSON.parse(line);
+                } catch (e) {
+                    console.error('❌ Python NFC bridge parse error:', e.message);
+                    continue;
+                }
+                // ตอบ hello แล้ว → ข้อมูลถัดจากบรรทัดนี้เป็น framing ใหม่
+                if (msg.ok && msg.framing) pyFraming = msg.framing;
             }
+            handlePyMessage(msg);
         }
     });
 
@@ -519,28 +610,85 @@ function startPythonNfcBridge() {
             pending.reject(new Error('python nfc bridge exited'));
         }
         pyPending.clear();
+        pyExpectedSent = null; // bridge ใหม่ยังไม่มีตาราง UID
         pyProc = null;
+        resolvePyReady(null);
+        if (nfcMode === 'python' && !pyShuttingDown) {
+            setTimeout(restartPythonNfcBridge, PY_NFC_RESPAWN_DELAY_MS);
+        }
     });
 
     return true;
 }
 
-function pyRequest(payload) {
+// รอจน bridge พร้อมรับคำสั่ง (event ready) — แทนการยิง ping แล้วหวังว่าจะทัน timeout
+async function waitPyReady(timeoutMs = PY_NFC_READY_TIMEOUT_MS) {
+    let timer;
+    const timeout = new Promise((resolve) => { timer = setTimeout(() => resolve(null), timeoutMs); });
+    const ready = await Promise.race([pyReady, timeout]);
+    clearTimeout(timer);
+    if (!ready) throw new Error('python nfc bridge not ready');
+    const ms = ready.startup_ms || {};
+    console.log(`🟢 NFC: Python bridge ready ${Date.now() - pySpawnedAt}ms after spawn `
+        + `(bridge: imports ${ms.imports}ms, readers ${ms.readers}ms, self-test ${ready.selftest})`);
+    return ready;
+}
+
+// bridge ตายระหว่างทำงาน → spawn ใหม่แล้วคืนสถานะเดิม (framing, ตาราง UID, subscribe)
+async function restartPythonNfcBridge() {
+    if (pyProc || pyShuttingDown) return;
+    console.log('🔁 NFC: respawning Python bridge...');
+    try {
+        startPythonNfcBridge();
+        await waitPyReady();
+        await negotiatePyFraming();
+        await pushExpectedUidsToBridge();
+        if (pyPushMode) await subscribePyNfc();
+        logDebug(`🔁 [Bridge] กลับมาพร้อมใช้งานใน ${Date.now() - pySpawnedAt}ms หลัง spawn`);
+    } catch (e) {
+        // ถ้า process ตายอีก exit handler จะนัด respawn ให้เอง
+        console.error('❌ NFC: respawned bridge not usable:', e.message);
+    }
+}
+
+function pyRequest(payload, timeoutMs = PY_NFC_READ_TIMEOUT_MS) {
     if (!pyProc?.stdin?.writable) {
         throw new Error('python nfc bridge not running');
     }
+    if (pyFramingGate && payload.cmd !== 'hello') {
+        // กำลังตกลง framing: ยังไม่รู้ว่า bridge จะอ่านแบบไหน → รอให้ตอบ hello ก่อนค่อยส่ง
+        return pyFramingGate.then(() => pyRequest(payload, timeoutMs));
+    }
     const id = ++pyReqId;
-    const msg = { id, ...payload };
+    // deadline_ms: bridge ทิ้งงานที่เราเลิกรอแล้ว (ตอบ expired) แทนที่จะอ่านค้างคิว
+    const msg = { id, deadline_ms: timeoutMs, ...payload };
     return new Promise((resolve, reject) => {
         const timer = setTimeout(() => {
             pyPending.delete(id);
             reject(new Error('python nfc timeout'));
-        }, PY_NFC_READ_TIMEOUT_MS);
+        }, timeoutMs);
         pyPending.set(id, { resolve, reject, timer });
-        pyProc.stdin.write(JSON.stringify(msg) + '\n');
+        pyProc.stdin.write(pyFraming === 'bin1' ? encodePyFrame(msg) : JSON.stringify(msg) + '\n');
     });
 }
 
+// ตกลง framing กับ bridge — request อื่นที่เรียกระหว่างนี้ (key pull, focus, checkAllSlots)
+// จะรอจนได้คำตอบ hello แล้วค่อยส่งด้วย framing ที่ตกลงได้
+async function negotiatePyFraming() {
+    if (PY_NFC_FRAMING === 'jsonl') return;
+    let release;
+    pyFramingGate = new Promise((resolve) => { release = resolve; });
+    try {
+        const res = await pyRequest({ cmd: 'hello', framing: PY_NFC_FRAMING });
+        console.log(`🟢 NFC: Python bridge framing = ${res.framing}`);
+    } catch (e) {
+        console.error(`❌ NFC: framing '${PY_NFC_FRAMING}' rejected, staying on JSONL:`, e.message);
+    } finally {
+        pyFramingGate = null;
+        release();
+    }
+}
+
 let _pyDebugCount = 0;
 async function readNfcAtSlotPython(slotNumber) {
     try {
@@ -560,6 +708,43 @@ async function readNfcAtSlotPython(slotNumber) {
     }
 }
 
+// สแกนหลาย slot ในคำสั่งเดียว (scan) → คืน { slot: uid|null }
+async function scanNfcSlotsPython(slots) {
+    const res = await pyRequest({ cmd: 'scan', slots }, PY_NFC_READ_TIMEOUT_MS * slots.length);
+    const uids = {};
+    for (const r of res.results || []) uids[r.slot] = r.uid || null;
+    return uids;
+}
+
+// ให้ bridge เฝ้าช่องเดียวเอง (ค้างเลือก reader ไว้ อ่านทุกไม่กี่ ms) จนกุญแจหายหรือหมดเวลา
+// คืน { removed, seen, uid, ms } หรือ null ถ้าใช้ไม่ได้ (ให้ caller กลับไป poll เอง)
+async function watchRemovalPython(slotNumber, timeoutMs, requireSeen) {
+    if (nfcMode !== 'python') return null;
+    try {
+        return await pyRequest(
+            {
+                cmd: 'watch_removal', slot: slotNumber, timeout_ms: timeoutMs, require_seen: requireSeen,
+                misses: PY_WATCH_MISSES, absent_ms: PY_WATCH_ABSENT_MS,
+            },
+            timeoutMs + 2000,
+        );
+    } catch (e) {
+        logDebug(`⚠️ [Watch] slot ${slotNumber}: ${e.message} — fallback to polling`);
+        return null;
+    }
+}
+
+// บอก scheduler ของ bridge ว่าช่องนี้กำลังจะเปลี่ยน (ปลดล็อค/รอคืน) → อ่านช่องนี้ถี่ขึ้น; ms=0 ยกเลิก
+function focusNfcSlot(slotNumber, ms) {
+    if (nfcMode !== 'python') return;
+    const warn = (e) => logDebug(`⚠️ [Focus] slot ${slotNumber}: ${e.message}`);
+    try {
+        pyRequest({ cmd: 'focus', slots: [slotNumber], ms }).catch(warn);
+    } catch (e) {
+        warn(e); // bridge ไม่ทำงาน — เป็นแค่ hint ไม่ต้องหยุด flow หลัก
+    }
+}
+
 /** Broadcast hardware readiness to all UI clients via Socket.io */
 function broadcastHardwareStatus(ready, attempt = 0, message = '') {
     currentHardwareReady = ready;
@@ -661,7 +846,8 @@ async function setupHardware() {
                     console.error(err.message);
                     try {
                         startPythonNfcBridge();
-                        await pyRequest({ cmd: 'ping' });
+                        await waitPyReady();
+                        await negotiatePyFraming();
                         nfcMode = 'python';
                         console.log('🟢 NFC: Python bridge mode (nfc_rc522_bridge.py)');
                     } catch (e) {
@@ -703,6 +889,32 @@ async function refreshKeyUidCache() {
         console.log('🟡 Key UID cache not available yet (will retry later)');
         console.error(e.message);
     }
+    if (nfcMode === 'python') await pushExpectedUidsToBridge();
+}
+
+// ส่งตาราง slot -> UID ที่คาดหวังให้ bridge เทียบเอง (ผลอ่าน/event มี match|mismatch|empty มาเลย)
+// ครั้งแรก (หรือหลัง bridge เริ่มใหม่) ส่งทั้งตาราง หลังจากนั้นส่งเฉพาะช่องที่เปลี่ยน
+async function pushExpectedUidsToBridge() {
+    const table = {};
+    for (const [slot, uid] of Object.entries(expectedKeyUidBySlot)) table[slot] = uid || null;
+    let req;
+    if (!pyExpectedSent) {
+        req = { cmd: 'set_expected', table };
+    } else {
+        const update = {};
+        for (const slot of new Set([...Object.keys(table), ...Object.keys(pyExpectedSent)])) {
+            if ((table[slot] ?? null) !== (pyExpectedSent[slot] ?? null)) update[slot] = table[slot] ?? null;
+        }
+        if (Object.keys(update).length === 0) return;
+        req = { cmd: 'set_expected', update };
+    }
+    try {
+        const res = await pyRequest(req, 1000);
+        pyExpectedSent = table;
+        logDebug(`🧾 [Bridge] expected UID table ${req.table ? 'loaded' : 'updated'} (${res.expected} slots)`);
+    } catch (e) {
+        console.error('❌ NFC: set_expected failed (will retry on next refresh):', e.message);
+    }
 }
 
 function setRelayActive(slotNumber, shouldUnlock) {
@@ -882,6 +1094,7 @@ async function readNfcAtSlot(slotNumber) {
  */
 async function startKeyPullCheck(slotNumber, bookingId) {
     pullCheckingSlots.add(slotNumber);
+    focusNfcSlot(slotNumber, KEY_PULL_TIMEOUT_S * 1000 + 5000);
     
     // ═══════════════════════════════════════════════
     // หยุด Background Polling ทั้งหมดก่อน (ป้องกัน Serial ชนกัน)
@@ -912,7 +1125,20 @@ async function startKeyPullCheck(slotNumber, bookingId) {
         let consecutiveMisses = 0;
         let earlyPulled = false;
 
-        while (Date.now() - startMs < MAX_TOTAL_MS) {
+        // Python bridge: เฝ้าที่ฝั่ง bridge ครั้งเดียว รู้ว่าดึงออกภายในหลักสิบ ms แทนรอบละ 200ms
+        const watch = await watchRemovalPython(slotNumber, MAX_TOTAL_MS, KEY_PULL_REQUIRE_SEEN_TAG);
+        if (watch) {
+            hasBeenSeen = watch.seen;
+            if (watch.seen) logDebug(`✨ [InstantCheck] เจอกุญแจครั้งแรก (${watch.uid})`);
+            if (watch.removed) {
+                logDebug(`⚡ [Confirm] ดึงออกแล้ว! (bridge watch ${watch.ms}ms, ${watch.polls} polls)`);
+                earlyPulled = true;
+                slotHasKey[slotNumber] = false; // Sync state immediately
+                pySlotState.set(slotNumber, { uid: null, match: 'empty' }); // อย่าให้ push loop ใช้ UID เก่า
+            }
+        }
+
+        while (!watch && Date.now() - startMs < MAX_TOTAL_MS) {
             // อ่าน NFC ถี่ขึ้น (ทุก 200ms)
             await new Promise(resolve => setTimeout(resolve, 200));
             
@@ -989,6 +1215,7 @@ async function startKeyPullCheck(slotNumber, bookingId) {
         // คืนสิทธิ์การ Scan Background
         activeFeedbackSlots.delete(slotNumber);
         pullCheckingSlots.delete(slotNumber);
+        focusNfcSlot(slotNumber, 0);
         isUnlocking = false;
         logDebug(`🔄 คืนสิทธิ์ Background Polling แล้ว (slot=${slotNumber})`);
         
@@ -1006,6 +1233,7 @@ async function startWrongKeyCheck(slotNumber, uid, expectedUid) {
     if (pullCheckingSlots.has(slotNumber)) return; // ข้ามถ้ากำลังทำ pull check ปกติ
     
     pullCheckingSlots.add(slotNumber);
+    focusNfcSlot(slotNumber, 30000);
     isUnlocking = true;
     
     logDebug(`⚠️ [WrongKey] ช่อง ${slotNumber}: พบ UID ${uid} (คาดหวัง ${expectedUid}) -> UNLOCKING`);
@@ -1026,7 +1254,10 @@ async function startWrongKeyCheck(slotNumber, uid, expectedUid) {
         // 3. รอจนกว่าจะดึงออก (สูงสุด 30 วิ)
         const startMs = Date.now();
         let stillThere = true;
-        while (Date.now() - startMs < 30000) {
+        const watch = await watchRemovalPython(slotNumber, 30000, false);
+        if (watch) stillThere = !watch.removed;
+        if (watch?.removed) pySlotState.set(slotNumber, { uid: null, match: 'empty' }); // อย่าให้ push loop เห็น UID ผิดซ้ำ
+        while (!watch && Date.now() - startMs < 30000) {
             await new Promise(r => setTimeout(r, 500));
             const currentUid = await readNfcAtSlot(slotNumber);
             if (!currentUid) {
@@ -1042,6 +1273,7 @@ async function startWrongKeyCheck(slotNumber, uid, expectedUid) {
         await lockSlot(slotNumber);
         activeFeedbackSlots.delete(slotNumber);
         pullCheckingSlots.delete(slotNumber);
+        focusNfcSlot(slotNumber, 0);
         isUnlocking = false;
         
         // รีเฟรชสถานะไฟ
@@ -1074,6 +1306,26 @@ async function checkAllSlots() {
 
     console.log(`\n🔍 Checking NFC state of slots: [${slotsToCheck.join(', ')}]...`);
     try {
+        // Python bridge: อ่านทุกช่องใน IPC ครั้งเดียว ไม่ต้องรอ 300ms ต่อช่อง
+        let scanned = null;
+        if (nfcMode === 'python') {
+            try {
+                scanned = await scanNfcSlotsPython(slotsToCheck);
+            } catch (e) {
+                console.error('❌ checkAllSlots: python scan failed, falling back to per-slot reads:', e.message);
+            }
+        }
+        if (scanned) {
+            for (const slot of slotsToCheck) {
+                const uid = scanned[slot] || null;
+                slotHasKey[slot] = !!uid;
+                slotHasKey[`last_uid_${slot}`] = uid;
+                setLedRelay(slot, !uid);
+            }
+            console.log('✅ LED states updated.\n');
+            return;
+        }
+
         for (const slot of slotsToCheck) {
             if (nfcMode === 'mock') {
                 setLedRelay(slot, false); // สมมติว่าเขียวหมด (มีกุญแจ)
@@ -1296,6 +1548,7 @@ socket.on('led:blink-return', (data) => {
     const { slotNumber } = data;
     logDebug(`🚨 [Return Blink] เริ่มกระพริบ เขียว-แดง ที่ช่อง ${slotNumber}`);
     activeFeedbackSlots.add(slotNumber);
+    focusNfcSlot(slotNumber, 60000);
 
     // หยุด blink เดิมก่อน (ถ้ามี)
     if (returnBlinkIntervals.has(slotNumber)) {
@@ -1315,6 +1568,7 @@ socket.on('led:stop-blink', (data) => {
     const { slotNumber, keyReturned } = data;
     logDebug(`✋ [Return Blink] หยุดกระพริบช่อง ${slotNumber} (keyReturned=${keyReturned})`);
     activeFeedbackSlots.delete(slotNumber);
+    focusNfcSlot(slotNumber, 0);
 
     if (returnBlinkIntervals.has(slotNumber)) {
         clearInterval(returnBlinkIntervals.get(slotNumber));
@@ -1421,6 +1675,108 @@ socket.on('key:do-reconcile-scan', async () => {
 // NFC Polling (RC522 ×10 SPI + CS GPIO)
 // ─────────────────────────────────────────────
 
+// ใช้ผลอ่านที่ "เจอกุญแจ" กับสถานะช่อง (LED / auto-return / wrong key / nfc:tag)
+// match: ผลเทียบจาก bridge (python mode) — ไม่มี/unknown ก็เทียบกับ cache ฝั่งนี้แทน
+function applySlotPresent(slotNumber, uid, match) {
+    if (activeFeedbackSlots.has(slotNumber)) {
+        logDebug(`✨ [Return Polling] Slot ${slotNumber} detected UID: ${uid}`);
+    }
+
+    const expectedUid = expectedKeyUidBySlot[slotNumber];
+    const mismatch = match === 'mismatch'
+        || ((match == null || match === 'unknown') && expectedUid && uid !== expectedUid);
+    // Log mismatch even if it proceeds later
+    if (mismatch) {
+        logDebug(`⚠️ [UID Mismatch] Slot ${slotNumber}: Detected ${uid}, Backend expects ${expectedUid}`);
+        logDebug(`❌ [WrongKey] ช่อง ${slotNumber}: พบ UID ${uid} (คาดหวัง ${expectedUid}) -> UNLOCKING`);
+        startWrongKeyCheck(slotNumber, uid, expectedUid);
+        return;
+    }
+
+    if (slotHasKey[slotNumber] !== true) {
+        slotHasKey[slotNumber] = true;
+        logDebug(`📥 [Return] พบกุญแจคืนที่ช่อง ${slotNumber} (UID: ${uid})`);
+        
+        if (!activeFeedbackSlots.has(slotNumber)) {
+            setLedRelay(slotNumber, false); // 🟢
+            logDebug(`🔄 [AutoReturn] ส่ง auto-return สำหรับช่อง ${slotNumber} (UID: ${uid})`);
+            socket.emit('key:auto-return', { slotNumber, uid });
+        }
+    }
+    if (!slotHasKey[`last_uid_${slotNumber}`] || slotHasKey[`last_uid_${slotNumber}`] !== uid) {
+        console.log(`🏷️  NFC tag: ${uid} at slot ${slotNumber}`);
+        slotHasKey[`last_uid_${slotNumber}`] = uid;
+    }
+
+    // ── [OPTIMIZE] ลดความถี่ในการส่ง nfc:tag ไปยัง Backend ──
+    const now = Date.now();
+    const lastEmit = lastEmitTimeBySlot.get(slotNumber);
+    const isReturnActive = activeFeedbackSlots.has(slotNumber);
+
+    // ส่งเฉพาะเมื่อ:
+    // 1. เป็น UID ใหม่
+    // 2. หรือ ผ่านไปแล้ว 2 วินาที
+    // 3. หรือ เป็นช่องที่ "กำลังรอคืนกุญแจอยู่" (ต้องส่งถี่เพื่อให้ UI ตอบสนองทันที)
+    if (isReturnActive || !lastEmit || lastEmit.uid !== uid || (now - lastEmit.time > 2000)) {
+        socket.emit('nfc:tag', { slotNumber, uid });
+        lastEmitTimeBySlot.set(slotNumber, { uid, time: now });
+    }
+}
+
+// ช่องว่างแน่นอนแล้ว (ผ่านการกันไฟวอกมาแล้ว) → 🔴
+function applySlotAbsent(slotNumber, reason) {
+    if (slotHasKey[slotNumber] !== false) {
+        slotHasKey[slotNumber] = false;
+        slotHasKey[`last_uid_${slotNumber}`] = null;
+        if (!activeFeedbackSlots.has(slotNumber)) {
+            setLedRelay(slotNumber, true); // 🔴
+        }
+        logDebug(`📤 [Missing] กุญแจหายไปจากช่อง ${slotNumber} (${reason})`);
+    }
+}
+
+// ── Python mode: bridge กันไฟวอกเอง (subscribe) แล้วส่งมาเฉพาะตอนสถานะเปลี่ยน ──
+// pySlotState เก็บสถานะที่ debounce แล้ว; loop ด้านล่างแค่ประเมินซ้ำทุก NFC_POLLING_INTERVAL_MS
+// (ส่ง nfc:tag ซ้ำ / เช็ค wrong key ซ้ำ) โดยไม่ต้องอ่านข้าม process
+const pySlotState = new Map(); // slot -> { uid, match }
+const PY_SUBSCRIBE_RETRY_MS = 5000;
+
+function applyPySlotState(slotNumber) {
+    if (isUnlocking || pullCheckingSlots.has(slotNumber) || !pySlotState.has(slotNumber)) return;
+    const { uid, match } = pySlotState.get(slotNumber);
+    if (uid) applySlotPresent(slotNumber, uid, match);
+    else applySlotAbsent(slotNumber, 'bridge debounced');
+}
+
+function handlePyEvent(msg) {
+    if (msg.event === 'ready') {
+        resolvePyReady(msg);
+        return;
+    }
+    if (msg.event === 'reader') {
+        // สถานะตัวอ่าน (quarantined/ok) ไม่ใช่สถานะกุญแจ: แค่ log ไว้
+        console.log(`${msg.state === 'ok' ? '✅' : '⚠️ '} NFC: slot ${msg.slot} reader ${msg.state}`);
+        return;
+    }
+    if (msg.event === 'error' || msg.slot == null) return; // อ่านพลาดไม่นับเป็นการเปลี่ยนสถานะ
+    pySlotState.set(msg.slot, { uid: msg.uid || null, match: msg.match });
+    applyPySlotState(msg.slot);
+}
+
+async function subscribePyNfc() {
+    try {
+        const res = await pyRequest({ cmd: 'subscribe', slots: 'all', period_ms: NFC_POLLING_INTERVAL_MS }, 2000);
+        for (const [slot, uid] of Object.entries(res.states || {})) {
+            pySlotState.set(Number(slot), { uid, match: res.match?.[slot] });
+        }
+        const d = res.debounce || {};
+        console.log(`🟢 NFC: subscribed to bridge (${res.schedule}, misses=${d.misses}, absent_hold=${d.absent_hold_ms}ms)`);
+    } catch (e) {
+        console.error(`❌ NFC: subscribe failed, retrying in ${PY_SUBSCRIBE_RETRY_MS / 1000}s:`, e.message);
+        setTimeout(subscribePyNfc, PY_SUBSCRIBE_RETRY_MS);
+    }
+}
+
 function startNfcPolling() {
     if (nfcMode === 'mock') {
         console.log('🧪 NFC Mock mode — simulating random scans (5% chance/sec)');
@@ -1435,6 +1791,16 @@ function startNfcPolling() {
         return;
     }
 
+    if (nfcMode === 'python') {
+        console.log('🟢 NFC Real mode (python) — bridge push mode');
+        pyPushMode = true;
+        subscribePyNfc();
+        setInterval(() => {
+            for (const slot of pySlotState.keys()) applyPySlotState(slot);
+        }, NFC_POLLING_INTERVAL_MS);
+        return;
+    }
+
     console.log(`🟢 NFC Real mode (${nfcMode}) — starting polling loop`);
 
     if (nfcMode === 'node') {
@@ -1482,61 +1848,13 @@ function startNfcPolling() {
             const uid = await readNfcAtSlot(slotNumber);
             if (uid) {
                 missCounts.set(slotNumber, 0);
-
-                if (activeFeedbackSlots.has(slotNumber)) {
-                    logDebug(`✨ [Return Polling] Slot ${slotNumber} detected UID: ${uid}`);
-                }
-
-                const expectedUid = expectedKeyUidBySlot[slotNumber];
-                // Log mismatch even if it proceeds later
-                if (expectedUid && uid !== expectedUid) {
-                    logDebug(`⚠️ [UID Mismatch] Slot ${slotNumber}: Detected ${uid}, Backend expects ${expectedUid}`);
-                    logDebug(`❌ [WrongKey] ช่อง ${slotNumber}: พบ UID ${uid} (คาดหวัง ${expectedUid}) -> UNLOCKING`);
-                    startWrongKeyCheck(slotNumber, uid, expectedUid);
-                    return;
-                }
-
-                if (slotHasKey[slotNumber] !== true) {
-                    slotHasKey[slotNumber] = true;
-                    logDebug(`📥 [Return] พบกุญแจคืนที่ช่อง ${slotNumber} (UID: ${uid})`);
-                    
-                    if (!activeFeedbackSlots.has(slotNumber)) {
-                        setLedRelay(slotNumber, false); // 🟢
-                        logDebug(`🔄 [AutoReturn] ส่ง auto-return สำหรับช่อง ${slotNumber} (UID: ${uid})`);
-                        socket.emit('key:auto-return', { slotNumber, uid });
-                    }
-                }
-                if (!slotHasKey[`last_uid_${slotNumber}`] || slotHasKey[`last_uid_${slotNumber}`] !== uid) {
-                    console.log(`🏷️  NFC tag: ${uid} at slot ${slotNumber}`);
-                    slotHasKey[`last_uid_${slotNumber}`] = uid;
-                }
-
-                // ── [OPTIMIZE] ลดความถี่ในการส่ง nfc:tag ไปยัง Backend ──
-                const now = Date.now();
-                const lastEmit = lastEmitTimeBySlot.get(slotNumber);
-                const isReturnActive = activeFeedbackSlots.has(slotNumber);
-
-                // ส่งเฉพาะเมื่อ:
-                // 1. เป็น UID ใหม่
-                // 2. หรือ ผ่านไปแล้ว 2 วินาที
-                // 3. หรือ เป็นช่องที่ "กำลังรอคืนกุญแจอยู่" (ต้องส่งถี่เพื่อให้ UI ตอบสนองทันที)
-                if (isReturnActive || !lastEmit || lastEmit.uid !== uid || (now - lastEmit.time > 2000)) {
-                    socket.emit('nfc:tag', { slotNumber, uid });
-                    lastEmitTimeBySlot.set(slotNumber, { uid, time: now });
-                }
+                applySlotPresent(slotNumber, uid);
             } else {
                 const misses = (missCounts.get(slotNumber) || 0) + 1;
                 missCounts.set(slotNumber, misses);
 
                 if (misses >= MISS_LIMIT) {
-                    if (slotHasKey[slotNumber] !== false) {
-                        slotHasKey[slotNumber] = false;
-                        slotHasKey[`last_uid_${slotNumber}`] = null;
-                        if (!activeFeedbackSlots.has(slotNumber)) {
-                            setLedRelay(slotNumber, true); // 🔴
-                        }
-                        logDebug(`📤 [Missing] กุญแจหายไปจากช่อง ${slotNumber} (Misses: ${misses})`);
-                    }
+                    applySlotAbsent(slotNumber, `Misses: ${misses}`);
                 }
             }
         } catch (e) {
@@ -1624,6 +1942,7 @@ function startNfcPolling() {
 
 process.on('SIGINT', () => {
     console.log('\n👋 Hardware Service shutting down (SIGINT)...');
+    pyShuttingDown = true;
     try { pyProc?.kill('SIGTERM'); } catch { /* ignore */ }
     closeAllEsp8266();
     socket.disconnect();
@@ -1632,6 +1951,7 @@ process.on('SIGINT', () => {
 
 process.on('SIGTERM', () => {
     console.log('👋 Hardware Service shutting down (SIGTERM)...');
+    pyShuttingDown = true;
     try { pyProc?.kill('SIGTERM'); } catch { /* ignore */ }
     closeAllEsp8266();
     socket.disconnect();
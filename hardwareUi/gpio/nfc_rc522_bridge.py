@@ -3,37 +3,287 @@
 RC522 Multi-Reader Bridge (Raspberry Pi 5)
 
 Purpose:
-- Read UID from MFRC522 over SPI (spidev0.0)
+- Read UID from MFRC522 over SPI (spidev0.0, or several buses via NFC_TOPOLOGY)
 - Select 1 of N readers by toggling its RST line via lgpio (CE0 shared as hardware CS)
 - Communicate with a Node.js parent process over stdin/stdout (JSON lines)
+- Optionally serve the same protocol to other local clients on a Unix socket
+
+Startup: the hardware modules are imported and the GPIO/SPI handles opened, then
+the first line on stdout is
+        {"event":"ready","selftest":"cache","startup_ms":{"imports":110.0,"readers":2.3,"total":120.0}}
+and requests are served from that moment (ms are since the process started).
+Chip versions come from the last self-test (NFC_SELFTEST_CACHE); every reader
+is probed again ~1 s later in the background and the cache rewritten ("status"
+shows "selftest":{"source":"cache"|"live"|"none","t":...,"chips":{...}}).
+Run it as "python3 -m nfc_rc522_bridge" so the module comes from __pycache__.
 
 Protocol (JSONL):
 Input:  {"id":1,"cmd":"read","slot":3}
-Output: {"id":1,"ok":true,"uid":"04A1B2C3"}  OR {"id":1,"ok":true,"uid":null}
+Output: {"id":1,"ok":true,"uid":"04A1B2C3","match":"match"}  OR {"id":1,"ok":true,"uid":null,"match":"empty"}
 Error:  {"id":1,"ok":false,"error":"..."}
 
-Dependencies (Debian/Raspberry Pi OS):
+Expected UIDs: the host loads which key belongs in which slot once, then patches it:
+Input:  {"id":12,"cmd":"set_expected","table":{"3":"04A1B2C3","4":"0499AABB"}}   (replaces)
+        {"id":13,"cmd":"set_expected","update":{"4":null,"5":"11223344"}}      (null removes)
+Output: {"id":12,"ok":true,"expected":2}
+Every read, presence, scan entry and subscribe event then carries "match":
+"match", "mismatch" (a tag that is not the slot's key), "empty", or "unknown" (no
+expected UID for the slot). When a table change flips the verdict for a slot's
+settled tag, subscribers get {"event":"expected","slot":4,"uid":"...","match":"mismatch",...}.
+
+Batched sweep (one round-trip for many slots):
+Input:  {"id":2,"cmd":"scan","slots":[1,2,3]}   OR {"id":2,"cmd":"scan","slots":"all"}
+Output: {"id":2,"ok":true,"ms":123.4,
+         "results":[{"slot":1,"uid":"04A1B2C3","ms":12.3,"hz":2000000}, {"slot":2,"uid":null,"ms":55.1,"hz":250000}, ...]}
+
+Push mode (bridge runs its own scan loop, emits only debounced transitions):
+Input:  {"id":3,"cmd":"subscribe","slots":"all","period_ms":200}
+Output: {"id":3,"ok":true,"subscribed":[1,2,...,10],"period_ms":200,"schedule":"adaptive",
+         "debounce":{"hits":1,"misses":5,"present_hold_ms":0,"absent_hold_ms":1000},
+         "states":{"3":"04A1B2C3","4":null},"match":{"3":"match","4":"empty"}}
+Events: {"event":"present","slot":3,"uid":"04A1B2C3","match":"match","t_ms":123456.7}
+        {"event":"absent","slot":4,"uid":null,"t_ms":...}      (first state of an empty slot)
+        {"event":"removed","slot":3,"uid":null,"prev":"04A1B2C3","t_ms":...}
+        {"event":"changed","slot":3,"uid":"0499AABB","prev":"04A1B2C3","t_ms":...}
+        {"event":"error","slot":5,"error":"...","t_ms":...}
+        {"event":"reader","slot":7,"state":"quarantined","probe_in_ms":1000,"t_ms":...}
+        (t_ms = time.monotonic() in ms; events carry no "id")
+Input:  {"id":4,"cmd":"unsubscribe"}
+Every read (the scan loop's and any client's) feeds a per-slot state machine: a
+slot's state only changes once the new raw state was read "hits" (tag) or
+"misses" (no tag) times in a row and has lasted "present_hold_ms" /
+"absent_hold_ms"; failed reads count for neither. "states" in the reply is the
+debounced state so far (slots not listed are not settled yet). The loop's
+owner may retune it with "debounce":{"misses":3,...} on subscribe; it applies
+to everyone.
+By default ("schedule":"adaptive") the loop does the same number of reads per
+period_ms as a full sweep, but each bus reads whichever slot ranks highest on
+time-since-last-read x weight: slots that changed recently and slots under
+"focus" are read far more often, and every slot is still read at least every
+"max_stale_ms" (default 2000; keep it above one full sweep). "schedule":"sweep"
+walks the slots in fixed order instead. period_ms is at least 20. Tell the
+scheduler where a change is expected (borrow unlock, return in progress);
+"ms":0 clears:
+Input:  {"id":11,"cmd":"focus","slots":[3],"ms":15000}
+Output: {"id":11,"ok":true,"focus":[3]}
+
+Key pull (after an unlock): the bridge keeps that one reader selected and
+configured, polls it every few ms and answers once the tag has been gone for
+"misses" polls in a row and at least "absent_ms" (default 5 and 500; counted
+only after the tag was seen when "require_seen"), or when timeout_ms runs out
+(then "removed" is false). A miss on a reader that lost its configuration is
+not counted; the reader is re-initialised first.
+Input:  {"id":14,"cmd":"watch_removal","slot":3,"timeout_ms":10000,"require_seen":true,"misses":5,"absent_ms":500}
+Output: {"id":14,"ok":true,"removed":true,"seen":true,"uid":"04A1B2C3","ms":2315.4,"polls":240}
+Other slots on the same bus are still read between polls.
+
+Dead readers: a read in which the reader never answered (VersionReg 0x00/0xFF
+on every attempt, or an SPI error) counts as a failure; NFC_BREAKER_FAILURES in
+a row (or a self-test that finds no reader) quarantine the slot. Its reads then
+fail at once with {"ok":false,"error":"reader quarantined (slot 7)","reader":"quarantined"},
+scans mark it the same way, the subscribe loop leaves it out, and every
+NFC_BREAKER_PROBE_MS (doubling per failed probe, at most 60 s) one read gets
+through as a single-attempt probe. The first answer restores the slot; both
+changes go to subscribers as "reader" events. Replies for a slot that has
+started failing carry "reader":"suspect".
+
+Requests are handled concurrently: "ping" and "status" are answered at once,
+hardware commands are queued and run by priority (presence, read, scan; a
+request may set "prio") rather than strictly in pipe order, so replies can
+arrive out of order; match them by "id".
+Input:  {"id":6,"cmd":"status"}
+Output: {"id":6,"ok":true,"queued":2,"in_flight":1,"buses":["0.0"],"subscribed":false,
+         "focus":[],"debounce":{...},"expected":10,"selftest":{...},"quarantined":[7],
+         "clients":1,"observers":0}
+
+Deadlines: any hardware request may carry "deadline_ms" (budget from receipt) or
+"deadline" (absolute, epoch ms). Work that can no longer finish is skipped or
+abandoned between attempts and answered with
+        {"id":7,"ok":false,"expired":true,"error":"deadline expired"}
+In a scan only the slots not reached in time are marked {"slot":9,"uid":null,"expired":true}.
+
+Coalescing: a "read" of a slot that is already queued (or started less than
+NFC_COALESCE_MS ago) joins that hardware read, and a slot read within the
+window is answered from the last result ({"uid":...,"cached":true}). A request
+can set "max_age_ms" (0 = always hit the hardware).
+
+Framing: JSONL is the default. Sending {"id":8,"cmd":"hello","framing":"bin1"} as the
+only request in flight switches both directions to length-prefixed frames right
+after the (JSONL) reply {"id":8,"ok":true,"framing":"bin1"}. The client must not
+send anything else until that reply arrives: only an accepted hello switches the
+bridge's input, a rejected one ({"ok":false,...}) leaves both directions on JSONL.
+  u16 LE length | u8 type | payload
+  0x00 JSON      payload = UTF-8 JSON object (any request/reply/event)
+  0x01 read      <I id><B slot><H deadline_ms (0 = none)>
+  0x81 read ok   <I id><B status (0 empty, 1 uid, 2 expired) | 0x80 cached
+                           | 0x10 match | 0x20 mismatch><B n><n uid bytes>
+
+Socket clients: with --socket PATH (or NFC_SOCKET) the bridge also listens on a
+Unix socket; --daemon serves only the socket (default /tmp/kms_nfc_bridge.sock)
+and runs until SIGTERM. Every connection speaks the protocol above, replies go back to the
+connection that asked, and reads of one slot from different clients coalesce.
+Hardware requests from socket clients queue behind those of the stdio parent
+(priority +10) and at most 32 may be queued per connection.
+A client may declare itself read-only:
+Input:  {"id":1,"cmd":"hello","role":"observer"}
+Output: {"id":1,"ok":true,"framing":"jsonl","role":"observer"}
+Observers may only send hello, ping, status, stats, subscribe and unsubscribe. Their
+subscribe just listens to the shared scan loop. A controller's subscribe adds
+its slots to the loop (which scans the union of every controller's slots) and
+it stops when the last controller unsubscribes or disconnects. period_ms,
+schedule, max_stale_ms and debounce come from the loop's owner: the stdio
+parent while it is subscribed, otherwise the longest-subscribed controller;
+other controllers may not change debounce. set_expected is reserved for the
+stdio parent (any controller under --daemon, where there is none).
+Chip version (diagnostics): {"id":9,"cmd":"version","slot":3} -> {"id":9,"ok":true,"version":"0x92","kind":"genuine"}
+From a shell:
+  python3 nfc_rc522_bridge.py --send '{"cmd":"scan"}'
+  python3 nfc_rc522_bridge.py --observe
+
+Metrics: every slot keeps counters (reads by result, retries, SPI frames,
+transceive timeouts, ErrorReg and BCC failures, presence hits) and read/settle
+latency histograms since start.
+Input:  {"id":10,"cmd":"stats","slots":[3]}          (slots defaults to "all")
+Output: {"id":10,"ok":true,"uptime_s":812.4,"slots":{"3":{"reads":{"uid":40,"empty":2,"expired":0,"error":0},
+         "presence":{"hit":120,"miss":1},"retries":3,"xfers":1032,"timeouts":0,"err_reg":1,"bcc_errors":0,
+         "hz":2000000,"read_ms":{"count":42,"avg":14.2,"p50":20.0,"p95":50.0,"max":61.3},"settle_ms":{...},
+         "reader":{"state":"ok","failures":0,"quarantines":0}}}}
+(p50/p95 are histogram bucket bounds). The same data is written every
+NFC_METRICS_INTERVAL_S as a Prometheus textfile (kms_nfc_* metrics).
+
+Presence check (slot with a known tag; uid defaults to the last UID seen there):
+Input:  {"id":5,"cmd":"presence","slot":3,"uid":"04A1B2C3"}
+Output: {"id":5,"ok":true,"uid":"04A1B2C3","fast":true}
+        fast=true: a tag answered a single WUPA (no probe, anticollision or retries;
+        on a reader kept selected since the last check, no RST pulse or settle
+        either), so the slot is taken to still hold the last UID read there.
+        fast=false means the quick check missed, or "uid" is not the last UID read
+        on the slot, and a full read produced "uid".
+The subscribe loop uses the same check for settled occupied slots, with a full
+read at least every NFC_PRESENCE_VERIFY_MS and on focused slots.
+
+Environment:
+  NFC_IRQ_GPIO  BCM pin wired to the (shared, open-drain) RC522 IRQ line. When set,
+                transceive completion waits on an lgpio edge callback instead of
+                polling ComIrqReg. With several buses: "0.0=25,1.0=24".
+  NFC_POLL_US   Sleep between ComIrqReg polls when no IRQ line is wired (default 500).
+  NFC_CLOCK_PROFILE  JSON file holding the per-slot SPI clock profile
+                (default /var/tmp/kms_nfc_clock_profile.json).
+  NFC_COALESCE_MS  Freshness window for merging duplicate slot reads (default 50).
+  NFC_TOPOLOGY  JSON file {"<slot>": [bus, ce, rst_pin]} for readers spread over
+                several SPI controllers; each bus gets its own worker thread and
+                scan results from all buses are merged into one response.
+  NFC_METRICS_TEXTFILE  Prometheus textfile to (re)write; default
+                /var/lib/prometheus/node-exporter/kms_nfc.prom when that directory
+                exists, empty disables.
+  NFC_METRICS_INTERVAL_S  Seconds between textfile writes (default 15).
+  NFC_SELFTEST_CACHE  JSON file with the last per-slot self-test (default
+                /var/tmp/kms_nfc_selftest.json, empty disables).
+  NFC_WATCH_INTERVAL_MS  Pause between watch_removal polls (default 5).
+  NFC_WATCH_ABSENT_MS  Default minimum absence before watch_removal reports a pull (default 500).
+  NFC_PRESENCE_VERIFY_MS  Longest the subscribe loop confirms an occupied slot by
+                presence alone before reading its UID again (default 5000).
+  NFC_BREAKER_FAILURES  Failed reads in a row that quarantine a reader (default 3).
+  NFC_BREAKER_PROBE_MS  First probe delay of a quarantined reader (default 1000).
+  NFC_DEBOUNCE_HITS / NFC_DEBOUNCE_MISSES  Consecutive reads with / without a tag
+                before a slot's debounced state flips (default 1 / 5).
+  NFC_DEBOUNCE_PRESENT_MS / NFC_DEBOUNCE_ABSENT_MS  Minimum time the new raw state
+                must last before it is reported (default 0 / 1000).
+  NFC_BACKEND   "hw" (spidev + lgpio, default), "sim" (emulated MFRC522 cabinet,
+                scripted by the NFC_SIM_SCRIPT JSON file; see rc522_sim.py) or
+                "replay" (NFC_REPLAY_TRACE file, played at NFC_REPLAY_SPEED x
+                recorded timing, 0 = flat out).
+  NFC_RECORD    Record every SPI frame, GPIO write/read and IRQ edge to this file
+                (".gz" compresses); see spi_trace.py.
+  NFC_SOCKET    Unix socket path to listen on (and to connect to with --send/--observe).
+
+Dependencies (Debian/Raspberry Pi OS; not needed with NFC_BACKEND=sim/replay):
   sudo apt-get install -y python3-lgpio python3-spidev
 """
 
 from __future__ import annotations
 
+import argparse
+import asyncio
+import functools
+import itertools
 import json
+import math
+import os
+import signal
+import socket
+import struct
 import sys
+import tempfile
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Tuple
 
-try:
-    import spidev  # type: ignore
-except Exception as e:  # pragma: no cover
-    print(json.dumps({"id": None, "ok": False, "error": f"spidev import failed: {e}"}), flush=True)
-    raise
 
-try:
-    import lgpio  # type: ignore
-except Exception as e:  # pragma: no cover
-    print(json.dumps({"id": None, "ok": False, "error": f"lgpio import failed: {e}"}), flush=True)
-    raise
+
+def _load_backend():
+    """spidev/lgpio modules for the bridge: the real ones (NFC_BACKEND=hw), the
+    emulated cabinet (sim) or a recorded trace (replay); NFC_RECORD wraps any of
+    them with the recorder."""
+    backend = os.environ.get("NFC_BACKEND", "hw")
+    if backend == "sim":
+        import rc522_sim
+        # Wired lazily: the emulator reads the same topology/IRQ map as MultiReader
+        spi_mod, gpio_mod = rc522_sim.sim_backend(
+            os.environ.get("NFC_SIM_SCRIPT"),
+            wiring=lambda: (load_topology(), _parse_irq_map(os.environ.get("NFC_IRQ_GPIO"))),
+        )
+    elif backend == "replay":
+        import spi_trace
+        spi_mod, gpio_mod = spi_trace.replay_backend(
+            os.environ["NFC_REPLAY_TRACE"], float(os.environ.get("NFC_REPLAY_SPEED", "1.0"))
+        )
+    elif backend == "hw":
+        try:
+            import spidev as spi_mod  # type: ignore
+        except Exception as e:  # pragma: no cover
+            print(json.dumps({"id": None, "ok": False, "error": f"spidev import failed: {e}"}), flush=True)
+            raise
+
+        try:
+            import lgpio as gpio_mod  # type: ignore
+        except Exception as e:  # pragma: no cover
+            print(json.dumps({"id": None, "ok": False, "error": f"lgpio import failed: {e}"}), flush=True)
+            raise
+    else:
+        raise SystemExit(f"unknown NFC_BACKEND: {backend}")
+
+    if os.environ.get("NFC_RECORD"):
+        import spi_trace
+        spi_mod, gpio_mod = spi_trace.record_backend(spi_mod, gpio_mod, os.environ["NFC_RECORD"])
+    return spi_mod, gpio_mod
+
+
+# Loaded by load_backend() when the first MultiReader is built, so --send/--observe
+# and a refused second instance never import (or open) the hardware modules
+spidev = lgpio = None
+
+
+def load_backend() -> None:
+    global spidev, lgpio
+    if lgpio is None:
+        spidev, lgpio = _load_backend()
+
+
+def _process_age_ms() -> Optional[float]:
+    """Milliseconds since this process was started (Linux /proc, 10 ms resolution)."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime_s = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round((uptime_s - start_ticks / os.sysconf("SC_CLK_TCK")) * 1000, 1)
+
+
+_IMPORTED_AT_MS = _process_age_ms()  # interpreter start + imports
 
 
 SLOT_CS_MAP = {
@@ -72,33 +322,158 @@ TModeReg = 0x2A
 TPrescalerReg = 0x2B
 TReloadRegH = 0x2C
 TReloadRegL = 0x2D
+VersionReg = 0x37
 
 
 # MFRC522 commands
 PCD_IDLE = 0x00
+PCD_TRANSMIT = 0x04
 PCD_TRANSCEIVE = 0x0C
 PCD_SOFTRESET = 0x0F
 
 
+# VersionReg values (same codes diag_spi.py checks)
+CHIP_GENUINE_VERSIONS = (0x91, 0x92, 0x88)
+CHIP_FM17522E_VERSION = 0x18
+CHIP_VERSIONS = CHIP_GENUINE_VERSIONS + (CHIP_FM17522E_VERSION,)
+
+# Timer setup written by _init_chip; reading it back tells us whether the
+# chip still holds our configuration (RST LOW/HIGH resets it to 0x00/0x00)
+INIT_TMODE = 0x8D
+INIT_TPRESCALER = 0x3E
+
+
+# Configuration registers only the host writes; Rc522 keeps a write-through
+# shadow of these so read-modify-writes and unchanged rewrites skip the bus
+SHADOWED_REGS = frozenset({
+    ComIEnReg, DivIEnReg, BitFramingReg, ModeReg, TxControlReg, TxASKReg,
+    TModeReg, TPrescalerReg, TReloadRegH, TReloadRegL,
+})
+
+
 # PICC commands
 PICC_REQIDL = 0x26
+PICC_WUPA = 0x52
 PICC_ANTICOLL = 0x93
+PICC_HLTA = [0x50, 0x00, 0x57, 0xCD]  # HLTA + CRC_A
+
+
+# Per-slot SPI clock steps, fastest first. Each slot starts at the top and steps
+# down on bus/RF errors; CLOCK_CLEAN_STREAK clean attempts step it back up.
+SPI_SPEED_STEPS_HZ = (2_000_000, 1_000_000, 500_000, 250_000, 100_000, 50_000)
+CLOCK_CLEAN_STREAK = 200
+CLOCK_PROFILE_PATH = os.environ.get("NFC_CLOCK_PROFILE", "/var/tmp/kms_nfc_clock_profile.json")
+SELFTEST_PATH = os.environ.get("NFC_SELFTEST_CACHE", "/var/tmp/kms_nfc_selftest.json")
+
+# Read/settle latency histogram bounds; the textfile goes where node-exporter's
+# textfile collector looks on Debian, if that directory exists
+LATENCY_BUCKETS_MS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+_DEFAULT_METRICS_DIR = "/var/lib/prometheus/node-exporter"
+METRICS_TEXTFILE = os.environ.get(
+    "NFC_METRICS_TEXTFILE",
+    os.path.join(_DEFAULT_METRICS_DIR, "kms_nfc.prom") if os.path.isdir(_DEFAULT_METRICS_DIR) else "",
+)
+METRICS_INTERVAL_S = float(os.environ.get("NFC_METRICS_INTERVAL_S", "15"))
+
+# Optional JSON file {"<slot>": [bus, ce, rst_pin], ...} for cabinets wired across
+# several SPI controllers; unset means every slot on spidev0.0 per SLOT_CS_MAP
+NFC_TOPOLOGY_PATH = os.environ.get("NFC_TOPOLOGY")
+
+
+class IrqLine:
+    """RC522 IRQ output on a GPIO (active LOW, open drain, shared by all readers)."""
+
+    def __init__(self, chip: int, pin: int):
+        self.chip = chip
+        self.pin = pin
+        self._event = threading.Event()
+        lgpio.gpio_claim_alert(chip, pin, lgpio.FALLING_EDGE, lgpio.SET_PULL_UP)
+        self._cb = lgpio.callback(chip, pin, lgpio.FALLING_EDGE, self._on_edge)
+
+    def _on_edge(self, chip, gpio, level, tick) -> None:
+        self._event.set()
+
+    def arm(self) -> None:
+        self._event.clear()
+
+    def asserted(self) -> bool:
+        return lgpio.gpio_read(self.chip, self.pin) == 0
+
+    def wait(self, timeout_s: float) -> bool:
+        # Level check first: the edge may have fired before we started waiting
+        if self.asserted():
+            return True
+        return self._event.wait(timeout_s) or self.asserted()
+
+    def close(self) -> None:
+        try:
+            self._cb.cancel()
+        except Exception:
+            pass
+        try:
+            lgpio.gpio_free(self.chip, self.pin)
+        except Exception:
+            pass
 
 
 class Rc522:
-    def __init__(self, spi: spidev.SpiDev):
+    def __init__(self, spi: spidev.SpiDev, irq: Optional[IrqLine] = None, poll_s: float = 0.0005):
         self.spi = spi
-        self._init_chip()
+        self.irq = irq
+        self.poll_s = poll_s  # yield between ComIrqReg polls when no IRQ line is wired
+        self.xfers = 0  # SPI frames issued (for timing / diagnostics)
+        self.faults = 0  # bad version reads, ErrorReg bits, BCC mismatches
+        self.timeouts = 0  # transceives that hit the software deadline
+        self.err_reg = 0  # ... and those failed by ErrorReg bits
+        self.bcc_errors = 0
+        self._shadow: dict[int, int] = {}
+        # No _init_chip() here: nothing is selected yet, and every read configures
+        # the chip after its RST goes HIGH anyway
+
+    def _xfer(self, data: list[int]) -> list[int]:
+        self.xfers += 1
+        return self.spi.xfer2(data)
+
+    def counters(self) -> dict[str, int]:
+        return {name: getattr(self, name) for name in CHIP_COUNTERS}
+
+    def invalidate(self) -> None:
+        """Forget shadowed register values (RST toggled or chip reset detected)."""
+        self._shadow.clear()
 
     def _write_reg(self, addr: int, val: int) -> None:
+        val &= 0xFF
+        if addr in SHADOWED_REGS:
+            if self._shadow.get(addr) == val:
+                return
+            self._shadow[addr] = val
         # Address format: 0XXXXXX0 for write
-        self.spi.xfer2([(addr << 1) & 0x7E, val & 0xFF])
+        self._xfer([(addr << 1) & 0x7E, val])
 
     def _read_reg(self, addr: int) -> int:
+        cached = self._shadow.get(addr)
+        if cached is not None:
+            return cached
         # Address format: 1XXXXXX0 for read
-        res = self.spi.xfer2([((addr << 1) & 0x7E) | 0x80, 0x00])
+        res = self._xfer([((addr << 1) & 0x7E) | 0x80, 0x00])
+        if addr in SHADOWED_REGS:
+            self._shadow[addr] = res[1]
         return res[1]
 
+    def _write_burst(self, addr: int, vals: list[int]) -> None:
+        # MFRC522 keeps writing to the same address for every byte after the
+        # address byte, so a whole FIFO payload fits in one frame.
+        if vals:
+            self._xfer([(addr << 1) & 0x7E] + [v & 0xFF for v in vals])
+
+    def _read_regs(self, addrs: list[int]) -> list[int]:
+        # Multi-address read: each byte clocks out the next address while the
+        # chip answers the previous one; a trailing 0x00 collects the last value.
+        if not addrs:
+            return []
+        res = self._xfer([((a << 1) & 0x7E) | 0x80 for a in addrs] + [0x00])
+        return res[1:]
+
     def _set_bitmask(self, reg: int, mask: int) -> None:
         self._write_reg(reg, self._read_reg(reg) | mask)
 
@@ -106,69 +481,108 @@ class Rc522:
         self._write_reg(reg, self._read_reg(reg) & (~mask & 0xFF))
 
     def _init_chip(self) -> None:
+        # Only called when the chip may have lost state, so start from scratch
+        self.invalidate()
+
         # Skip SoftReset for FM17522E clone compatibility
         self._write_reg(CommandReg, PCD_IDLE)
 
         # Timer: TAuto=1; f(Timer) = 6.78MHz / (2*TPreScaler+1)
-        self._write_reg(TModeReg, 0x8D)
-        self._write_reg(TPrescalerReg, 0x3E)
+        self._write_reg(TModeReg, INIT_TMODE)
+        self._write_reg(TPrescalerReg, INIT_TPRESCALER)
         self._write_reg(TReloadRegL, 30)
         self._write_reg(TReloadRegH, 0)
 
         self._write_reg(TxASKReg, 0x40)
         self._write_reg(ModeReg, 0x3D)
+
+        if self.irq is not None:
+            # IRQ pin active LOW (IRqInv=1) on RxIRq | IdleIRq | TimerIRq; DivIEnReg
+            # IRQPushPull=0 keeps it open drain so several readers can share one line
+            self._write_reg(ComIEnReg, 0xB1)
+            self._write_reg(DivIEnReg, 0x00)
+
         self.antenna_on()
 
+    def version(self) -> int:
+        """Read VersionReg; 0x00/0xFF means the bus is not talking to a chip."""
+        ver = self._read_reg(VersionReg)
+        if ver in (0x00, 0xFF):
+            self.faults += 1
+        return ver
+
+    def probe(self) -> Tuple[int, bool]:
+        """One frame: VersionReg plus the timer marker. Returns (version, still_configured)."""
+        ver, tmode, tprescaler = self._read_regs([VersionReg, TModeReg, TPrescalerReg])
+        if ver in (0x00, 0xFF):
+            self.faults += 1
+        return ver, (tmode, tprescaler) == (INIT_TMODE, INIT_TPRESCALER)
+
+    def ready(self) -> bool:
+        """Out of reset: VersionReg answers and CommandReg.PowerDown has cleared."""
+        ver, command = self._read_regs([VersionReg, CommandReg])
+        return ver not in (0x00, 0xFF) and not command & 0x10
+
     def antenna_on(self) -> None:
         if (self._read_reg(TxControlReg) & 0x03) != 0x03:
             self._set_bitmask(TxControlReg, 0x03)
 
     def _to_card(self, command: int, send_data: list[int], timeout_ms: int = 30) -> Tuple[bool, list[int], int]:
-        back_data: list[int] = []
-        back_len_bits = 0
-
         self._write_reg(CommandReg, PCD_IDLE)
         self._write_reg(ComIrqReg, 0x7F)
-        self._set_bitmask(FIFOLevelReg, 0x80)  # flush FIFO
+        self._write_reg(FIFOLevelReg, 0x80)  # flush FIFO (bits 6..0 are read-only)
 
-        for d in send_data:
-            self._write_reg(FIFODataReg, d)
+        self._write_burst(FIFODataReg, send_data)
+
+        if self.irq is not None:
+            self.irq.arm()  # ComIrqReg cleared above, so the line is released
 
         self._write_reg(CommandReg, command)
         if command == PCD_TRANSCEIVE:
             self._set_bitmask(BitFramingReg, 0x80)  # StartSend=1
 
-        start = time.time()
+        deadline = time.monotonic() + timeout_ms / 1000.0
         while True:
+            if self.irq is not None:
+                self.irq.wait(max(0.0, deadline - time.monotonic()))
             irq = self._read_reg(ComIrqReg)
             if irq & 0x01:  # Timer interrupt
                 return False, [], 0
             if irq & 0x30:  # RxIRq or IdleIRq
                 break
-            if (time.time() - start) * 1000 >= timeout_ms:
+            if time.monotonic() >= deadline:
+                self.timeouts += 1
                 return False, [], 0
+            if self.irq is not None:
+                self.irq.arm()
+            else:
+                time.sleep(self.poll_s)
+
+        self._clear_bitmask(BitFramingReg, 0x80)  # StartSend=0 (shadowed, no read)
 
-        self._clear_bitmask(BitFramingReg, 0x80)
+        # One frame for everything needed after completion
+        err, fifo_level, control = self._read_regs([ErrorReg, FIFOLevelReg, ControlReg])
 
-        err = self._read_reg(ErrorReg)
         if err & 0x1B:  # BufferOvfl, ParityErr, ProtocolErr, CollErr
+            self.faults += 1
+            self.err_reg += 1
             return False, [], 0
 
-        fifo_level = self._read_reg(FIFOLevelReg)
-        last_bits = self._read_reg(ControlReg) & 0x07
+        fifo_level = min(fifo_level & 0x7F, 64)
+        last_bits = control & 0x07
         if last_bits:
             back_len_bits = (fifo_level - 1) * 8 + last_bits
         else:
             back_len_bits = fifo_level * 8
 
-        for _ in range(fifo_level):
-            back_data.append(self._read_reg(FIFODataReg))
+        back_data = self._read_regs([FIFODataReg] * fifo_level)
 
         return True, back_data, back_len_bits
 
-    def request(self) -> bool:
+    def request(self, wake: bool = False) -> bool:
+        # WUPA also answers from HALT, so it never misses a card that is there
         self._write_reg(BitFramingReg, 0x07)  # TxLastBits = 7
-        ok, back, bits = self._to_card(PCD_TRANSCEIVE, [PICC_REQIDL])
+        ok, back, bits = self._to_card(PCD_TRANSCEIVE, [PICC_WUPA if wake else PICC_REQIDL])
         return ok and bits == 0x10 and len(back) >= 2
 
     def anticoll(self) -> Optional[list[int]]:
@@ -179,12 +593,25 @@ class Rc522:
         uid = back[0:4]
         bcc = back[4]
         if (uid[0] ^ uid[1] ^ uid[2] ^ uid[3]) != bcc:
+            self.faults += 1
+            self.bcc_errors += 1
             return None
         return uid
 
-    def read_uid_hex(self) -> Optional[str]:
+    def set_timer_reload(self, ticks: int) -> None:
+        """Receive timeout in timer ticks (0.5 ms with INIT_TPRESCALER); _init_chip sets 30."""
+        self._write_reg(TReloadRegL, ticks & 0xFF)
+        self._write_reg(TReloadRegH, (ticks >> 8) & 0xFF)
+
+    def halt(self) -> None:
+        """Send HLTA. The tag parks in HALT (or drops to IDLE from READY), so the next
+        WUPA gets an answer even though the field never went off."""
+        self._write_reg(BitFramingReg, 0x00)
+        self._to_card(PCD_TRANSMIT, PICC_HLTA)  # no reply expected: ends on IdleIRq once sent
+
+    def read_uid_hex(self, wake: bool = False) -> Optional[str]:
         # Quick path: request + anticollision
-        if not self.request():
+        if not self.request(wake):
             return None
         uid = self.anticoll()
         if not uid:
@@ -192,115 +619,1999 @@ class Rc522:
         return "".join(f"{b:02X}" for b in uid)
 
 
-class MultiReader:
+class ClockProfile:
+    """Per-slot index into SPI_SPEED_STEPS_HZ, persisted across restarts."""
+
+    def __init__(self, slots, path: Optional[str] = CLOCK_PROFILE_PATH):
+        self.path = path
+        self.step = {slot: 0 for slot in slots}
+        self.streak = {slot: 0 for slot in slots}
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, hz in saved.items():
+            slot = int(key)
+            if slot in self.step and hz in SPI_SPEED_STEPS_HZ:
+                self.step[slot] = SPI_SPEED_STEPS_HZ.index(hz)
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        data = {str(slot): self.speed(slot) for slot in self.step}
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=".nfc_clock_")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[PY] clock profile not saved: {e}", file=sys.stderr, flush=True)
+
+    def speed(self, slot: int) -> int:
+        return SPI_SPEED_STEPS_HZ[self.step[slot]]
+
+    def record(self, slot: int, clean: bool) -> None:
+        if not clean:
+            self.streak[slot] = 0
+            if self.step[slot] < len(SPI_SPEED_STEPS_HZ) - 1:
+                self.step[slot] += 1
+                self._save()
+            return
+        self.streak[slot] += 1
+        if self.streak[slot] >= CLOCK_CLEAN_STREAK and self.step[slot] > 0:
+            self.streak[slot] = 0
+            self.step[slot] -= 1
+            self._save()
+
+
+class SelfTestCache:
+    """Last per-slot self-test (VersionReg, responsive or not), persisted so a restart
+    can pick chip-specific read paths before the readers are probed again."""
+
+    def __init__(self, topology: dict[int, Tuple[int, int, int]], path: Optional[str] = SELFTEST_PATH):
+        self.path = path
+        self.wiring = {str(slot): list(w) for slot, w in sorted(topology.items())}
+        self.tested_at: Optional[float] = None  # epoch seconds of the results in use
+
+    def load(self) -> dict[int, int]:
+        if not self.path:
+            return {}
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if saved.get("wiring") != self.wiring:
+                return {}  # different cabinet layout: results don't apply
+            versions = {int(key): int(entry["version"], 16) for key, entry in saved["slots"].items()}
+            self.tested_at = float(saved["t"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
+        return versions
+
+    def save(self, versions: dict[int, int]) -> None:
+        self.tested_at = time.time()
+        if not self.path:
+            return
+        data = {"t": self.tested_at, "wiring": self.wiring, "slots": {
+            str(slot): {"version": f"0x{ver:02X}", "responsive": ver not in (0x00, 0xFF)}
+            for slot, ver in sorted(versions.items())
+        }}
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path) or ".", prefix=".nfc_selftest_")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[PY] self-test cache not saved: {e}", file=sys.stderr, flush=True)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds), Prometheus style."""
+
+    def __init__(self, bounds_ms: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.bounds = bounds_ms
+        self.counts = [0] * (len(bounds_ms) + 1)  # last bucket is +Inf
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        i = 0
+        while i < len(self.bounds) and ms > self.bounds[i]:
+            i += 1
+        self.counts[i] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile, capped at the observed max."""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return round(min(self.bounds[i], self.max_ms) if i < len(self.bounds) else self.max_ms, 2)
+        return round(self.max_ms, 2)
+
+    def summary(self) -> dict:
+        if not self.total:
+            return {"count": 0}
+        return {
+            "count": self.total,
+            "avg": round(self.sum_ms / self.total, 2),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "max": round(self.max_ms, 2),
+        }
+
+
+# Rc522 counters attributed to a slot as deltas around each read
+CHIP_COUNTERS = ("xfers", "timeouts", "err_reg", "bcc_errors")
+READ_RESULTS = ("uid", "empty", "expired", "error")
+
+
+class SlotMetrics:
     def __init__(self):
-        self.chip = lgpio.gpiochip_open(0)
-        self.rst_lines = {}
-        for slot, pin in SLOT_CS_MAP.items():
-            # default LOW (disabled) to avoid bus contention
-            lgpio.gpio_claim_output(self.chip, pin, 0)
-            self.rst_lines[slot] = pin
+        self.reads = {r: 0 for r in READ_RESULTS}
+        self.presence = {"hit": 0, "miss": 0}
+        self.retries = 0
+        self.chip = {c: 0 for c in CHIP_COUNTERS}
+        self.read_ms = Histogram()
+        self.settle_ms = Histogram()
+
+
+class Metrics:
+    """Per-slot counters and latency histograms, shared by every bus worker."""
+
+    def __init__(self, slots):
+        self.started = time.monotonic()
+        self.slots = {slot: SlotMetrics() for slot in slots}
+        self._lock = threading.Lock()
+
+    def record_read(self, slot: int, result: str, ms: float, chip_delta: dict[str, int]) -> None:
+        with self._lock:
+            m = self.slots[slot]
+            m.reads[result] += 1
+            m.read_ms.observe(ms)
+            for name, n in chip_delta.items():
+                m.chip[name] += n
+
+    def record_presence(self, slot: int, hit: bool, chip_delta: dict[str, int]) -> None:
+        with self._lock:
+            m = self.slots[slot]
+            m.presence["hit" if hit else "miss"] += 1
+            for name, n in chip_delta.items():
+                m.chip[name] += n
+
+    def record_retry(self, slot: int) -> None:
+        with self._lock:
+            self.slots[slot].retries += 1
+
+    def record_settle(self, slot: int, ms: float) -> None:
+        with self._lock:
+            self.slots[slot].settle_ms.observe(ms)
+
+    def snapshot(self, slots, clock: ClockProfile, breaker: SlotBreaker) -> dict:
+        """JSON view for the "stats" command."""
+        with self._lock:
+            out = {}
+            for slot in slots:
+                m = self.slots[slot]
+                out[str(slot)] = {
+                    "reads": dict(m.reads),
+                    "presence": dict(m.presence),
+                    "retries": m.retries,
+                    **m.chip,
+                    "hz": clock.speed(slot),
+                    "read_ms": m.read_ms.summary(),
+                    "settle_ms": m.settle_ms.summary(),
+                    "reader": breaker.snapshot(slot),
+                }
+            return {"uptime_s": round(time.monotonic() - self.started, 1), "slots": out}
+
+    def prometheus(self, clock: ClockProfile, breaker: SlotBreaker) -> str:
+        """Node-exporter textfile body (text exposition format 0.0.4)."""
+        lines: list[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def histogram(name: str, attr: str, help_text: str) -> None:
+            family(name, "histogram", help_text)
+            for slot, m in items:
+                h: Histogram = getattr(m, attr)
+                cumulative = 0
+                for bound, n in zip(h.bounds + (None,), h.counts):
+                    cumulative += n
+                    le = "+Inf" if bound is None else repr(bound / 1000.0)
+                    lines.append(f'{name}_bucket{{slot="{slot}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{slot="{slot}"}} {h.sum_ms / 1000.0:.6f}')
+                lines.append(f'{name}_count{{slot="{slot}"}} {h.total}')
+
+        with self._lock:
+            items = sorted(self.slots.items())
+            family("kms_nfc_reads_total", "counter", "UID reads by result.")
+            for slot, m in items:
+                for result, n in m.reads.items():
+                    lines.append(f'kms_nfc_reads_total{{slot="{slot}",result="{result}"}} {n}')
+            family("kms_nfc_presence_checks_total", "counter", "Fast presence checks by outcome.")
+            for slot, m in items:
+                for result, n in m.presence.items():
+                    lines.append(f'kms_nfc_presence_checks_total{{slot="{slot}",result="{result}"}} {n}')
+            family("kms_nfc_read_retries_total", "counter", "Read attempts beyond the first.")
+            for slot, m in items:
+                lines.append(f'kms_nfc_read_retries_total{{slot="{slot}"}} {m.retries}')
+            for name, attr, help_text in (
+                ("kms_nfc_spi_transfers_total", "xfers", "SPI frames issued."),
+                ("kms_nfc_transceive_timeouts_total", "timeouts", "Transceives that never completed."),
+                ("kms_nfc_errorreg_failures_total", "err_reg", "Transceives failed by ErrorReg bits."),
+                ("kms_nfc_bcc_failures_total", "bcc_errors", "Anticollision replies with a bad BCC."),
+            ):
+                family(name, "counter", help_text)
+                for slot, m in items:
+                    lines.append(f'{name}{{slot="{slot}"}} {m.chip[attr]}')
+            family("kms_nfc_spi_clock_hz", "gauge", "Current SPI clock of the slot.")
+            for slot, _ in items:
+                lines.append(f'kms_nfc_spi_clock_hz{{slot="{slot}"}} {clock.speed(slot)}')
+            family("kms_nfc_reader_quarantined", "gauge", "1 while the slot's reader is quarantined.")
+            for slot, _ in items:
+                lines.append(f'kms_nfc_reader_quarantined{{slot="{slot}"}} {int(breaker.quarantined(slot))}')
+            family("kms_nfc_reader_quarantines_total", "counter", "Times the slot's reader was quarantined.")
+            for slot, _ in items:
+                lines.append(f'kms_nfc_reader_quarantines_total{{slot="{slot}"}} {breaker.trips[slot]}')
+            histogram("kms_nfc_read_duration_seconds", "read_ms", "Full UID read time, bus lock held.")
+            histogram("kms_nfc_settle_duration_seconds", "settle_ms", "Wait for the reader after RST.")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: str, clock: ClockProfile, breaker: SlotBreaker) -> None:
+        body = self.prometheus(clock, breaker)
+        # Same atomic replace as the clock profile: node-exporter never sees half a file
+        try:
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".kms_nfc_")
+            with os.fdopen(fd, "w") as f:
+                f.write(body)
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except OSError as e:
+            print(f"[PY] metrics not written: {e}", file=sys.stderr, flush=True)
+
+
+class DeadlineExpired(Exception):
+    """The requester's deadline passed before the read could finish."""
+
+
+class ReaderQuarantined(Exception):
+    """The slot's reader stopped answering and is only probed now and then."""
+
+
+# Don't start a read attempt with less than this left before the deadline
+READ_ATTEMPT_MIN_S = 0.003
+
+
+def _check_deadline(deadline: Optional[float], need_s: float = 0.0) -> None:
+    if deadline is not None and time.monotonic() + need_s >= deadline:
+        raise DeadlineExpired("deadline expired")
+
+
+# ── Wire framing ──
+# "jsonl" (default): one JSON object per line.
+# "bin1": u16 LE length (type byte + payload), u8 type, payload. Reads get fixed structs,
+# everything else (scan, status, events, errors) rides in a JSON frame.
+FRAME_JSON = 0x00
+FRAME_READ = 0x01        # <I id><B slot><H deadline_ms, 0 = none>
+_FRAME_READ_BODY = struct.Struct("<IBH")
+FRAME_READ_REPLY = 0x81  # <I id><B status|flags><B uid_len><uid bytes>
+READ_OK_EMPTY, READ_OK_UID, READ_EXPIRED = 0, 1, 2
+READ_FLAG_CACHED = 0x80
+READ_FLAG_MATCH = 0x10     # uid equals the slot's expected UID
+READ_FLAG_MISMATCH = 0x20  # slot has an expected UID and this is not it
+_READ_REPLY_KEYS = frozenset({"id", "ok", "uid", "cached", "expired", "error", "match"})
+
+
+def _read_exact(stream, n: int) -> bytes:
+    data = stream.read(n)
+    if len(data) < n:
+        raise EOFError
+    return data
+
+
+async def _aread_exact(reader: asyncio.StreamReader, n: int) -> bytes:
+    try:
+        return await reader.readexactly(n)
+    except asyncio.IncompleteReadError:
+        raise EOFError from None
+
+
+class JsonlCodec:
+    name = "jsonl"
+
+    def read(self, stream) -> Optional[dict]:
+        line = stream.readline()
+        if not line:
+            raise EOFError
+        return self.decode(line)
+
+    async def aread(self, reader: asyncio.StreamReader) -> Optional[dict]:
+        line = await reader.readline()
+        if not line:
+            raise EOFError
+        return self.decode(line)
+
+    def decode(self, line: bytes) -> Optional[dict]:
+        line = line.strip()
+        return json.loads(line) if line else None
+
+    def encode(self, msg: dict) -> bytes:
+        return (json.dumps(msg) + "\n").encode()
+
+
+class Bin1Codec:
+    name = "bin1"
+
+    def read(self, stream) -> Optional[dict]:
+        (n,) = struct.unpack("<H", _read_exact(stream, 2))
+        return self.decode(_read_exact(stream, n))
+
+    async def aread(self, reader: asyncio.StreamReader) -> Optional[dict]:
+        (n,) = struct.unpack("<H", await _aread_exact(reader, 2))
+        return self.decode(await _aread_exact(reader, n))
+
+    def decode(self, frame: bytes) -> Optional[dict]:
+        if not frame:
+            return None
+        kind = frame[0]
+        if kind == FRAME_JSON:
+            return json.loads(frame[1:])
+        if kind == FRAME_READ:
+            if len(frame) != 1 + _FRAME_READ_BODY.size:
+                raise ValueError(f"read frame is {len(frame)} bytes, expected {1 + _FRAME_READ_BODY.size}")
+            req_id, slot, deadline_ms = _FRAME_READ_BODY.unpack_from(frame, 1)
+            req = {"id": req_id, "cmd": "read", "slot": slot}
+            if deadline_ms:
+                req["deadline_ms"] = deadline_ms
+            return req
+        raise ValueError(f"unknown frame type 0x{kind:02X}")
+
+    def encode(self, msg: dict) -> bytes:
+        # Plain read replies (uid or expired) get the fixed struct
+        if isinstance(msg.get("id"), int) and msg.keys() <= _READ_REPLY_KEYS and ("uid" in msg or msg.get("expired")):
+            uid = bytes.fromhex(msg["uid"]) if msg.get("uid") else b""
+            status = READ_EXPIRED if msg.get("expired") else (READ_OK_UID if uid else READ_OK_EMPTY)
+            if msg.get("cached"):
+                status |= READ_FLAG_CACHED
+            if msg.get("match") == "match":
+                status |= READ_FLAG_MATCH
+            elif msg.get("match") == "mismatch":
+                status |= READ_FLAG_MISMATCH
+            body = struct.pack("<BIBB", FRAME_READ_REPLY, msg["id"] & 0xFFFFFFFF, status, len(uid)) + uid
+        else:
+            body = bytes([FRAME_JSON]) + json.dumps(msg, separators=(",", ":")).encode()
+        return struct.pack("<H", len(body)) + body
+
+
+CODECS = {"jsonl": JsonlCodec(), "bin1": Bin1Codec()}
+
+
+class Output:
+    """One peer's outgoing stream, shared by replies and the subscribe thread.
+    Messages queued in the same event-loop turn go out in one write + flush."""
+
+    def __init__(self, write, flush=None):
+        self._write = write
+        self._flush = flush
+        self.codec = CODECS["jsonl"]
+        self.closed = False
+        self._buf = bytearray()
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._flush_scheduled = False
+
+    def attach(self, loop: Optional[asyncio.AbstractEventLoop]) -> None:
+        self._loop = loop
+        if loop is None:
+            self.flush()
+
+    def send(self, msg: dict, switch_to=None) -> None:
+        """Queue msg; switch_to then changes the codec in the same critical section,
+        so nothing another thread sends can land between msg and the switch."""
+        with self._lock:
+            if self.closed:
+                return
+            self._buf += self.codec.encode(msg)
+            if switch_to is not None:
+                self.codec = switch_to
+            if self._loop is not None:
+                if self._flush_scheduled:
+                    return
+                self._flush_scheduled = True
+        if self._loop is None:
+            self.flush()
+        else:
+            self._loop.call_soon_threadsafe(self.flush)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_scheduled = False
+            if self.closed or not self._buf:
+                return
+            try:
+                self._write(bytes(self._buf))
+                if self._flush is not None:
+                    self._flush()
+            except OSError:
+                # Peer went away; later messages to it are dropped
+                self.closed = True
+            self._buf.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            self.closed = True
+            self._buf.clear()
+
+
+class Client:
+    """A protocol peer: the spawning process on stdio, or one Unix-socket connection.
+    Observers may listen to events and query status but never drive the bus."""
+
+    def __init__(self, name: str, out: Output, base_prio: int = 0):
+        self.name = name
+        self.out = out
+        self.role = "controller"
+        self.base_prio = base_prio  # added to every hardware request's priority
+        self.max_queued: Optional[int] = None
+        self.queued = 0
+
+    @property
+    def observer(self) -> bool:
+        return self.role == "observer"
+
+    def send(self, msg: dict) -> None:
+        self.out.send(msg)
+
+
+def _transition_event(slot: int, prev: Optional[str], uid: Optional[str]) -> dict:
+    if prev is None:
+        kind = "present"
+    elif uid is None:
+        kind = "removed"
+    else:
+        kind = "changed"
+    ev = {"event": kind, "slot": slot, "uid": uid, "t_ms": round(time.monotonic() * 1000, 1)}
+    if prev is not None:
+        ev["prev"] = prev
+    return ev
+
+
+def match_expected(expected: dict[int, str], slot: int, uid: Optional[str]) -> str:
+    """Classify a read against the expected-UID table: empty, match, mismatch or unknown."""
+    if uid is None:
+        return "empty"
+    want = expected.get(slot)
+    if want is None:
+        return "unknown"
+    return "match" if uid == want else "mismatch"
+
+
+def _counter_delta(before: dict[str, int], after: dict[str, int]) -> dict[str, int]:
+    return {name: after[name] - before[name] for name in after}
+
+
+def load_topology(path: Optional[str] = NFC_TOPOLOGY_PATH) -> dict[int, Tuple[int, int, int]]:
+    """slot -> (spi bus, chip-enable, RST select pin). Default: every slot on spidev0.0."""
+    if not path:
+        return {slot: (0, 0, pin) for slot, pin in SLOT_CS_MAP.items()}
+    with open(path) as f:
+        raw = json.load(f)
+    return {int(slot): (int(v[0]), int(v[1]), int(v[2])) for slot, v in raw.items()}
+
+
+def _parse_irq_map(value: Optional[str]) -> dict[Tuple[int, int], int]:
+    # "25" -> bus 0.0 on GPIO25; "0.0=25,1.0=24" -> one IRQ line per bus
+    out: dict[Tuple[int, int], int] = {}
+    for part in (value or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            key, pin = part.split("=", 1)
+            bus, ce = key.split(".")
+            out[(int(bus), int(ce))] = int(pin)
+        else:
+            out[(0, 0)] = int(part)
+    return out
+
+
+class SpiBus:
+    """One SPI controller + CE with its own Rc522; readers on it are selected by RST."""
+
+    def __init__(self, chip: int, bus: int, ce: int, rst_lines: dict[int, int],
+                 irq_pin: Optional[int] = None, poll_s: float = 0.0005):
+        self.chip = chip
+        self.name = f"{bus}.{ce}"
+        self.rst_lines = rst_lines  # slot -> RST pin, only the slots on this bus
+        self.active: Optional[int] = None  # slot whose RST is HIGH, if any
+        # The RST lines form one lgpio group (leader = first pin, bit i = i-th slot),
+        # claimed LOW (disabled) to avoid bus contention. Selecting a reader is then
+        # one masked write: the old RST falls as the new one rises, nothing else moves.
+        order = sorted(rst_lines)
+        self._leader = rst_lines[order[0]]
+        self._bit = {slot: 1 << i for i, slot in enumerate(order)}
+        lgpio.group_claim_output(chip, [rst_lines[slot] for slot in order], [0] * len(order))
+        # Serialises access to this bus between request handling and the subscribe loop
+        self.lock = threading.RLock()
 
         self.spi = spidev.SpiDev()
-        self.spi.open(0, 0)
-        # Long wires / multi-drop setups are noisy; keep it slow for stability
-        self.spi.max_speed_hz = 50_000
+        self.spi.open(bus, ce)
+        # Long wires / multi-drop setups are noisy; start slow, then each read
+        # switches to the slot's own clock from the profile
+        self.spi.max_speed_hz = SPI_SPEED_STEPS_HZ[-1]
         self.spi.mode = 0
 
-        self.rc522 = Rc522(self.spi)
+        self.irq: Optional[IrqLine] = None
+        if irq_pin is not None:
+            try:
+                self.irq = IrqLine(chip, irq_pin)
+            except Exception as e:
+                print(f"[PY] IRQ line GPIO{irq_pin} unavailable on spi{self.name}, polling instead: {e}",
+                      file=sys.stderr, flush=True)
+
+        self.rc522 = Rc522(self.spi, irq=self.irq, poll_s=poll_s)
+
+    def activate_slot(self, slot: int) -> None:
+        bit = self._bit[slot]
+        if self.active == slot:
+            # Already HIGH: drop it first so the chip still gets its reset pulse
+            lgpio.group_write(self.chip, self._leader, 0, bit)
+        lgpio.group_write(self.chip, self._leader, bit, bit | self._bit.get(self.active, 0))
+        self.active = slot
+        self.rc522.invalidate()  # RST pulse resets every register
+
+    def deactivate_all(self) -> None:
+        if self.active is not None:
+            lgpio.group_write(self.chip, self._leader, 0, self._bit[self.active])
+        self.active = None
+        self.rc522.invalidate()
 
     def close(self) -> None:
         try:
-            for pin in self.rst_lines.values():
+            lgpio.group_write(self.chip, self._leader, 0, sum(self._bit.values()))
+            lgpio.group_free(self.chip, self._leader)
+        except Exception:
+            pass
+        if self.irq is not None:
+            self.irq.close()
+        try:
+            self.spi.close()
+        except Exception:
+            pass
+
+
+# Adaptive subscribe scheduling: a slot's score is (time since it was last read)
+# x weight; the weight grows for slots that changed recently (decaying) and for
+# slots the host has flagged with "focus" (a borrow or return in progress).
+SCHED_HOT_WEIGHT = 4.0
+SCHED_HOT_TAU_S = 10.0
+SCHED_FOCUS_WEIGHT = 16.0
+SCHED_MAX_STALE_S = 2.0
+SCHED_MIN_PERIOD_S = 0.02  # subscribe period floor: the loop always yields between cycles
+
+
+class SlotScheduler:
+    """Chooses which slot each bus reads next; every slot is read at least every max_stale_s."""
+
+    def __init__(self, slots, max_stale_s: float = SCHED_MAX_STALE_S):
+        self.max_stale_s = max_stale_s
+        self.last_scan = {slot: 0.0 for slot in slots}
+        self.last_change = {slot: float("-inf") for slot in slots}
+        self.focus_until: dict[int, float] = {}
+        self._seen: dict[int, Optional[str]] = {}
+
+    def focus(self, slots: list[int], duration_s: float) -> None:
+        until = time.monotonic() + duration_s
+        for slot in slots:
+            if duration_s > 0:
+                self.focus_until[slot] = until
+            else:
+                self.focus_until.pop(slot, None)
+
+    def focused(self) -> list[int]:
+        now = time.monotonic()
+        return sorted(slot for slot, until in self.focus_until.items() if until > now)
+
+    def observe(self, slot: int, uid: Optional[str]) -> None:
+        """A read of slot finished (any caller); uid None means empty or failed."""
+        now = time.monotonic()
+        self.last_scan[slot] = now
+        if slot in self._seen and self._seen[slot] != uid:
+            self.last_change[slot] = now
+        self._seen[slot] = uid
+
+    def touch(self, slot: int) -> None:
+        self.last_scan[slot] = time.monotonic()
+
+    def weight(self, slot: int, now: float) -> float:
+        w = 1.0 + SCHED_HOT_WEIGHT * math.exp(-(now - self.last_change[slot]) / SCHED_HOT_TAU_S)
+        if self.focus_until.get(slot, 0.0) > now:
+            w += SCHED_FOCUS_WEIGHT
+        return w
+
+    def pick(self, slots: list[int], now: float) -> int:
+        ages = {slot: now - self.last_scan[slot] for slot in slots}
+        overdue = [slot for slot in slots if ages[slot] >= self.max_stale_s]
+        if overdue:
+            return max(overdue, key=ages.__getitem__)
+        return max(slots, key=lambda slot: ages[slot] * self.weight(slot, now))
+
+
+# Debounced slot state: a slot's reported state only changes once the new raw
+# state has been read on `hits` (tag) / `misses` (no tag) consecutive reads AND
+# has lasted the hold time since it was first seen. Failed and expired reads
+# count for neither side.
+DEBOUNCE_HITS = int(os.environ.get("NFC_DEBOUNCE_HITS", "1"))
+DEBOUNCE_MISSES = int(os.environ.get("NFC_DEBOUNCE_MISSES", "5"))
+DEBOUNCE_PRESENT_HOLD_S = int(os.environ.get("NFC_DEBOUNCE_PRESENT_MS", "0")) / 1000.0
+DEBOUNCE_ABSENT_HOLD_S = int(os.environ.get("NFC_DEBOUNCE_ABSENT_MS", "1000")) / 1000.0
+
+
+class Debouncer:
+    """Per-slot hysteresis over raw reads; feed() returns an event when the debounced state changes."""
+
+    def __init__(self, slots, hits: int = DEBOUNCE_HITS, misses: int = DEBOUNCE_MISSES,
+                 present_hold_s: float = DEBOUNCE_PRESENT_HOLD_S, absent_hold_s: float = DEBOUNCE_ABSENT_HOLD_S):
+        self.configure(hits=hits, misses=misses, present_hold_s=present_hold_s, absent_hold_s=absent_hold_s)
+        # slot -> debounced uid (None = empty); a slot not in here is still unknown
+        self.stable: dict[int, Optional[str]] = {}
+        # slot -> [raw uid, consecutive reads, time.monotonic() first seen]
+        self._candidate: dict[int, list] = {slot: None for slot in slots}
+
+    def configure(self, hits: int, misses: int, present_hold_s: float, absent_hold_s: float) -> None:
+        if hits < 1 or misses < 1 or present_hold_s < 0 or absent_hold_s < 0:
+            raise ValueError("debounce: hits/misses must be >= 1 and hold times >= 0")
+        self.hits, self.misses = hits, misses
+        self.present_hold_s, self.absent_hold_s = present_hold_s, absent_hold_s
+
+    def config(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses,
+                "present_hold_ms": round(self.present_hold_s * 1000),
+                "absent_hold_ms": round(self.absent_hold_s * 1000)}
+
+    def feed(self, slot: int, uid: Optional[str]) -> Optional[dict]:
+        """One raw read of slot (uid None = no tag). Called under the slot's bus lock."""
+        now = time.monotonic()
+        known = slot in self.stable
+        if known and self.stable[slot] == uid:
+            self._candidate[slot] = None
+            return None
+        cand = self._candidate.get(slot)
+        if cand is None or cand[0] != uid:
+            cand = self._candidate[slot] = [uid, 0, now]
+        cand[1] += 1
+        need, hold_s = (self.hits, self.present_hold_s) if uid else (self.misses, self.absent_hold_s)
+        if cand[1] < need or now - cand[2] < hold_s:
+            return None
+        prev = self.stable.get(slot)
+        self.stable[slot] = uid
+        self._candidate[slot] = None
+        if not known and uid is None:
+            # First confirmed state of a slot that starts out empty
+            return {"event": "absent", "slot": slot, "uid": None, "t_ms": round(now * 1000, 1)}
+        return _transition_event(slot, prev, uid)
+
+    def force(self, slot: int, uid: Optional[str]) -> Optional[dict]:
+        """Set slot's debounced state from an already-confirmed observation (a watch
+        that saw the tag leave); returns the transition event, if any."""
+        self._candidate[slot] = None
+        known = slot in self.stable
+        prev = self.stable.get(slot)
+        if known and prev == uid:
+            return None
+        self.stable[slot] = uid
+        if not known and uid is None:
+            return {"event": "absent", "slot": slot, "uid": None, "t_ms": round(time.monotonic() * 1000, 1)}
+        return _transition_event(slot, prev, uid)
+
+    def states(self, slots: list[int]) -> dict[str, Optional[str]]:
+        return {str(slot): self.stable[slot] for slot in slots if slot in self.stable}
+
+
+# watch_removal: poll one reader that stays selected between polls; the bus lock
+# is released between polls so other slots on the bus still get their reads.
+WATCH_INTERVAL_S = int(os.environ.get("NFC_WATCH_INTERVAL_MS", "5")) / 1000.0
+WATCH_MISSES = 5
+# A pull also needs the tag gone this long: an RF dropout spans several fast polls
+WATCH_ABSENT_HOLD_S = int(os.environ.get("NFC_WATCH_ABSENT_MS", "500")) / 1000.0
+WATCH_TIMER_RELOAD = 3  # ~2 ms receive timeout: ATQA comes back within ~0.1 ms
+# The subscribe loop confirms a settled occupied slot with one WUPA (presence), but
+# still reads its UID this often, so a key swapped between two visits is caught
+PRESENCE_VERIFY_S = int(os.environ.get("NFC_PRESENCE_VERIFY_MS", "5000")) / 1000.0
+
+
+# Circuit breaker: a read in which the reader never answered VersionReg (or the
+# bus failed) is a failure; BREAKER_FAILURES in a row quarantine the slot. Reads,
+# scans and the subscribe loop then skip it, except for one single-attempt probe
+# after a backoff that doubles on every failed probe. Any answer closes it again.
+BREAKER_FAILURES = int(os.environ.get("NFC_BREAKER_FAILURES", "3"))
+BREAKER_PROBE_MIN_S = int(os.environ.get("NFC_BREAKER_PROBE_MS", "1000")) / 1000.0
+BREAKER_PROBE_MAX_S = 60.0
+
+
+class SlotBreaker:
+    """Per-slot health of the reader itself (not of the tag); record() returns an event on a state change."""
+
+    def __init__(self, slots, failures: int = BREAKER_FAILURES,
+                 probe_min_s: float = BREAKER_PROBE_MIN_S, probe_max_s: float = BREAKER_PROBE_MAX_S):
+        self.failures = max(1, failures)
+        self.probe_min_s, self.probe_max_s = probe_min_s, probe_max_s
+        self.streak = {slot: 0 for slot in slots}   # consecutive failed reads
+        self.trips = {slot: 0 for slot in slots}
+        # quarantined slot -> [current backoff s, time.monotonic() of the next probe]
+        self._open: dict[int, list] = {}
+
+    def quarantined(self, slot: int) -> bool:
+        return slot in self._open
+
+    def state(self, slot: int) -> str:
+        if slot in self._open:
+            return "quarantined"
+        return "suspect" if self.streak.get(slot) else "ok"
+
+    def due(self, slot: int, now: float) -> bool:
+        """True if a read of slot would go to the hardware (healthy, or probe due)."""
+        q = self._open.get(slot)
+        return q is None or now >= q[1]
+
+    def admit(self, slot: int) -> bool:
+        """Called under the slot's bus lock before a read. False = skip it; True while
+        quarantined claims the probe, so concurrent readers don't all probe."""
+        q = self._open.get(slot)
+        if q is None:
+            return True
+        now = time.monotonic()
+        if now < q[1]:
+            return False
+        q[1] = now + q[0]
+        return True
+
+    def record(self, slot: int, responsive: bool) -> Optional[dict]:
+        now = time.monotonic()
+        if responsive:
+            self.streak[slot] = 0
+            if self._open.pop(slot, None) is None:
+                return None
+            return {"event": "reader", "slot": slot, "state": "ok", "t_ms": round(now * 1000, 1)}
+        self.streak[slot] += 1
+        q = self._open.get(slot)
+        if q is not None:
+            q[0] = min(q[0] * 2, self.probe_max_s)
+            q[1] = now + q[0]
+            return None
+        if self.streak[slot] >= self.failures:
+            return self.trip(slot)
+        return None
+
+    def trip(self, slot: int) -> Optional[dict]:
+        """Quarantine slot now (self-test found no reader); None if it already is."""
+        if slot in self._open:
+            return None
+        now = time.monotonic()
+        self.trips[slot] += 1
+        self._open[slot] = [self.probe_min_s, now + self.probe_min_s]
+        return {"event": "reader", "slot": slot, "state": "quarantined",
+                "probe_in_ms": round(self.probe_min_s * 1000), "t_ms": round(now * 1000, 1)}
+
+    def snapshot(self, slot: int) -> dict:
+        out = {"state": self.state(slot), "failures": self.streak[slot], "quarantines": self.trips[slot]}
+        q = self._open.get(slot)
+        if q is not None:
+            out["probe_in_ms"] = max(0, round((q[1] - time.monotonic()) * 1000))
+        return out
+
+    def quarantined_slots(self) -> list[int]:
+        return sorted(self._open)
+
+
+class MultiReader:
+    def __init__(self, topology: Optional[dict[int, Tuple[int, int, int]]] = None):
+        t0 = time.monotonic()
+        load_backend()
+        self._sub_thread: Optional[threading.Thread] = None
+        self._sub_stop = threading.Event()
+
+        if topology is None:
+            topology = load_topology()
+
+        self.chip = lgpio.gpiochip_open(0)
+        self.rst_lines: dict[int, int] = {}
+        by_bus: dict[Tuple[int, int], dict[int, int]] = {}
+        for slot, (bus, ce, pin) in sorted(topology.items()):
+            self.rst_lines[slot] = pin
+            by_bus.setdefault((bus, ce), {})[slot] = pin
+
+        irq_map = _parse_irq_map(os.environ.get("NFC_IRQ_GPIO"))
+        poll_s = int(os.environ.get("NFC_POLL_US", "500")) / 1_000_000
+        self.buses: list[SpiBus] = []
+        self.slot_bus: dict[int, SpiBus] = {}
+        for (bus, ce), lines in by_bus.items():
+            b = SpiBus(self.chip, bus, ce, lines, irq_pin=irq_map.get((bus, ce)), poll_s=poll_s)
+            self.buses.append(b)
+            for slot in lines:
+                self.slot_bus[slot] = b
+        # One worker per bus; each task holds its bus lock, so buses run in parallel
+        self._pool = ThreadPoolExecutor(max_workers=len(self.buses), thread_name_prefix="nfc-bus")
+
+        self.clock = ClockProfile(self.rst_lines)
+        self.metrics = Metrics(self.rst_lines)
+        self.scheduler = SlotScheduler(self.rst_lines)
+        self.debounce = Debouncer(self.rst_lines)
+        self.breaker = SlotBreaker(self.rst_lines)
+        self._emit = None  # subscribe's event sink for debounced transitions
+        # slot -> UID the host expects there (set_expected); replaced, never mutated
+        self.expected: dict[int, str] = {}
+        # VersionReg per slot (0x00 = no answer), only ever a CHIP_VERSIONS value or 0x00.
+        # Set by the self-test; a read whose probe gets a different recognised version
+        # fingerprints again, an unrecognised one is a fault. Starts from the cached
+        # self-test; refresh_selftest() re-probes in the background.
+        self.selftest = SelfTestCache(topology)
+        self.chip_version: dict[int, int] = {
+            slot: ver for slot, ver in self.selftest.load().items() if ver in CHIP_VERSIONS + (0x00,)
+        }
+        self.selftest_source = "cache" if self.chip_version else "none"
+        for slot, ver in self.chip_version.items():
+            if ver == 0x00 and slot in self.rst_lines:
+                self.breaker.trip(slot)  # probed again within a second, like every quarantined slot
+        self.last_uid: dict[int, Optional[str]] = {}
+        self.last_read_at: dict[int, float] = {}  # time.monotonic() of last_uid
+        self.last_verified_at: dict[int, float] = {}  # time.monotonic() of the last full read with a UID
+        self.init_ms = round((time.monotonic() - t0) * 1000, 1)
+
+    def _per_bus(self, slots: list[int], fn) -> list:
+        """Run fn(bus, bus_slots) once per bus touched by slots; results in bus order."""
+        groups: dict[SpiBus, list[int]] = {}
+        for slot in slots:
+            groups.setdefault(self.slot_bus[slot], []).append(slot)
+        if len(groups) <= 1:
+            return [fn(b, s) for b, s in groups.items()]
+        futures = [self._pool.submit(fn, b, s) for b, s in groups.items()]
+        return [f.result() for f in futures]
+
+    def fingerprint(self) -> None:
+        """Read every slot's VersionReg once so reads can pick chip-specific paths."""
+        self._per_bus(sorted(self.rst_lines), self._fingerprint_bus)
+        summary = " ".join(f"{slot}:{self.chip_kind(slot)}" for slot in self.rst_lines)
+        print(f"[PY] chips {summary}", file=sys.stderr, flush=True)
+
+    def refresh_selftest(self) -> None:
+        """Re-probe every reader and update the on-disk self-test (run in the background)."""
+        self.fingerprint()
+        self.selftest.save({slot: self.chip_version.get(slot, 0x00) for slot in self.rst_lines})
+        self.selftest_source = "live"
+
+    def _fingerprint_bus(self, bus: SpiBus, slots: list[int]) -> None:
+        # Lock per slot, not per bus: requests arriving meanwhile only wait for one probe
+        for slot in slots:
+            with bus.lock:
                 try:
-                    lgpio.gpio_write(self.chip, pin, 0)
-                except Exception:
-                    pass
+                    bus.activate_slot(slot)
+                    bus.spi.max_speed_hz = self.clock.speed(slot)
+                    time.sleep(0.01)
+                    ver = self._stable_version(bus, slot)
+                    if ver is None or ver not in CHIP_VERSIONS + (0x00, 0xFF):
+                        # Answers, but never the same twice or with no chip's version: a
+                        # broken bus, not a fingerprint. Keep the last one; a failed read.
+                        bus.rc522.faults += 1
+                        self._reader_event(self.breaker.record(slot, False))
+                        continue
+                    self.chip_version[slot] = 0x00 if ver == 0xFF else ver
+                    if self.chip_version[slot]:
+                        self._reader_event(self.breaker.record(slot, True))
+                    else:
+                        self._reader_event(self.breaker.trip(slot))
+                finally:
+                    bus.deactivate_all()
+
+    def _stable_version(self, bus: SpiBus, slot: int, tries: int = 4) -> Optional[int]:
+        """VersionReg once two reads in a row agree (None if they never do). Each
+        disagreement is a bus fault and steps the slot's clock down before the next read."""
+        ver = bus.rc522.version()
+        for _ in range(tries - 1):
+            again = bus.rc522.version()
+            if again == ver:
+                return ver
+            bus.rc522.faults += 1
+            self.clock.record(slot, clean=False)
+            bus.spi.max_speed_hz = self.clock.speed(slot)
+            ver = again
+        return None
+
+    def selftest_status(self) -> dict:
+        return {"source": self.selftest_source, "t": self.selftest.tested_at,
+                "chips": {str(slot): self.chip_kind(slot) for slot in sorted(self.rst_lines)}}
+
+    def chip_kind(self, slot: int) -> str:
+        ver = self.chip_version.get(slot, 0x00)
+        if ver in CHIP_GENUINE_VERSIONS:
+            return "genuine"
+        if ver == CHIP_FM17522E_VERSION:
+            return "fm17522e"
+        return "absent" if ver == 0x00 else f"unknown(0x{ver:02X})"
+
+    def _settle(self, bus: SpiBus, slot: int) -> None:
+        # Genuine chips report readiness (PowerDown bit clears) so we can stop
+        # waiting early; clones don't reliably, so they keep the fixed delay.
+        t0 = time.monotonic()
+        if self.chip_kind(slot) != "genuine":
+            time.sleep(0.01)
+        else:
+            deadline = t0 + 0.01
+            while not bus.rc522.ready() and time.monotonic() < deadline:
+                time.sleep(0.0005)
+        self.metrics.record_settle(slot, (time.monotonic() - t0) * 1000)
+
+    def close(self) -> None:
+        self.unsubscribe()
+        self._pool.shutdown(wait=True)
+        try:
+            for bus in self.buses:
+                bus.close()
         finally:
-            try:
-                self.spi.close()
-            except Exception:
-                pass
             try:
                 lgpio.gpiochip_close(self.chip)
             except Exception:
                 pass
 
-    def activate_slot(self, slot: int) -> bool:
-        pin = self.rst_lines.get(slot)
-        if pin is None:
-            return False
-        # Ensure all disabled (RST LOW), then enable one (RST HIGH)
-        for p in self.rst_lines.values():
-            lgpio.gpio_write(self.chip, p, 0)
-        lgpio.gpio_write(self.chip, pin, 1)
-        return True
+    def read_version(self, slot: int) -> int:
+        """Raw VersionReg of one slot (diagnostics)."""
+        bus = self.slot_bus.get(slot)
+        if bus is None:
+            raise ValueError(f"unknown slot: {slot}")
+        with bus.lock:
+            bus.activate_slot(slot)
+            try:
+                time.sleep(0.01)
+                return bus.rc522._read_reg(VersionReg)
+            finally:
+                bus.deactivate_all()
 
-    def deactivate_all(self) -> None:
-        for p in self.rst_lines.values():
-            lgpio.gpio_write(self.chip, p, 0)
+    def parse_slots(self, slots) -> list[int]:
+        """Normalise a scan "slots" field: "all", a single slot, or a list of slots."""
+        if slots is None or slots == "all":
+            return sorted(self.rst_lines)
+        if isinstance(slots, (int, str)):
+            slots = [slots]
+        out: list[int] = []
+        for s in slots:
+            slot = int(s)
+            if slot not in self.rst_lines:
+                raise ValueError(f"unknown slot: {slot}")
+            if slot not in out:
+                out.append(slot)
+        return out
+
+    def check_slot(self, slot) -> int:
+        """A request's single "slot" field as an int; ValueError if the cabinet has no such slot."""
+        return self.parse_slots(int(slot))[0]
 
-    def read_uid(self, slot: int) -> Optional[str]:
-        if not self.activate_slot(slot):
+    def scan(self, slots: list[int], deadline: Optional[float] = None, quick: bool = False) -> list[dict]:
+        # Sweep several slots in one call, one worker per SPI bus; each entry
+        # carries its own read time. quick (the subscribe loop): settled occupied
+        # slots get a presence check instead of a full read where _quick_ok allows.
+        by_slot = {}
+        for part in self._per_bus(slots, lambda bus, s: self._scan_bus(bus, s, deadline, quick)):
+            for r in part:
+                by_slot[r["slot"]] = r
+        return [by_slot[slot] for slot in slots]
+
+    def _scan_bus(self, bus: SpiBus, slots: list[int], deadline: Optional[float] = None,
+                  quick: bool = False) -> list[dict]:
+        results = []
+        for slot in slots:
+            t0 = time.monotonic()
+            entry = {"slot": slot, "uid": None}
+            try:
+                if quick and self._quick_ok(slot):
+                    entry["uid"], entry["fast"] = self.presence(slot, deadline=deadline)
+                else:
+                    entry["uid"] = self.read_uid(slot, deadline)
+                entry["match"] = self.match(slot, entry["uid"])
+            except DeadlineExpired:
+                entry["expired"] = True
+            except Exception as e:
+                entry["error"] = str(e)
+            entry.update(self.reader_state(slot))
+            entry["ms"] = round((time.monotonic() - t0) * 1000, 2)
+            entry["hz"] = self.clock.speed(slot)
+            entry["bus"] = bus.name
+            results.append(entry)
+        return results
+
+    def _quick_ok(self, slot: int) -> bool:
+        """A presence check is enough: the slot has settled on the tag last read there,
+        no borrow/return is in progress on it and its UID was read recently."""
+        uid = self.last_uid.get(slot)
+        now = time.monotonic()
+        return (uid is not None and self.debounce.stable.get(slot) == uid
+                and self.scheduler.focus_until.get(slot, 0.0) <= now
+                and now - self.last_verified_at.get(slot, float("-inf")) < PRESENCE_VERIFY_S)
+
+    def subscribe(self, slots: list[int], period_s: float, emit, adaptive: bool = True,
+                  max_stale_s: float = SCHED_MAX_STALE_S) -> None:
+        """Start (or restart) the background scan loop; emit() receives debounced transition
+        events, whichever read (the loop's or a client's) completes them."""
+        self.unsubscribe()
+        period_s = max(SCHED_MIN_PERIOD_S, period_s)
+        self.scheduler.max_stale_s = max_stale_s
+        stop = threading.Event()
+        self._sub_stop = stop
+        self._emit = emit
+        loop = self._adaptive_loop if adaptive else self._scan_loop
+        self._sub_thread = threading.Thread(
+            target=loop, args=(slots, period_s, emit, stop), name="nfc-subscribe", daemon=True
+        )
+        self._sub_thread.start()
+
+    @property
+    def subscribed(self) -> bool:
+        return self._sub_thread is not None
+
+    def unsubscribe(self) -> None:
+        self._sub_stop.set()
+        self._emit = None
+        if self._sub_thread is not None:
+            self._sub_thread.join(timeout=2.0)
+            self._sub_thread = None
+
+    def _emit_errors(self, results: list[dict], emit) -> None:
+        # Transitions are emitted by _remember() once debounced; only failures are reported
+        # here (quarantine itself is reported once, as a "reader" event)
+        for r in results:
+            if "error" in r and r.get("reader") != "quarantined":
+                emit({"event": "error", "slot": r["slot"], "error": r["error"],
+                      "t_ms": round(time.monotonic() * 1000, 1)})
+
+    def _scan_loop(self, slots: list[int], period_s: float, emit, stop: threading.Event) -> None:
+        # Fixed order: every slot once per cycle
+        while not stop.is_set():
+            cycle_start = time.monotonic()
+            self._emit_errors(self.scan(slots, quick=True), emit)
+            stop.wait(max(0.0, period_s - (time.monotonic() - cycle_start)))
+
+    def _adaptive_loop(self, slots: list[int], period_s: float, emit, stop: threading.Event) -> None:
+        # Same number of reads per period as _scan_loop, but each bus reads the
+        # slot the scheduler ranks highest instead of walking them in order
+        by_bus: dict[SpiBus, list[int]] = {}
+        for slot in slots:
+            by_bus.setdefault(self.slot_bus[slot], []).append(slot)
+        reads_per_cycle = max((len(s) for s in by_bus.values()), default=0)
+        while not stop.is_set():
+            cycle_start = time.monotonic()
+            for _ in range(reads_per_cycle):
+                if stop.is_set():
+                    return
+                now = time.monotonic()
+                picks = []
+                for bus_slots in by_bus.values():
+                    # Quarantined readers only come up when their probe is due
+                    live = [slot for slot in bus_slots if self.breaker.due(slot, now)]
+                    if live:
+                        picks.append(self.scheduler.pick(live, now))
+                if not picks:
+                    break  # every reader quarantined, no probe due: idle until the next cycle
+                results = self.scan(picks, quick=True)
+                for r in results:
+                    if r.get("expired") or "error" in r:
+                        self.scheduler.touch(r["slot"])  # tried; don't spin on a broken slot
+                self._emit_errors(results, emit)
+            stop.wait(max(0.0, period_s - (time.monotonic() - cycle_start)))
+
+    def read_uid(self, slot: int, deadline: Optional[float] = None) -> Optional[str]:
+        bus = self.slot_bus.get(slot)
+        if bus is None:
             return None
+        with bus.lock:
+            # Waiting for the bus may have used up the budget
+            _check_deadline(deadline, READ_ATTEMPT_MIN_S)
+            if not self.breaker.admit(slot):
+                raise ReaderQuarantined(f"reader quarantined (slot {slot})")
+            # A quarantined reader gets a single attempt as its probe
+            attempts = 1 if self.breaker.quarantined(slot) else 3
+            before = bus.rc522.counters()
+            t0 = time.monotonic()
+            result = "error"
+            try:
+                uid, responsive = self._read_uid_locked(bus, slot, deadline, attempts)
+                result = "uid" if uid else "empty"
+            except DeadlineExpired:
+                result = "expired"
+                raise
+            finally:
+                self.metrics.record_read(slot, result, (time.monotonic() - t0) * 1000,
+                                         _counter_delta(before, bus.rc522.counters()))
+                if result != "expired":
+                    self._reader_event(self.breaker.record(slot, result != "error" and responsive))
+            self._remember(slot, uid)
+            if uid:
+                self.last_verified_at[slot] = time.monotonic()
+            return uid
+
+    def _reader_event(self, event: Optional[dict]) -> None:
+        if event is None:
+            return
+        print(f"[PY] slot {event['slot']} reader {event['state']}", file=sys.stderr, flush=True)
+        emit = self._emit
+        if emit is not None:
+            emit(event)
+
+    def reader_state(self, slot: int) -> dict:
+        """Extra reply fields for a slot whose reader is failing; {} when healthy."""
+        state = self.breaker.state(slot)
+        return {} if state == "ok" else {"reader": state}
+
+    def match(self, slot: int, uid: Optional[str]) -> str:
+        return match_expected(self.expected, slot, uid)
+
+    def set_expected(self, table: dict[int, Optional[str]], replace: bool) -> list[dict]:
+        """Load (replace) or patch the expected-UID table; None removes a slot.
+        Returns "expected" events for settled slots whose classification changed."""
+        new = {} if replace else dict(self.expected)
+        for slot, uid in table.items():
+            if slot not in self.rst_lines:
+                raise ValueError(f"unknown slot: {slot}")
+            uid = (uid or "").strip().upper()
+            if uid:
+                new[slot] = uid
+            else:
+                new.pop(slot, None)
+        old, self.expected = self.expected, new
+        t_ms = round(time.monotonic() * 1000, 1)
+        events = []
+        for slot, uid in list(self.debounce.stable.items()):
+            verdict = match_expected(new, slot, uid)
+            if verdict != match_expected(old, slot, uid):
+                events.append({"event": "expected", "slot": slot, "uid": uid, "match": verdict, "t_ms": t_ms})
+        return events
+
+    def _remember(self, slot: int, uid: Optional[str], confirmed: bool = False) -> None:
+        # confirmed: the caller already debounced this (watch_removal), so skip the hysteresis
+        self.last_uid[slot] = uid
+        self.last_read_at[slot] = time.monotonic()
+        self.scheduler.observe(slot, uid)
+        event = self.debounce.force(slot, uid) if confirmed else self.debounce.feed(slot, uid)
+        emit = self._emit
+        if event is not None and emit is not None:
+            event["match"] = self.match(slot, uid)
+            emit(event)
+
+    def recent_uid(self, slot: int, max_age_s: float) -> Tuple[bool, Optional[str]]:
+        """(True, uid) if the slot was read within max_age_s, else (False, None)."""
+        at = self.last_read_at.get(slot)
+        if at is None or time.monotonic() - at > max_age_s:
+            return False, None
+        return True, self.last_uid.get(slot)
+
+    def presence(self, slot: int, uid: Optional[str] = None,
+                 deadline: Optional[float] = None) -> Tuple[Optional[str], bool]:
+        """Confirm a known tag is still on the slot. Returns (uid, fast_path_hit)."""
+        last = self.last_uid.get(slot)
+        expected = (uid or last or "").strip().upper()
+        bus = self.slot_bus.get(slot)
+        # WUPA can't tell tags apart: only the tag last read here can be confirmed by it
+        if expected and expected == last and bus is not None and not self.breaker.quarantined(slot):
+            with bus.lock:
+                _check_deadline(deadline, READ_ATTEMPT_MIN_S)
+                before = bus.rc522.counters()
+                hit = self._presence_locked(bus, slot)
+                self.metrics.record_presence(slot, hit, _counter_delta(before, bus.rc522.counters()))
+                if hit:
+                    self._reader_event(self.breaker.record(slot, True))
+                    # Under the lock, like read_uid: a read queued behind us lands after this
+                    self._remember(slot, expected)
+            if hit:
+                return expected, True
+        # Miss or different card: let the full read with retries decide
+        return self.read_uid(slot, deadline), False
+
+    def watch_removal(self, slot: int, timeout_s: float, misses: int = WATCH_MISSES,
+                      require_seen: bool = True, stop: Optional[threading.Event] = None,
+                      absent_hold_s: float = WATCH_ABSENT_HOLD_S) -> dict:
+        """Poll one slot as fast as the reader allows until its tag has been gone for
+        `misses` polls in a row and at least absent_hold_s (after being seen, if
+        require_seen) or timeout_s passes."""
+        bus = self.slot_bus[slot]
+        if self.breaker.quarantined(slot):
+            # A dead reader never sees a tag: it would report "removed" for nothing
+            raise ReaderQuarantined(f"reader quarantined (slot {slot})")
+        t0 = time.monotonic()
+        end = t0 + timeout_s
+        seen: Optional[str] = None
+        streak = polls = 0
+        gone_at = 0.0  # time.monotonic() of the first miss in the current streak
+        removed = False
+        try:
+            while time.monotonic() < end and not (stop is not None and stop.is_set()):
+                with bus.lock:
+                    try:
+                        uid = self._watch_poll(bus, slot)
+                    except Exception:
+                        uid = ""  # bus fault: counts as neither present nor gone
+                polls += 1
+                self.scheduler.touch(slot)  # keep the subscribe loop off this slot meanwhile
+                if uid:
+                    seen, streak = uid, 0
+                elif uid is None and (seen or not require_seen):
+                    streak += 1
+                    if streak == 1:
+                        gone_at = time.monotonic()
+                    if streak >= misses and time.monotonic() - gone_at >= absent_hold_s:
+                        removed = True
+                        break
+                time.sleep(WATCH_INTERVAL_S)
+        finally:
+            with bus.lock:
+                if bus.active == slot:
+                    bus.deactivate_all()
+                if removed:
+                    # Confirmed over misses + absent_hold_s: subscribers hear "removed" now,
+                    # not a debounce window later (the host would act on the stale UID meanwhile)
+                    self._remember(slot, None, confirmed=True)
+                elif seen:
+                    self._remember(slot, seen)
+        return {"removed": removed, "seen": seen is not None, "uid": seen,
+                "ms": round((time.monotonic() - t0) * 1000, 1), "polls": polls}
+
+    def _watch_poll(self, bus: SpiBus, slot: int) -> Optional[str]:
+        # Only (re)select and configure when another read took the bus since the last poll
+        rc522 = bus.rc522
+        if bus.active != slot:
+            self._select_for_polling(bus, slot)
+        uid = rc522.read_uid_hex(wake=True)
+        if uid:
+            rc522.halt()
+            return uid
+        # A miss only counts if the reader still has our configuration: clones drop
+        # it now and then and stay deaf until re-initialised (same check as reads)
+        ver, configured = rc522.probe()
+        if ver in (0x00, 0xFF) or not configured:
+            rc522._init_chip()
+            rc522.set_timer_reload(WATCH_TIMER_RELOAD)
+            return ""
+        return None
+
+    def _presence_locked(self, bus: SpiBus, slot: int) -> bool:
+        # One WUPA, answered by any tag (which one is not checked). Like _watch_poll, the
+        # reader stays selected and configured after a check, so repeated checks of one
+        # slot skip the RST pulse, settle and re-init; the next read of any slot on the
+        # bus (or a watch ending) releases it.
+        rc522 = bus.rc522
+        faults = rc522.faults
+        silent = False
+        try:
+            if bus.active != slot:
+                self._select_for_polling(bus, slot)  # RST pulse: the tag restarts in IDLE
+            else:
+                # Our last WUPA left the tag in READY, where it ignores the next one;
+                # HLTA (send only, no receive timeout) parks it in HALT, which WUPA wakes
+                rc522.halt()
+            hit = rc522.request(wake=True)
+            if not hit:
+                ver, configured = rc522.probe()
+                silent = ver in (0x00, 0xFF)
+                if not silent and ver not in CHIP_VERSIONS:
+                    rc522.faults += 1  # garbled VersionReg, as in _read_uid_locked
+                elif not silent and not configured:
+                    # A clone dropped its configuration: set it up again and ask once more
+                    rc522._init_chip()
+                    rc522.set_timer_reload(WATCH_TIMER_RELOAD)
+                    hit = rc522.request(wake=True)
+        except Exception:
+            hit = False
+            bus.deactivate_all()
+        # A silent reader is left to the full read that follows, which steps down at most once
+        if not silent:
+            self.clock.record(slot, clean=rc522.faults == faults)
+        return hit
+
+    def _select_for_polling(self, bus: SpiBus, slot: int) -> None:
+        """Select slot and configure it for short receive timeouts (watch, presence)."""
+        bus.activate_slot(slot)
+        bus.spi.max_speed_hz = self.clock.speed(slot)
+        self._settle(bus, slot)
+        bus.rc522._init_chip()
+        bus.rc522.set_timer_reload(WATCH_TIMER_RELOAD)  # RST restores the default on the next select
+
+    def _read_uid_locked(self, bus: SpiBus, slot: int, deadline: Optional[float] = None,
+                         attempts: int = 3) -> Tuple[Optional[str], bool]:
+        """(uid, whether the reader answered VersionReg on any attempt)."""
+        rc522 = bus.rc522
+        responsive = False
+        # A silent reader may be a too-fast clock or a dead reader: only one the breaker
+        # still trusts steps down, once per read, so a dead one isn't saved at 50 kHz
+        may_step_down = self.breaker.state(slot) == "ok"
+        known = self.chip_version.get(slot, 0x00)
+        bus.activate_slot(slot)
         try:
+            bus.spi.max_speed_hz = self.clock.speed(slot)
             # After switching RST, give the reader a brief settle time.
-            time.sleep(0.01)
+            self._settle(bus, slot)
 
             # Retry a few times to avoid false negatives from noisy RF / timing.
             # Each attempt is quick (tens of ms). If a tag is present, we usually get it within 1-2 tries.
-            for _ in range(3):
-                # Re-init per read to recover from clone quirks / after RST toggling
-                try:
-                    self.rc522._init_chip()
-                except Exception:
-                    pass
-                uid = self.rc522.read_uid_hex()
+            for attempt in range(attempts):
+                if attempt:
+                    self.metrics.record_retry(slot)
+                _check_deadline(deadline, READ_ATTEMPT_MIN_S)
+                bus.spi.max_speed_hz = self.clock.speed(slot)
+                faults = rc522.faults
+                uid = None
+                ver, configured = rc522.probe()
+                if ver in (0x00, 0xFF):
+                    if may_step_down:
+                        self.clock.record(slot, clean=False)
+                        may_step_down = False
+                elif ver not in CHIP_VERSIONS:
+                    # No chip answers with this: a garbled read, and no proof the reader works
+                    rc522.faults += 1
+                    self.clock.record(slot, clean=False)
+                else:
+                    responsive = True
+                    if ver != known:
+                        # A real chip's version, but not the fingerprint (none yet, or the
+                        # reader was swapped): fingerprint again instead of distrusting it
+                        ver = self._stable_version(bus, slot)
+                        if ver in CHIP_VERSIONS:
+                            print(f"[PY] slot {slot} chip 0x{known:02X} -> 0x{ver:02X}", file=sys.stderr, flush=True)
+                            known = self.chip_version[slot] = ver
+                    # Re-init only when the chip lost our config (RST toggle, clone reset)
+                    if not configured:
+                        try:
+                            rc522._init_chip()
+                        except Exception:
+                            pass
+                    # WUPA, not REQA: a tag a watch or presence check left in HALT
+                    # (or READY) ignores REQA and would read as a false empty
+                    uid = rc522.read_uid_hex(wake=True)
+                    # Any fault in this attempt steps the slot's clock down
+                    self.clock.record(slot, clean=rc522.faults == faults)
                 if uid:
-                    return uid
-                time.sleep(0.005)
-            return None
+                    return uid, True
+                if attempt + 1 < attempts:
+                    time.sleep(0.005)
+            return None, responsive
         finally:
-            self.deactivate_all()
+            bus.deactivate_all()
 
 
-def main() -> int:
-    mr = MultiReader()
-    _dbg_count = 0
-    _DBG_MAX = 30  # print first N reads to stderr for diagnostics
+# Hardware commands go through the scheduler; lower runs first, ties in arrival order.
+# A request may override with "prio". Everything else is answered on the event loop.
+HW_CMD_PRIORITY = {"presence": 0, "read": 1, "version": 2, "scan": 2}
+
+# Commands an observer connection may send; it never queues bus work
+OBSERVER_CMDS = frozenset({"hello", "ping", "status", "stats", "subscribe", "unsubscribe"})
+
+# Socket controllers queue behind the spawning process: their priorities are
+# offset so a dashboard scan never delays the kiosk's presence check.
+SOCKET_PRIO_OFFSET = 10
+SOCKET_MAX_QUEUED = 32
+SOCKET_MAX_BUFFERED = 256 * 1024  # unread reply bytes before a client is dropped
+
+DEFAULT_SOCKET_PATH = "/tmp/kms_nfc_bridge.sock"
+
+_DBG_MAX = 30  # print first N reads to stderr for diagnostics
+
+EXPIRED_REPLY = {"ok": False, "expired": True, "error": "deadline expired"}
+
+COALESCE_S = int(os.environ.get("NFC_COALESCE_MS", "50")) / 1000.0
+
+SELFTEST_DELAY_S = 1.0  # after "ready", before the background self-test starts
+
+
+def _request_deadline(req: dict) -> Optional[float]:
+    """time.monotonic() deadline from "deadline_ms" (relative) or "deadline" (epoch ms)."""
+    if req.get("deadline_ms") is not None:
+        return time.monotonic() + float(req["deadline_ms"]) / 1000.0
+    if req.get("deadline") is not None:
+        return time.monotonic() + (float(req["deadline"]) / 1000.0 - time.time())
+    return None
+
+
+def _claim_socket_path(path: str) -> None:
+    """Remove a stale socket file; refuse to start if a live bridge still answers on it."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
     try:
-        for line in sys.stdin:
-            line = line.strip()
-            if not line:
+        probe.connect(path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except PermissionError:
+            raise RuntimeError(f"cannot remove stale socket {path}: permission denied (remove it or pick another --socket)") from None
+        return
+    except PermissionError:
+        # e.g. a leftover socket from a bridge that ran as root, in sticky /tmp
+        raise RuntimeError(f"cannot reuse {path}: permission denied (remove it or pick another --socket)") from None
+    finally:
+        probe.close()
+    raise RuntimeError(f"another bridge is already listening on {path}")
+
+
+class Bridge:
+    """asyncio protocol core: requests from stdin and socket clients in, replies
+    routed back to the sender, hardware work on an executor."""
+
+    def __init__(self, mr: MultiReader):
+        self.mr = mr
+        self.queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self.in_flight = 0
+        # One request per bus can run at a time, plus one spare for scans that span buses
+        self.workers = len(mr.buses) + 1
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="nfc-req")
+        self._dbg_count = 0
+        # slot -> queued or running "read" that later duplicates attach to (via "_waiters")
+        self._pending_reads: dict[int, dict] = {}
+        self.clients: dict[Client, Optional[asyncio.StreamWriter]] = {}
+        self._client_ids = itertools.count(1)
+        # One scan loop is shared by everyone: controllers that subscribed keep it
+        # running, every listener (controller or observer) gets its events.
+        self._listeners: Tuple[Client, ...] = ()  # replaced, never mutated: read by the scan thread
+        # controller -> the loop it asked for; the loop scans the union of their slots
+        self._scan_owners: dict[Client, dict] = {}
+        self._sub_slots: list[int] = []
+        self._sub_period_ms = 0
+        self._sub_schedule = "adaptive"
+        self._sub_max_stale_s = SCHED_MAX_STALE_S
+        self._parent: Optional[Client] = None  # the stdio client, if any
+        self._sub_lock: Optional[asyncio.Lock] = None
+        self._tasks: set[asyncio.Task] = set()
+        self._stopping = threading.Event()  # ends watches early on shutdown
+
+    def handle(self, req: dict, client: Client) -> None:
+        try:
+            req_id = req.get("id")
+            cmd = req.get("cmd")
+            if client.observer and cmd not in OBSERVER_CMDS:
+                client.send({"id": req_id, "ok": False, "error": f"read-only client: {cmd} not allowed"})
+                return
+            if cmd == "hello":
+                framing = req.get("framing", "jsonl")
+                role = req.get("role", client.role)
+                if framing not in CODECS:
+                    client.send({"id": req_id, "ok": False, "error": f"unknown framing: {framing}"})
+                    return
+                if role not in ("controller", "observer") or (client.observer and role != "observer"):
+                    client.send({"id": req_id, "ok": False, "error": f"bad role: {role}"})
+                    return
+                client.role = role
+                # Reply in the old framing and switch atomically; the connection's
+                # reader follows client.out.codec once this hello has been handled
+                client.out.send({"id": req_id, "ok": True, "framing": framing, "role": role},
+                                switch_to=CODECS[framing])
+                return
+            if cmd == "ping":
+                client.send({"id": req_id, "ok": True, "pong": True})
+                return
+            if cmd == "status":
+                client.send({"id": req_id, "ok": True, **self.status()})
+                return
+            if cmd == "stats":
+                slots = self.mr.parse_slots(req.get("slots", "all"))
+                client.send({"id": req_id, "ok": True, **self.mr.metrics.snapshot(slots, self.mr.clock, self.mr.breaker)})
+                return
+            if cmd == "focus":
+                # Scheduler hint: these slots are about to change (unlock, return)
+                slots = self.mr.parse_slots(req.get("slots", []))
+                self.mr.scheduler.focus(slots, max(0, int(req.get("ms", 15000))) / 1000.0)
+                client.send({"id": req_id, "ok": True, "focus": self.mr.scheduler.focused()})
+                return
+            if cmd == "set_expected":
+                if self._parent is not None and client is not self._parent:
+                    client.send({"id": req_id, "ok": False, "error": "set_expected is reserved for the parent process"})
+                    return
+                # "table" replaces the whole slot -> UID map, "update" patches it (null removes)
+                events = []
+                for key, replace in (("table", True), ("update", False)):
+                    if req.get(key) is not None:
+                        table = {int(slot): uid for slot, uid in req[key].items()}
+                        events += self.mr.set_expected(table, replace)
+                client.send({"id": req_id, "ok": True, "expected": len(self.mr.expected)})
+                for ev in events:
+                    self._broadcast(ev)
+                return
+            if cmd in ("subscribe", "unsubscribe", "watch_removal"):
+                # Starting/stopping the scan loop joins a thread and a watch runs for
+                # seconds, so neither may hold the loop or a request worker
+                if cmd == "watch_removal":
+                    coro = self._watch_removal(req, client)
+                elif cmd == "subscribe":
+                    coro = self._subscribe(req, client)
+                else:
+                    coro = self._unsubscribe(req, client)
+                task = asyncio.get_running_loop().create_task(coro)
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                return
+            if cmd in HW_CMD_PRIORITY:
+                # Parse everything that can fail before the read registers as a
+                # coalescing primary, or a bad field would orphan that slot
+                prio = client.base_prio + max(0, int(req.get("prio", HW_CMD_PRIORITY[cmd])))
+                req["_client"] = client
+                req["_deadline"] = _request_deadline(req)
+                req["_waiters"] = [req]
+                if cmd == "read" and self._coalesce_read(req):
+                    return
+                if client.max_queued is not None and client.queued >= client.max_queued:
+                    self._forget_read(req)
+                    client.send({"id": req_id, "ok": False, "error": "busy: too many requests queued"})
+                    return
+                client.queued += 1
+                self.queue.put_nowait((prio, next(self._seq), req))
+                return
+            client.send({"id": req_id, "ok": False, "error": f"unknown cmd: {cmd}"})
+        except Exception as e:
+            client.send({"id": req.get("id"), "ok": False, "error": str(e)})
+
+    def _coalesce_read(self, req: dict) -> bool:
+        """Answer or merge a duplicate slot read; False means it must hit the bus."""
+        slot = int(req.get("slot"))
+        max_age_s = COALESCE_S if req.get("max_age_ms") is None else float(req["max_age_ms"]) / 1000.0
+        if max_age_s <= 0:
+            return False
+        fresh, uid = self.mr.recent_uid(slot, max_age_s)
+        if fresh:
+            req["_client"].send({"id": req.get("id"), "ok": True, "uid": uid, "cached": True,
+                                 "match": self.mr.match(slot, uid)})
+            return True
+        primary = self._pending_reads.get(slot)
+        started = None if primary is None else primary.get("_started")
+        if primary is not None and (started is None or time.monotonic() - started <= max_age_s):
+            primary["_waiters"].append(req)
+            # Keep the shared read alive as long as anyone still wants it
+            if primary["_deadline"] is not None:
+                primary["_deadline"] = None if req["_deadline"] is None else max(primary["_deadline"], req["_deadline"])
+            return True
+        self._pending_reads[slot] = req
+        return False
+
+    def _forget_read(self, req: dict) -> None:
+        if req.get("cmd") == "read":
+            slot = int(req.get("slot"))
+            if self._pending_reads.get(slot) is req:
+                del self._pending_reads[slot]
+
+    def _finish(self, req: dict, reply: dict) -> None:
+        req["_client"].queued -= 1
+        for waiter in req["_waiters"]:
+            waiter["_client"].send({"id": waiter.get("id"), **reply})
+        self._forget_read(req)
+
+    def _broadcast(self, msg: dict) -> None:
+        # Called from the scan thread; Output.send is thread-safe
+        for client in self._listeners:
+            client.send(msg)
+
+    async def _subscribe(self, req: dict, client: Client) -> None:
+        try:
+            async with self._sub_lock:
+                if not client.observer:
+                    schedule = req.get("schedule", "adaptive")
+                    if schedule not in ("adaptive", "sweep"):
+                        raise ValueError(f"unknown schedule: {schedule}")
+                    owners = {**self._scan_owners, client: {
+                        "slots": self.mr.parse_slots(req.get("slots", "all")),
+                        "period_ms": max(round(SCHED_MIN_PERIOD_S * 1000), int(req.get("period_ms", 200))),
+                        "schedule": schedule,
+                        "max_stale_s": float(req.get("max_stale_ms", SCHED_MAX_STALE_S * 1000)) / 1000.0,
+                    }}
+                    if req.get("debounce") is not None:
+                        owner = self._loop_owner(owners)
+                        if owner is not client:
+                            raise ValueError(f"debounce is set by the scan loop's owner ({owner.name})")
+                        self._configure_debounce(req["debounce"])
+                    await self._apply_scan(owners)
+                if client not in self._listeners:
+                    self._listeners += (client,)
+                slots = self._sub_slots if self.mr.subscribed else []
+            # Debounced state so far; later changes arrive as events
+            states = self.mr.debounce.states(slots)
+            client.send({"id": req.get("id"), "ok": True, "subscribed": slots, "period_ms": self._sub_period_ms,
+                         "schedule": self._sub_schedule, "debounce": self.mr.debounce.config(),
+                         "states": states, "match": {s: self.mr.match(int(s), uid) for s, uid in states.items()}})
+        except Exception as e:
+            client.send({"id": req.get("id"), "ok": False, "error": str(e)})
+
+    def _loop_owner(self, owners: dict[Client, dict]) -> Optional[Client]:
+        """Whose period/schedule/debounce the shared loop follows: the stdio parent
+        while it is subscribed, otherwise the longest-subscribed controller."""
+        if self._parent in owners:
+            return self._parent
+        return next(iter(owners), None)
+
+    async def _apply_scan(self, owners: dict[Client, dict]) -> None:
+        # Restart the loop only when what it scans (or how) actually changes
+        loop = asyncio.get_running_loop()
+        owner = self._loop_owner(owners)
+        if owner is None:
+            if self.mr.subscribed:
+                await loop.run_in_executor(None, self.mr.unsubscribe)
+            self._sub_slots = []
+        else:
+            cfg = owners[owner]
+            slots = sorted(set().union(*(o["slots"] for o in owners.values())))
+            wanted = (slots, cfg["period_ms"], cfg["schedule"], cfg["max_stale_s"])
+            current = (self._sub_slots, self._sub_period_ms, self._sub_schedule, self._sub_max_stale_s)
+            if not self.mr.subscribed or wanted != current:
+                await loop.run_in_executor(None, functools.partial(
+                    self.mr.subscribe, slots, cfg["period_ms"] / 1000.0, self._broadcast,
+                    adaptive=cfg["schedule"] == "adaptive", max_stale_s=cfg["max_stale_s"],
+                ))
+            self._sub_slots, self._sub_period_ms, self._sub_schedule, self._sub_max_stale_s = wanted
+        self._scan_owners = owners
+
+    async def _watch_removal(self, req: dict, client: Client) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            slot = self.mr.check_slot(req.get("slot"))
+            timeout_s = max(0, int(req.get("timeout_ms", 15000))) / 1000.0
+            deadline = _request_deadline(req)
+            if deadline is not None:
+                timeout_s = min(timeout_s, deadline - time.monotonic())
+            result = await loop.run_in_executor(None, functools.partial(
+                self.mr.watch_removal, slot, timeout_s,
+                misses=max(1, int(req.get("misses", WATCH_MISSES))),
+                absent_hold_s=max(0, int(req.get("absent_ms", WATCH_ABSENT_HOLD_S * 1000))) / 1000.0,
+                require_seen=bool(req.get("require_seen", True)), stop=self._stopping,
+            ))
+            client.send({"id": req.get("id"), "ok": True, **result})
+        except Exception as e:
+            client.send({"id": req.get("id"), "ok": False, "error": str(e)})
+
+    def _configure_debounce(self, cfg: dict) -> None:
+        current = self.mr.debounce.config()
+        unknown = set(cfg) - set(current)
+        if unknown:
+            raise ValueError(f"unknown debounce setting: {sorted(unknown)[0]}")
+        cfg = {**current, **cfg}
+        self.mr.debounce.configure(
+            hits=int(cfg["hits"]), misses=int(cfg["misses"]),
+            present_hold_s=float(cfg["present_hold_ms"]) / 1000.0,
+            absent_hold_s=float(cfg["absent_hold_ms"]) / 1000.0,
+        )
+
+    async def _unsubscribe(self, req: Optional[dict], client: Client) -> None:
+        try:
+            async with self._sub_lock:
+                self._listeners = tuple(c for c in self._listeners if c is not client)
+                if client in self._scan_owners:
+                    await self._apply_scan({c: o for c, o in self._scan_owners.items() if c is not client})
+            if req is not None:
+                client.send({"id": req.get("id"), "ok": True, "subscribed": []})
+        except Exception as e:
+            if req is not None:
+                client.send({"id": req.get("id"), "ok": False, "error": str(e)})
+
+    def status(self) -> dict:
+        return {
+            "queued": self.queue.qsize(),
+            "in_flight": self.in_flight,
+            "buses": [b.name for b in self.mr.buses],
+            "subscribed": self.mr.subscribed,
+            "focus": self.mr.scheduler.focused(),
+            "debounce": self.mr.debounce.config(),
+            "expected": len(self.mr.expected),
+            "selftest": self.mr.selftest_status(),
+            "quarantined": self.mr.breaker.quarantined_slots(),
+            "clients": len(self.clients),
+            "observers": sum(1 for c in self.clients if c.observer),
+        }
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, req = await self.queue.get()
+            deadline = req["_deadline"]
+            if deadline is not None and time.monotonic() >= deadline:
+                # Nobody is waiting any more: drop it without touching the bus
+                self.queue.task_done()
+                self._finish(req, EXPIRED_REPLY)
                 continue
-            req = None
+            req["_started"] = time.monotonic()
+            self.in_flight += 1
             try:
-                req = json.loads(line)
-                req_id = req.get("id")
-                cmd = req.get("cmd")
-                if cmd == "ping":
-                    print(json.dumps({"id": req_id, "ok": True, "pong": True}), flush=True)
+                reply = await loop.run_in_executor(self._executor, self._execute, req)
+            except DeadlineExpired:
+                reply = EXPIRED_REPLY
+            except ReaderQuarantined as e:
+                reply = {"ok": False, "error": str(e), "reader": "quarantined"}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            finally:
+                self.in_flight -= 1
+                self.queue.task_done()
+            self._finish(req, reply)
+
+    def _execute(self, req: dict) -> dict:
+        # Runs on the executor; returns the reply body without "id"
+        mr = self.mr
+        cmd = req.get("cmd")
+        deadline = req.get("_deadline")
+        if cmd == "read":
+            slot = mr.check_slot(req.get("slot"))
+            # Log the fingerprinted chip version for debug (cached, no extra bus access); the
+            # read's own probe may disagree and re-fingerprint, which it logs itself
+            if self._dbg_count < _DBG_MAX:
+                ver = mr.chip_version.get(slot, 0x00)
+                self._dbg_count += 1
+                print(f"[PY-DBG #{self._dbg_count}] slot={slot} rst_pin={mr.rst_lines.get(slot)} cached_ver=0x{ver:02X}", file=sys.stderr, flush=True)
+            uid = mr.read_uid(slot, deadline)
+            if self._dbg_count <= _DBG_MAX and uid:
+                print(f"[PY-DBG] slot={slot} uid={uid}", file=sys.stderr, flush=True)
+            return {"ok": True, "uid": uid, "match": mr.match(slot, uid), **mr.reader_state(slot)}
+
+        if cmd == "presence":
+            slot = mr.check_slot(req.get("slot"))
+            uid, fast = mr.presence(slot, req.get("uid"), deadline)
+            return {"ok": True, "uid": uid, "fast": fast, "match": mr.match(slot, uid), **mr.reader_state(slot)}
+
+        if cmd == "scan":
+            slots = mr.parse_slots(req.get("slots", "all"))
+            t0 = time.monotonic()
+            results = mr.scan(slots, deadline)
+            ms = round((time.monotonic() - t0) * 1000, 2)
+            return {"ok": True, "ms": ms, "results": results}
+
+        if cmd == "version":
+            slot = mr.check_slot(req.get("slot"))
+            ver = mr.read_version(slot)
+            return {"ok": True, "version": f"0x{ver:02X}", "kind": mr.chip_kind(slot)}
+
+        return {"ok": False, "error": f"unknown cmd: {cmd}"}
+
+    async def _export_metrics(self, path: str) -> None:
+        loop = asyncio.get_running_loop()
+        metrics = self.mr.metrics
+        while True:
+            await loop.run_in_executor(None, metrics.write_textfile, path, self.mr.clock, self.mr.breaker)
+            await asyncio.sleep(METRICS_INTERVAL_S)
+
+    def _announce_ready(self) -> None:
+        # Requests are accepted from here on; reads use the cached self-test until
+        # the background one finishes
+        ready = {"event": "ready", "selftest": self.mr.selftest_source,
+                 "startup_ms": {"imports": _IMPORTED_AT_MS, "readers": self.mr.init_ms,
+                                "total": _process_age_ms()}}
+        print(f"[PY] ready {json.dumps(ready['startup_ms'])} selftest={ready['selftest']}",
+              file=sys.stderr, flush=True)
+        for client in self.clients:
+            client.send(ready)
+
+    async def _refresh_selftest(self) -> None:
+        # Let the host's first reads through before probing every reader
+        await asyncio.sleep(SELFTEST_DELAY_S)
+        await asyncio.get_running_loop().run_in_executor(None, self.mr.refresh_selftest)
+
+    def _add_client(self, client: Client, writer: Optional[asyncio.StreamWriter] = None) -> None:
+        client.out.attach(asyncio.get_running_loop())
+        self.clients[client] = writer
+
+    def _drop_client(self, client: Client) -> None:
+        if client not in self.clients:
+            return
+        del self.clients[client]
+        client.out.close()
+        if client in self._listeners or client in self._scan_owners:
+            task = asyncio.get_running_loop().create_task(self._unsubscribe(None, client))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        transport = writer.transport
+
+        def _write(data: bytes) -> None:
+            if transport.is_closing():
+                raise ConnectionResetError("client gone")
+            if transport.get_write_buffer_size() > SOCKET_MAX_BUFFERED:
+                # Not reading its replies: cut it loose rather than buffer forever
+                transport.close()
+                raise ConnectionResetError("client not reading")
+            writer.write(data)
+
+        client = Client(f"sock#{next(self._client_ids)}", Output(_write), SOCKET_PRIO_OFFSET)
+        client.max_queued = SOCKET_MAX_QUEUED
+        self._add_client(client, writer)
+        codec = CODECS["jsonl"]
+        try:
+            while True:
+                try:
+                    req = await codec.aread(reader)
+                except (EOFError, ConnectionError):
+                    break
+                except (ValueError, struct.error) as e:
+                    client.send({"id": None, "ok": False, "error": str(e)})
                     continue
-                if cmd == "read":
-                    slot = int(req.get("slot"))
-                    # Activate slot, read version for debug, then read UID
-                    if _dbg_count < _DBG_MAX:
-                        mr.activate_slot(slot)
-                        time.sleep(0.01)
-                        ver = mr.rc522._read_reg(0x37)
-                        mr.deactivate_all()
-                        _dbg_count += 1
-                        print(f"[PY-DBG #{_dbg_count}] slot={slot} rst_pin={mr.rst_lines.get(slot)} ver=0x{ver:02X}", file=sys.stderr, flush=True)
-                    uid = mr.read_uid(slot)
-                    if _dbg_count <= _DBG_MAX and uid:
-                        print(f"[PY-DBG] slot={slot} uid={uid}", file=sys.stderr, flush=True)
-                    print(json.dumps({"id": req_id, "ok": True, "uid": uid}), flush=True)
+                if not isinstance(req, dict):
                     continue
+                self.handle(req, client)
+                if req.get("cmd") == "hello":
+                    codec = client.out.codec  # switched only if the hello was accepted
+        finally:
+            self._drop_client(client)
+            writer.close()
+
+    async def _handle_now(self, req: dict, client: Client) -> None:
+        self.handle(req, client)
 
-                print(json.dumps({"id": req_id, "ok": False, "error": f"unknown cmd: {cmd}"}), flush=True)
+    async def run(self, stdio: bool = True, socket_path: Optional[str] = None) -> None:
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        self._sub_lock = asyncio.Lock()
+        server = None
+        stdio_client = None
+
+        def _read_stdin() -> None:
+            # Blocking reads on a thread work for pipes, files and ttys alike
+            stream = sys.stdin.buffer
+            codec = CODECS["jsonl"]
+            try:
+                while True:
+                    try:
+                        req = codec.read(stream)
+                    except EOFError:
+                        break
+                    except (ValueError, struct.error) as e:
+                        loop.call_soon_threadsafe(stdio_client.send, {"id": None, "ok": False, "error": str(e)})
+                        continue
+                    if not isinstance(req, dict):
+                        continue
+                    if req.get("cmd") == "hello":
+                        # Wait for the verdict: everything after an accepted hello is in the new framing
+                        asyncio.run_coroutine_threadsafe(self._handle_now(req, stdio_client), loop).result()
+                        codec = stdio_client.out.codec
+                        continue
+                    loop.call_soon_threadsafe(self.handle, req, stdio_client)
             except Exception as e:
-                req_id = None if req is None else req.get("id")
-                print(json.dumps({"id": req_id, "ok": False, "error": str(e)}), flush=True)
+                print(f"[PY] stdin reader failed: {e!r}", file=sys.stderr, flush=True)
+            finally:
+                # However the reader ends, the bridge shuts down instead of hanging deaf
+                loop.call_soon_threadsafe(stop.set)
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self._serve_client, path=socket_path)
+            os.chmod(socket_path, 0o660)
+            print(f"[PY] listening on {socket_path}", file=sys.stderr, flush=True)
+        if stdio:
+            stdout = sys.stdout.buffer
+            stdio_client = Client("stdio", Output(stdout.write, stdout.flush))
+            self._parent = stdio_client
+            self._add_client(stdio_client)
+            threading.Thread(target=_read_stdin, name="nfc-stdin", daemon=True).start()
+        else:
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, stop.set)
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if METRICS_TEXTFILE:
+            workers.append(asyncio.create_task(self._export_metrics(METRICS_TEXTFILE)))
+        self._announce_ready()
+        workers.append(asyncio.create_task(self._refresh_selftest()))
+        try:
+            await stop.wait()
+            self._stopping.set()
+            if server is not None:
+                server.close()
+            await self.queue.join()  # answer everything already received
+            if self._tasks:
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._executor.shutdown(wait=True)
+            if METRICS_TEXTFILE:
+                self.mr.metrics.write_textfile(METRICS_TEXTFILE, self.mr.clock, self.mr.breaker)  # final counts
+            for client, writer in list(self.clients.items()):
+                if writer is None:
+                    client.out.attach(None)  # flush stdout synchronously
+                else:
+                    client.out.flush()
+                    writer.close()
+            if socket_path and server is not None:
+                try:
+                    os.unlink(socket_path)
+                except FileNotFoundError:
+                    pass
+
+
+def bridge_request(req: dict, path: Optional[str] = None, timeout_s: float = 10.0) -> Optional[dict]:
+    """Send one request to a running bridge and return its reply, or None when no
+    bridge listens on path (default: NFC_SOCKET, else DEFAULT_SOCKET_PATH).
+    Diagnostics use this to share a live cabinet instead of seizing the bus."""
+    path = path or os.environ.get("NFC_SOCKET") or DEFAULT_SOCKET_PATH
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(timeout_s)
+    req = {"id": 1, **req}
+    with sock, sock.makefile("rwb") as f:
+        f.write((json.dumps(req) + "\n").encode())
+        f.flush()
+        for line in f:
+            msg = json.loads(line)
+            if msg.get("id") == req["id"]:
+                return msg
+    raise ConnectionError(f"bridge at {path} closed the connection")
+
+
+def _client_main(path: str, send: Optional[str], observe: bool) -> int:
+    """Talk to a running daemon: one request (--send) or a live event feed (--observe)."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError as e:
+        print(f"cannot connect to bridge at {path}: {e}", file=sys.stderr)
+        return 2
+    f = sock.makefile("rwb")
+    try:
+        if observe:
+            for req in ({"id": 1, "cmd": "hello", "role": "observer"}, {"id": 2, "cmd": "subscribe"}):
+                f.write((json.dumps(req) + "\n").encode())
+            f.flush()
+            for line in f:
+                print(line.decode().rstrip(), flush=True)
+            return 0
+        req = json.loads(send)
+        req.setdefault("id", 1)
+        f.write((json.dumps(req) + "\n").encode())
+        f.flush()
+        for line in f:
+            msg = json.loads(line)
+            if msg.get("id") == req["id"]:
+                print(json.dumps(msg))
+                return 0 if msg.get("ok") else 1
+        return 1
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        f.close()
+        sock.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="RC522 multi-reader bridge")
+    parser.add_argument("--daemon", action="store_true",
+                        help="serve only on the Unix socket (no stdin/stdout client)")
+    parser.add_argument("--socket", default=os.environ.get("NFC_SOCKET"),
+                        help=f"Unix socket path (default with --daemon/--send/--observe: {DEFAULT_SOCKET_PATH})")
+    parser.add_argument("--send", metavar="JSON", help="send one request to a running bridge and print the reply")
+    parser.add_argument("--observe", action="store_true", help="print a running bridge's events as an observer")
+    args = parser.parse_args(argv)
+
+    if args.send or args.observe:
+        return _client_main(args.socket or DEFAULT_SOCKET_PATH, args.send, args.observe)
+
+    socket_path = args.socket or (DEFAULT_SOCKET_PATH if args.daemon else None)
+    if socket_path:
+        # Before MultiReader(): a second bridge must not touch a live cabinet's RST lines
+        try:
+            _claim_socket_path(socket_path)
+        except RuntimeError as e:
+            print(json.dumps({"id": None, "ok": False, "error": str(e)}), flush=True)
+            return 1
+    mr = MultiReader()
+    try:
+        asyncio.run(Bridge(mr).run(stdio=not args.daemon, socket_path=socket_path))
     finally:
         mr.close()
     return 0
@@ -308,4 +2619,3 @@ def main() -> int:
 
 if __name__ == "__main__":
     raise SystemExit(main())
-
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+Software MFRC522 cabinet for running nfc_rc522_bridge.py without hardware
+
+Emulates one MFRC522 per slot behind fake spidev/lgpio modules: register file,
+64-byte FIFO, command register (Idle / Transceive / SoftReset), the timer
+(TMode/TPrescaler/TReload), ComIrqReg/ErrorReg bits and the open-drain IRQ line,
+plus ISO 14443A tags answering REQA/WUPA, ANTICOLL, SELECT and HLTA. RST LOW
+holds a chip in reset and drops its RF field, exactly like the cabinet wiring,
+so only the slot whose RST is HIGH answers on its bus.
+
+Enable with NFC_BACKEND=sim; NFC_SIM_SCRIPT points at an optional JSON file:
+  {
+    "seed": 1,                      RNG seed for noise (default 0, deterministic)
+    "latency_us": 40,               per SPI frame overhead on top of bytes*8/hz
+    "noise": 0.0,                   chance a transceive is corrupted (drop/parity/bit flip)
+    "slots": {
+      "3": {"tag": "04A1B2C3"},
+      "5": {"chip": "fm17522e"},    "genuine" (default), "fm17522e" or "absent"
+      "7": {"tag": "11223344", "noise": 0.2, "max_hz": 500000}
+    },
+    "timeline": [                   applied at t_ms after start
+      {"t_ms": 2000, "slot": 3, "tag": null},
+      {"t_ms": 2500, "slot": 3, "tag": "04A1B2C3"}
+    ]
+  }
+The file is re-read when it changes, so tags can be placed and removed while the
+bridge runs. max_hz: reads above this SPI clock come back with flipped bits.
+
+FM17522E quirks: VersionReg 0x18, slower start after RST (4 ms, no PowerDown
+report), SoftReset leaves it deaf for 50 ms, and it occasionally drops its
+register configuration (reset_rate, default 0.002 per transceive).
+
+In-process use (benchmarks): sim_backend() returns (spidev, lgpio) stand-ins;
+the lgpio one carries the SimCabinet as .cabinet for place()/remove().
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from spi_trace import GROUP_ALL, LGPIO_CONSTANTS
+
+# Reset values of the registers that matter to the bridge (MFRC522 datasheet 9.3)
+REG_RESET = {
+    0x01: 0x20,  # CommandReg: RcvOff, Idle
+    0x02: 0x80,  # ComIEnReg: IRqInv
+    0x04: 0x14,  # ComIrqReg
+    0x07: 0x21,  # Status1Reg
+    0x0B: 0x08,  # WaterLevelReg
+    0x0C: 0x10,  # ControlReg
+    0x0E: 0x80,  # CollReg
+    0x11: 0x3F,  # ModeReg
+    0x14: 0x80,  # TxControlReg
+    0x16: 0x10,  # TxSelReg
+    0x17: 0x84,  # RxSelReg
+    0x18: 0x84,  # RxThresholdReg
+    0x19: 0x4D,  # DemodReg
+    0x1C: 0x62,  # MfTxReg
+    0x24: 0x26,  # ModWidthReg
+    0x26: 0x48,  # RFCfgReg
+    0x27: 0x88,  # GsNReg
+    0x28: 0x20,  # CWGsPReg
+    0x29: 0x20,  # ModGsPReg
+}
+
+CHIP_VERSIONS = {"genuine": 0x92, "fm17522e": 0x18, "absent": 0x00}
+BOOT_S = {"genuine": 0.0005, "fm17522e": 0.004, "absent": 0.0}
+FM17522E_RESET_RATE = 0.002
+FM17522E_SOFTRESET_HANG_S = 0.05
+
+CMD_IDLE = 0x00
+CMD_TRANSMIT = 0x04
+CMD_TRANSCEIVE = 0x0C
+CMD_SOFTRESET = 0x0F
+
+BIT_US = 1e6 / 105_938  # ISO 14443A at 106 kbit/s
+FRAME_DELAY_US = 86  # PCD -> PICC frame delay time (FDT) for REQA/ANTICOLL
+
+ATQA_4BYTE_UID = [0x04, 0x00]
+SAK_MIFARE_1K = 0x08
+
+
+def crc_a(data: list[int]) -> list[int]:
+    """ISO 14443A CRC (what CalcCRC would produce), LSB first."""
+    crc = 0x6363
+    for b in data:
+        b ^= crc & 0xFF
+        b = (b ^ (b << 4)) & 0xFF
+        crc = (crc >> 8) ^ (b << 8) ^ (b << 3) ^ (b >> 4)
+    return [crc & 0xFF, (crc >> 8) & 0xFF]
+
+
+class SimTag:
+    """A 4-byte-UID ISO 14443A PICC: IDLE -> READY -> ACTIVE, HALT via HLTA."""
+
+    def __init__(self, uid_hex: str):
+        self.uid = list(bytes.fromhex(uid_hex))
+        if len(self.uid) != 4:
+            raise ValueError(f"only 4-byte UIDs are emulated: {uid_hex}")
+        self.state = "idle"
+
+    @property
+    def uid_hex(self) -> str:
+        return bytes(self.uid).hex().upper()
+
+    def field_off(self) -> None:
+        self.state = "idle"
+
+    def respond(self, frame: list[int], last_bits: int) -> Optional[list[int]]:
+        if last_bits == 7 and len(frame) == 1:
+            if (frame[0] == 0x26 and self.state == "idle") or (frame[0] == 0x52 and self.state in ("idle", "halt")):
+                self.state = "ready"
+                return list(ATQA_4BYTE_UID)
+            if self.state in ("ready", "active"):
+                self.state = "idle"  # ISO 14443-3: an unexpected command drops it back, unanswered
+            return None
+        if frame[:2] == [0x93, 0x20] and self.state == "ready":
+            u = self.uid
+            return u + [u[0] ^ u[1] ^ u[2] ^ u[3]]
+        if frame[:2] == [0x93, 0x70] and len(frame) == 9 and self.state == "ready" and frame[2:6] == self.uid:
+            self.state = "active"
+            return [SAK_MIFARE_1K] + crc_a([SAK_MIFARE_1K])
+        if frame[:2] == [0x50, 0x00]:
+            self.state = "halt"
+        return None
+
+
+class SimChip:
+    def __init__(self, cabinet: "SimCabinet", slot: int, kind: str = "genuine"):
+        self.cabinet = cabinet
+        self.slot = slot
+        self.kind = kind
+        self.noise: Optional[float] = None  # None = cabinet default
+        self.max_hz: Optional[int] = None
+        self.reset_rate = FM17522E_RESET_RATE if kind == "fm17522e" else 0.0
+        self.powered = False
+        self.ready_at = 0.0
+        self.regs = [0] * 64
+        self.fifo: list[int] = []
+        self.pending: Optional[Tuple[float, Optional[list[int]], int]] = None  # (at, response, error bits)
+        self.sent_at: Optional[float] = None  # Transmit command: IdleIRq once the frame is out
+        self.transceives = 0
+
+    # --- power / reset ---
+
+    def reset(self, now: float, boot_s: Optional[float] = None) -> None:
+        # TxControlReg goes back to antenna off: a tag in the field loses power
+        tag = self.cabinet.tags.get(self.slot)
+        if tag is not None:
+            tag.field_off()
+        self.regs = [REG_RESET.get(i, 0) for i in range(64)]
+        self.fifo = []
+        self.pending = None
+        self.sent_at = None
+        self.ready_at = now + (BOOT_S[self.kind] if boot_s is None else boot_s)
+
+    def set_power(self, on: bool, now: float) -> None:
+        if on and not self.powered:
+            self.reset(now)
+        if not on:
+            tag = self.cabinet.tags.get(self.slot)
+            if tag is not None:
+                tag.field_off()
+            self.pending = None
+            self.sent_at = None
+        self.powered = on
+
+    @property
+    def irq_asserted(self) -> bool:
+        # Open drain, active LOW only with IRqInv; push-pull modes are not wired here
+        ien = self.regs[0x02]
+        return self.powered and bool(ien & 0x80) and bool(self.regs[0x04] & ien & 0x7F)
+
+    # --- SPI ---
+
+    def xfer(self, data: list[int], now: float) -> list[int]:
+        if not self.powered or self.kind == "absent" or now < self.ready_at:
+            return [0] * len(data)
+        self.advance(now)
+        out = [0] * len(data)
+        addr = data[0]
+        reg = (addr >> 1) & 0x3F
+        if addr & 0x80:
+            for i in range(1, len(data)):
+                out[i] = self._read(reg)
+                reg = (data[i] >> 1) & 0x3F
+        else:
+            for value in data[1:]:
+                self._write(reg, value, now)
+        return out
+
+    def _read(self, reg: int) -> int:
+        if reg == 0x09:
+            return self.fifo.pop(0) if self.fifo else 0
+        if reg == 0x0A:
+            return len(self.fifo)
+        if reg == 0x37:
+            return CHIP_VERSIONS[self.kind]
+        if reg == 0x01 and self.kind == "fm17522e":
+            return self.regs[reg] & ~0x10  # the clone never reports PowerDown
+        return self.regs[reg]
+
+    def _write(self, reg: int, value: int, now: float) -> None:
+        if reg == 0x01:
+            self._command(value, now)
+        elif reg in (0x04, 0x05):
+            # Set1 bit: 1 sets the marked bits, 0 clears them
+            if value & 0x80:
+                self.regs[reg] |= value & 0x7F
+            else:
+                self.regs[reg] &= ~value & 0x7F
+        elif reg == 0x09:
+            if len(self.fifo) >= 64:
+                self.regs[0x06] |= 0x10  # BufferOvfl
+            else:
+                self.fifo.append(value)
+        elif reg == 0x0A:
+            if value & 0x80:
+                self.fifo = []
+                self.regs[0x06] &= ~0x10
+        elif reg in (0x06, 0x07, 0x08, 0x37):
+            pass  # read-only
+        elif reg == 0x0D:
+            self.regs[reg] = value
+            if value & 0x80 and self.regs[0x01] & 0x0F == CMD_TRANSCEIVE:
+                self._transceive(now)
+        else:
+            self.regs[reg] = value
+
+    def _command(self, value: int, now: float) -> None:
+        cmd = value & 0x0F
+        if cmd == CMD_SOFTRESET:
+            hang = FM17522E_SOFTRESET_HANG_S if self.kind == "fm17522e" else None
+            self.reset(now, boot_s=hang)
+            return
+        if cmd == CMD_IDLE:
+            self.pending = None
+            self.sent_at = None
+        self.regs[0x01] = (value & 0x30) | cmd
+        if cmd == CMD_TRANSMIT:
+            self._transmit(now)
+
+    # --- RF ---
+
+    def _transceive(self, now: float) -> None:
+        cab = self.cabinet
+        frame, self.fifo = self.fifo, []
+        last_bits = self.regs[0x0D] & 0x07
+        self.regs[0x06] = 0
+        self.transceives += 1
+        if self.reset_rate and cab.rng.random() < self.reset_rate:
+            # Clone drops its configuration mid-session; the bridge's probe() notices
+            self.reset(now, boot_s=0.0)
+            return
+        tx_bits = len(frame) * 9 - ((8 - last_bits) if last_bits else 0)
+        tx_us = tx_bits * BIT_US
+        response = None
+        tag = cab.tags.get(self.slot)
+        if tag is not None and self.regs[0x14] & 0x03 == 0x03:
+            response = tag.respond(frame, last_bits)
+        error = 0
+        noise = cab.noise if self.noise is None else self.noise
+        if response is not None and noise and cab.rng.random() < noise:
+            effect = cab.rng.choice(("drop", "parity", "flip"))
+            if effect == "drop":
+                response = None
+            elif effect == "parity":
+                error = 0x02  # ParityErr
+            else:
+                i = cab.rng.randrange(len(response))
+                response = list(response)
+                response[i] ^= 1 << cab.rng.randrange(8)
+        if response is not None:
+            at = now + (tx_us + FRAME_DELAY_US + len(response) * 9 * BIT_US) / 1e6
+            self.pending = (at, response, error)
+        elif self.regs[0x2A] & 0x80:  # TAuto: timer starts at end of transmission
+            prescaler = ((self.regs[0x2A] & 0x0F) << 8) | self.regs[0x2B]
+            reload = (self.regs[0x2C] << 8) | self.regs[0x2D]
+            period_s = (reload + 1) * (2 * prescaler + 1) / 13_560_000
+            self.pending = (now + tx_us / 1e6 + period_s, None, 0)
+        else:
+            self.pending = None  # no timer: only the host's own timeout ends this
+        if self.pending is not None:
+            cab.schedule(self, self.pending[0])
+
+    def _transmit(self, now: float) -> None:
+        # Send-only (HLTA): nothing is received, the command ends when the frame is out
+        frame, self.fifo = self.fifo, []
+        last_bits = self.regs[0x0D] & 0x07
+        self.regs[0x06] = 0
+        tag = self.cabinet.tags.get(self.slot)
+        if tag is not None and self.regs[0x14] & 0x03 == 0x03:
+            tag.respond(frame, last_bits)
+        tx_bits = len(frame) * 9 - ((8 - last_bits) if last_bits else 0)
+        self.sent_at = now + tx_bits * BIT_US / 1e6
+        self.cabinet.schedule(self, self.sent_at)
+
+    def advance(self, now: float) -> None:
+        if self.sent_at is not None and now >= self.sent_at:
+            self.sent_at = None
+            self.regs[0x01] = (self.regs[0x01] & 0x30) | CMD_IDLE
+            self.regs[0x04] |= 0x50  # TxIRq | IdleIRq
+        if self.pending is None or now < self.pending[0]:
+            return
+        _, response, error = self.pending
+        self.pending = None
+        if response is None:
+            self.regs[0x04] |= 0x01  # TimerIRq
+            return
+        self.fifo = list(response)
+        self.regs[0x0C] = (self.regs[0x0C] & ~0x07) & 0xFF  # whole bytes received
+        self.regs[0x06] |= error
+        self.regs[0x04] |= 0x20 | (0x02 if error else 0)  # RxIRq (+ ErrIRq)
+
+
+class SimCabinet:
+    """All emulated readers, their RST/IRQ wiring and the tags in their slots."""
+
+    def __init__(self, script_path: Optional[str] = None,
+                 wiring: Optional[Callable[[], Tuple[dict, dict]]] = None):
+        self.t0 = time.monotonic()
+        self.script_path = script_path
+        self._wiring = wiring
+        self._lock = threading.RLock()
+        self.rng = random.Random(0)
+        self.latency_s = 40e-6
+        self.noise = 0.0
+        self.levels: dict[int, int] = {}  # GPIO -> level driven by the host
+        self.callbacks: dict[int, Callable] = {}
+        self.tags: dict[int, SimTag] = {}
+        self.chips: dict[int, SimChip] = {}
+        self.slot_settings: dict[int, dict] = {}
+        self._timeline: list[dict] = []
+        self._script_mtime: Optional[float] = None
+        self._script_checked = 0.0
+        self._wired = False
+        self.rst_slot: dict[int, int] = {}  # RST GPIO -> slot
+        self.bus_slots: dict[Tuple[int, int], list[int]] = {}
+        self.bus_irq: dict[Tuple[int, int], int] = {}
+        self.irq_low: dict[int, bool] = {}
+        self._reload_script(force=True)
+
+    # --- wiring ---
+
+    def _wire(self) -> None:
+        if self._wired:
+            return
+        self._wired = True
+        topology, irq_map = self._wiring() if self._wiring else ({}, {})
+        for slot, (bus, ce, pin) in topology.items():
+            settings = self.slot_settings.get(slot, {})
+            chip = SimChip(self, slot, settings.get("chip", "genuine"))
+            self._apply_chip_settings(chip, settings)
+            self.chips[slot] = chip
+            self.rst_slot[pin] = slot
+            self.bus_slots.setdefault((bus, ce), []).append(slot)
+            if self.levels.get(pin):
+                chip.set_power(True, time.monotonic())
+        self.bus_irq = dict(irq_map)
+
+    @staticmethod
+    def _apply_chip_settings(chip: SimChip, settings: dict) -> None:
+        chip.noise = settings.get("noise")
+        chip.max_hz = settings.get("max_hz")
+        if "reset_rate" in settings:
+            chip.reset_rate = float(settings["reset_rate"])
+
+    # --- scripting ---
+
+    def place(self, slot: int, uid_hex: Optional[str]) -> None:
+        with self._lock:
+            if uid_hex:
+                self.tags[slot] = SimTag(uid_hex)
+            else:
+                self.tags.pop(slot, None)
+
+    def remove(self, slot: int) -> None:
+        self.place(slot, None)
+
+    def _reload_script(self, force: bool = False) -> None:
+        path = self.script_path
+        if not path:
+            return
+        now = time.monotonic()
+        if not force and now - self._script_checked < 0.1:
+            return
+        self._script_checked = now
+        try:
+            mtime = os.stat(path).st_mtime
+            if not force and mtime == self._script_mtime:
+                return
+            with open(path) as f:
+                script = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._script_mtime = mtime
+        if force:
+            self.rng.seed(script.get("seed", 0))
+        self.latency_s = float(script.get("latency_us", 40)) / 1e6
+        self.noise = float(script.get("noise", 0.0))
+        self.slot_settings = {int(k): v for k, v in script.get("slots", {}).items()}
+        self.tags = {}
+        for slot, settings in self.slot_settings.items():
+            if settings.get("tag"):
+                self.tags[slot] = SimTag(settings["tag"])
+            chip = self.chips.get(slot)
+            if chip is not None:
+                self._apply_chip_settings(chip, settings)
+        self._timeline = sorted(script.get("timeline", []), key=lambda e: e["t_ms"])
+
+    def _run_timeline(self, now: float) -> None:
+        t_ms = (now - self.t0) * 1000
+        while self._timeline and self._timeline[0]["t_ms"] <= t_ms:
+            event = self._timeline.pop(0)
+            self.place(int(event["slot"]), event.get("tag"))
+
+    # --- SPI / GPIO entry points ---
+
+    def xfer(self, bus: Tuple[int, int], data: list[int], hz: int) -> list[int]:
+        with self._lock:
+            self._wire()
+            self._reload_script()
+            now = time.monotonic()
+            self._run_timeline(now)
+            powered = [self.chips[s] for s in self.bus_slots.get(bus, ()) if self.chips[s].powered]
+            # Nothing selected: MISO is not driven and reads back as zeros
+            out = [0xFF] * len(data) if powered else [0] * len(data)
+            for chip in powered:
+                # Every selected chip sees MOSI; MISO outputs fight (wired-AND)
+                rx = chip.xfer(data, now)
+                if chip.max_hz and hz > chip.max_hz:
+                    rx = [b ^ (1 << self.rng.randrange(8)) if self.rng.random() < 0.3 else b for b in rx]
+                out = [a & b for a, b in zip(out, rx)]
+            edges = self._update_irq()
+        self._fire(edges)
+        time.sleep(self.latency_s + (len(data) * 8 / hz if hz else 0.0))
+        return out
+
+    def write(self, pin: int, level: int) -> None:
+        with self._lock:
+            self._wire()
+            self.levels[pin] = 1 if level else 0
+            slot = self.rst_slot.get(pin)
+            if slot is not None:
+                self.chips[slot].set_power(bool(level), time.monotonic())
+            edges = self._update_irq()
+        self._fire(edges)
+
+    def read(self, pin: int) -> int:
+        with self._lock:
+            self._wire()
+            if pin in self.bus_irq.values():
+                self._advance_all(time.monotonic())
+                self._update_irq()
+                return 0 if self.irq_low.get(pin) else 1
+            return self.levels.get(pin, 0)
+
+    def schedule(self, chip: SimChip, at: float) -> None:
+        # Only IRQ listeners need the completion pushed; pollers see it on their next read
+        bus = next((b for b, slots in self.bus_slots.items() if chip.slot in slots), None)
+        if bus is None or self.bus_irq.get(bus) not in self.callbacks:
+            return
+        timer = threading.Timer(max(0.0, at - time.monotonic()), self._tick)
+        timer.daemon = True
+        timer.start()
+
+    def _tick(self) -> None:
+        with self._lock:
+            self._advance_all(time.monotonic())
+            edges = self._update_irq()
+        self._fire(edges)
+
+    def _advance_all(self, now: float) -> None:
+        for chip in self.chips.values():
+            if chip.powered:
+                chip.advance(now)
+
+    def _update_irq(self) -> list[int]:
+        """Recompute every IRQ line; returns pins that just fell."""
+        fell = []
+        for bus, pin in self.bus_irq.items():
+            low = any(self.chips[s].irq_asserted for s in self.bus_slots.get(bus, ()))
+            if low and not self.irq_low.get(pin):
+                fell.append(pin)
+            self.irq_low[pin] = low
+        return fell
+
+    def _fire(self, pins: list[int]) -> None:
+        for pin in pins:
+            func = self.callbacks.get(pin)
+            if func is not None:
+                func(0, pin, 0, time.monotonic_ns())
+
+
+class _SimSpiDev:
+    def __init__(self, cabinet: SimCabinet):
+        self._cabinet = cabinet
+        self._bus = (0, 0)
+        self.max_speed_hz = 500_000
+        self.mode = 0
+
+    def open(self, bus: int, ce: int) -> None:
+        self._bus = (bus, ce)
+
+    def xfer2(self, data: list[int]) -> list[int]:
+        return self._cabinet.xfer(self._bus, list(data), self.max_speed_hz)
+
+    def close(self) -> None:
+        pass
+
+
+class _SimSpiModule:
+    def __init__(self, cabinet: SimCabinet):
+        self.cabinet = cabinet
+
+    def SpiDev(self) -> _SimSpiDev:
+        return _SimSpiDev(self.cabinet)
+
+
+class _SimCallback:
+    def __init__(self, cabinet: SimCabinet, pin: int):
+        self._cabinet = cabinet
+        self.pin = pin
+
+    def cancel(self) -> None:
+        self._cabinet.callbacks.pop(self.pin, None)
+
+
+class _SimGpioModule:
+    """lgpio stand-in driving the cabinet's RST lines and reporting its IRQ lines."""
+
+    def __init__(self, cabinet: SimCabinet):
+        self.cabinet = cabinet
+        self.groups: dict[int, list[int]] = {}  # leader pin -> group pins, bit order
+        for name, value in LGPIO_CONSTANTS.items():
+            setattr(self, name, value)
+
+    def gpiochip_open(self, chip: int) -> int:
+        return 0
+
+    def gpiochip_close(self, handle: int) -> int:
+        return 0
+
+    def gpio_claim_output(self, handle: int, pin: int, level: int = 0, flags: int = 0) -> int:
+        self.cabinet.write(pin, level)
+        return 0
+
+    def gpio_claim_alert(self, handle: int, pin: int, edge: int, flags: int = 0, notify: int = -1) -> int:
+        return 0
+
+    def gpio_free(self, handle: int, pin: int) -> int:
+        return 0
+
+    def gpio_write(self, handle: int, pin: int, level: int) -> int:
+        self.cabinet.write(pin, level)
+        return 0
+
+    def gpio_read(self, handle: int, pin: int) -> int:
+        return self.cabinet.read(pin)
+
+    def group_claim_output(self, handle: int, gpios: list[int], levels: list[int] = (0,), flags: int = 0) -> int:
+        self.groups[gpios[0]] = list(gpios)
+        for i, pin in enumerate(gpios):
+            self.cabinet.write(pin, levels[i] if i < len(levels) else 0)
+        return 0
+
+    def group_free(self, handle: int, gpio: int) -> int:
+        self.groups.pop(gpio, None)
+        return 0
+
+    def group_write(self, handle: int, gpio: int, group_bits: int, group_mask: int = GROUP_ALL) -> int:
+        # lgpio sets every masked line in one request; the cabinet sees them in bit order
+        for i, pin in enumerate(self.groups[gpio]):
+            if group_mask >> i & 1:
+                self.cabinet.write(pin, group_bits >> i & 1)
+        return 0
+
+    def callback(self, handle: int, pin: int, edge: int, func) -> _SimCallback:
+        self.cabinet.callbacks[pin] = func
+        return _SimCallback(self.cabinet, pin)
+
+
+def sim_backend(script_path: Optional[str] = None,
+                wiring: Optional[Callable[[], Tuple[dict, dict]]] = None):
+    """spidev/lgpio stand-ins backed by one SimCabinet.
+
+    wiring() is called on first use and returns ({slot: (bus, ce, rst_pin)},
+    {(bus, ce): irq_pin}), i.e. the bridge's own topology and IRQ map."""
+    cabinet = SimCabinet(script_path, wiring)
+    return _SimSpiModule(cabinet), _SimGpioModule(cabinet)
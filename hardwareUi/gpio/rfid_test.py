@@ -32,8 +32,52 @@ Simple MFRC522 test script (single reader)
     RC522 RST  -> GPIO25 (Pin 22)   # ตาม default ของไลบรารี
     RC522 3.3V -> Pin 1  (3.3V)
     RC522 GND  -> Pin 6  (GND)
+
+ถ้า NFC bridge ของ kiosk กำลังทำงาน (socket: NFC_SOCKET หรือ /tmp/kms_nfc_bridge.sock)
+script จะรอบัตรผ่าน bridge แทน (ทุก slot, แสดงเฉพาะ UID) โดยไม่ต้องหยุด kiosk
 """
 
+import sys
+import time
+
+from nfc_rc522_bridge import bridge_request
+
+
+def _uids(last=None):
+    """slot -> UID from one bridge scan (last again if the scan failed), None once the bridge is gone."""
+    reply = bridge_request({"cmd": "scan"})
+    if reply is None:
+        return None
+    if not reply.get("ok", True):
+        return last
+    return {r["slot"]: r.get("uid") for r in reply.get("results", [])}
+
+
+def _wait_via_bridge():
+    """Wait for a newly placed card through the bridge; False if it isn't (or stops) answering."""
+    # Keys already parked in their slots don't count: wait for a slot whose UID changes
+    older = before = _uids({})
+    if before is None:
+        return False
+    print("NFC bridge is running — place your card on any slot")
+    # Two scans back as well, so one missed read of a parked key isn't a "new" card
+    while True:
+        time.sleep(0.3)
+        now = _uids(before)
+        if now is None:
+            # The bridge released the bus, so the reader can be used directly
+            print("NFC bridge stopped — falling back to the reader on SPI")
+            return False
+        placed = [slot for slot, uid in now.items() if uid and uid not in (before.get(slot), older.get(slot))]
+        if placed:
+            print("ID: %s\nSlot: %s" % (now[placed[0]], placed[0]))
+            return True
+        older, before = before, now
+
+
+if _wait_via_bridge():
+    sys.exit(0)
+
 import RPi.GPIO as GPIO  # type: ignore
 from mfrc522 import SimpleMFRC522  # type: ignore
 
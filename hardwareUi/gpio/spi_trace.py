@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+SPI / GPIO trace recorder and replay backend for nfc_rc522_bridge.py
+
+Recording wraps the real spidev handle and lgpio module: every SPI frame (tx, rx,
+start time, duration), clock change, GPIO write/read and IRQ edge is appended to
+a compact binary file. Replay serves a recorded file back as drop-in spidev/lgpio
+modules, so the unchanged bridge runs against captured cabinet traffic on any
+Linux box.
+
+Used by the bridge through its environment:
+  NFC_RECORD=/tmp/cabinet.nfct.gz            record while running on hardware
+  NFC_BACKEND=replay NFC_REPLAY_TRACE=/tmp/cabinet.nfct.gz
+  NFC_REPLAY_SPEED  1.0 = recorded SPI/IRQ timing (default), 0 = as fast as possible
+
+Replay is data-driven: each reader (bus, ce and the RST line that was HIGH)
+gets its recorded frames back in order, whatever the timing, so a self-test or
+read that runs at another moment than in the recording still lines up. Loops
+that stop on time rather than on a count (ComIrqReg polling, the settle wait)
+change the number of frames, so frames are matched by tx: one more repeat of
+the previous frame (another status poll) gets the same rx again, and frames
+the bridge no longer sends are skipped up to the next one with the same tx. A
+tx with no match nearby is a divergence and fails the transfer (ReplayDiverged)
+instead of returning the rx of some other frame. IRQ edges fire at their
+recorded offset after the frame that preceded them on the same bus.
+
+File format (".gz" suffix = gzip):
+  b"KMSNFCT1", then records  <B kind><Q t_us since start> + body
+  0x01 xfer   <I dur_us><B bus><B ce><H n> tx[n] rx[n]
+  0x02 speed  <B bus><B ce><I hz>
+  0x03 write  <H pin><B level>               (a group_write logs one per masked line)
+  0x04 read   <H pin><B level>
+  0x05 edge   <B bus><B ce><H pin><B level>   (bus/ce of the SPI device the IRQ line serves)
+  0x06 line   <B bus><B ce><H pin>            (RST line of a reader on that SPI device)
+
+Inspect a trace:
+  python3 spi_trace.py summary TRACE
+  python3 spi_trace.py dump TRACE [--limit N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import gzip
+import struct
+import sys
+import threading
+import time
+from typing import Optional, Tuple
+
+MAGIC = b"KMSNFCT1"
+
+REC_XFER = 0x01
+REC_SPEED = 0x02
+REC_WRITE = 0x03
+REC_READ = 0x04
+REC_EDGE = 0x05
+REC_LINE = 0x06
+
+_HEAD = struct.Struct("<BQ")
+_BODY = {
+    REC_XFER: struct.Struct("<IBBH"),
+    REC_SPEED: struct.Struct("<BBI"),
+    REC_WRITE: struct.Struct("<HB"),
+    REC_READ: struct.Struct("<HB"),
+    REC_EDGE: struct.Struct("<BBHB"),
+    REC_LINE: struct.Struct("<BBH"),
+}
+REC_NAMES = {REC_XFER: "xfer", REC_SPEED: "speed", REC_WRITE: "write", REC_READ: "read", REC_EDGE: "edge",
+             REC_LINE: "line"}
+
+# lgpio constants the bridge uses, for replay on machines without lgpio
+LGPIO_CONSTANTS = {
+    "RISING_EDGE": 1, "FALLING_EDGE": 2, "BOTH_EDGES": 3,
+    "SET_ACTIVE_LOW": 4, "SET_OPEN_DRAIN": 8, "SET_OPEN_SOURCE": 16,
+    "SET_PULL_UP": 32, "SET_PULL_DOWN": 64, "SET_PULL_NONE": 128,
+}
+GROUP_ALL = 0xFFFFFFFFFFFFFFFF  # lgpio's default group_write mask
+
+
+def _open(path: str, mode: str):
+    return gzip.open(path, mode) if path.endswith(".gz") else open(path, mode)
+
+
+class TraceWriter:
+    """Append-only record stream shared by every recording device."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.t0 = time.monotonic()
+        self._f = _open(path, "wb")
+        self._f.write(MAGIC)
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def now_us(self) -> int:
+        return int((time.monotonic() - self.t0) * 1_000_000)
+
+    def write(self, kind: int, t_us: int, *fields, payload: bytes = b"") -> None:
+        rec = _HEAD.pack(kind, t_us) + _BODY[kind].pack(*fields) + payload
+        with self._lock:
+            if self._f is not None:
+                self._f.write(rec)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+def read_trace(path: str) -> list[tuple]:
+    """All records as (kind, t_us, fields, tx, rx); tx/rx are empty except for xfers."""
+    with _open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path}: not an NFC trace")
+    records = []
+    pos = len(MAGIC)
+    while pos < len(data):
+        if pos + _HEAD.size > len(data):
+            break  # truncated tail (recorder killed mid-write)
+        kind, t_us = _HEAD.unpack_from(data, pos)
+        body = _BODY.get(kind)
+        if body is None:
+            raise ValueError(f"{path}: unknown record 0x{kind:02X} at byte {pos}")
+        pos += _HEAD.size
+        if pos + body.size > len(data):
+            break
+        fields = body.unpack_from(data, pos)
+        pos += body.size
+        tx = rx = b""
+        if kind == REC_XFER:
+            n = fields[3]
+            if pos + 2 * n > len(data):
+                break
+            tx, rx = data[pos:pos + n], data[pos + n:pos + 2 * n]
+            pos += 2 * n
+        records.append((kind, t_us, fields, tx, rx))
+    return records
+
+
+# --- recording ------------------------------------------------------------------
+
+class _RecordingSpiDev:
+    def __init__(self, backend: "_RecordingBackend"):
+        self._backend = backend
+        self._dev = backend.spidev.SpiDev()
+        self._bus = (0, 0)
+
+    def open(self, bus: int, ce: int) -> None:
+        self._dev.open(bus, ce)
+        self._bus = (bus, ce)
+        backend = self._backend
+        backend.last_opened = self._bus
+        # The bridge claims a bus's RST group right before opening its SPI device
+        writer = backend.writer
+        for pin in backend.pending_lines:
+            writer.write(REC_LINE, writer.now_us(), bus, ce, pin)
+        backend.pending_lines = []
+
+    def xfer2(self, data: list[int]) -> list[int]:
+        writer = self._backend.writer
+        t = writer.now_us()
+        rx = self._dev.xfer2(data)
+        dur = writer.now_us() - t
+        writer.write(REC_XFER, t, dur, self._bus[0], self._bus[1], len(data),
+                     payload=bytes(data) + bytes(rx))
+        return rx
+
+    @property
+    def max_speed_hz(self) -> int:
+        return self._dev.max_speed_hz
+
+    @max_speed_hz.setter
+    def max_speed_hz(self, hz: int) -> None:
+        self._dev.max_speed_hz = hz
+        writer = self._backend.writer
+        writer.write(REC_SPEED, writer.now_us(), self._bus[0], self._bus[1], hz)
+
+    def __getattr__(self, name):
+        return getattr(self._dev, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_") or name == "max_speed_hz":
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._dev, name, value)
+
+
+class _RecordingBackend:
+    def __init__(self, spidev, lgpio, path: str):
+        self.spidev = spidev
+        self.lgpio = lgpio
+        self.writer = TraceWriter(path)
+        self.last_opened: Tuple[int, int] = (0, 0)
+        self.pending_lines: list[int] = []  # RST group claimed, SPI device not opened yet
+
+
+class _RecordingSpiModule:
+    def __init__(self, backend: _RecordingBackend):
+        self._backend = backend
+
+    def SpiDev(self) -> _RecordingSpiDev:
+        return _RecordingSpiDev(self._backend)
+
+
+class _RecordingGpioModule:
+    """lgpio stand-in: writes, reads and alert callbacks are logged, the rest passes through."""
+
+    def __init__(self, backend: _RecordingBackend):
+        self._backend = backend
+        self._groups: dict[int, list[int]] = {}  # leader pin -> group pins, bit order
+
+    def __getattr__(self, name):
+        return getattr(self._backend.lgpio, name)
+
+    def group_claim_output(self, handle: int, gpios: list[int], levels: list[int] = (0,), flags: int = 0):
+        self._groups[gpios[0]] = list(gpios)
+        self._backend.pending_lines = list(gpios)
+        return self._backend.lgpio.group_claim_output(handle, gpios, levels, flags)
+
+    def group_write(self, handle: int, gpio: int, group_bits: int, group_mask: int = GROUP_ALL):
+        # One write record per masked line, stamped with the same time
+        writer = self._backend.writer
+        t_us = writer.now_us()
+        for i, pin in enumerate(self._groups.get(gpio, ())):
+            if group_mask >> i & 1:
+                writer.write(REC_WRITE, t_us, pin, group_bits >> i & 1)
+        return self._backend.lgpio.group_write(handle, gpio, group_bits, group_mask)
+
+    def gpio_write(self, handle: int, pin: int, level: int):
+        writer = self._backend.writer
+        writer.write(REC_WRITE, writer.now_us(), pin, level)
+        return self._backend.lgpio.gpio_write(handle, pin, level)
+
+    def gpio_read(self, handle: int, pin: int):
+        level = self._backend.lgpio.gpio_read(handle, pin)
+        writer = self._backend.writer
+        writer.write(REC_READ, writer.now_us(), pin, 1 if level else 0)
+        return level
+
+    def callback(self, handle: int, pin: int, edge: int, func):
+        # The bridge claims a bus's IRQ line right after opening its SPI device
+        bus, ce = self._backend.last_opened
+        writer = self._backend.writer
+
+        def _recorded(chip, gpio, level, tick):
+            writer.write(REC_EDGE, writer.now_us(), bus, ce, gpio, level)
+            func(chip, gpio, level, tick)
+
+        return self._backend.lgpio.callback(handle, pin, edge, _recorded)
+
+
+def record_backend(spidev, lgpio, path: str):
+    """Wrap real (or emulated) spidev/lgpio modules so all traffic is written to path."""
+    backend = _RecordingBackend(spidev, lgpio, path)
+    print(f"[PY] recording SPI/GPIO trace to {path}", file=sys.stderr, flush=True)
+    return _RecordingSpiModule(backend), _RecordingGpioModule(backend)
+
+
+# --- replay ---------------------------------------------------------------------
+
+class ReplayExhausted(OSError):
+    """The bridge asked for more SPI frames on a bus than the trace holds."""
+
+
+class ReplayDiverged(OSError):
+    """The bridge sent a frame the trace has no match for at this point."""
+
+
+# How far ahead of the oldest unserved frame a match for the bridge's tx is looked for
+RESYNC_WINDOW = 256
+
+
+class _ReplayCallback:
+    def __init__(self, backend: "_ReplayBackend", pin: int):
+        self._backend = backend
+        self.pin = pin
+
+    def cancel(self) -> None:
+        self._backend.callbacks.pop(self.pin, None)
+
+
+class _ReplayStream:
+    """Recorded frames of one reader plus the IRQ edges that followed each."""
+
+    def __init__(self):
+        self.frames: list[tuple] = []  # (t_us, dur_us, tx, rx)
+        self.edges: dict[int, list[tuple]] = {}  # frame index -> [(delay_us, pin, level)]
+        self.pos = 0  # oldest frame not served yet
+        self.served: set[int] = set()  # served frames at or after pos
+        self.last: Optional[int] = None  # index of the frame served last
+        self.lock = threading.Lock()
+
+    def match(self, tx: bytes) -> Tuple[Optional[int], str]:
+        """Index of the recorded frame answering tx and how it was found: "next",
+        "repeat" (same as the last frame), "skip" (further ahead; the frames passed
+        over stay available, so two operations recorded in the other order still
+        line up) or "none"."""
+        frames, pos = self.frames, self.pos
+        if pos < len(frames) and frames[pos][2] == tx:
+            self._take(pos)
+            return pos, "next"
+        if self.last is not None and frames[self.last][2] == tx:
+            return self.last, "repeat"
+        for i in range(pos + 1, min(len(frames), pos + 1 + RESYNC_WINDOW)):
+            if i not in self.served and frames[i][2] == tx:
+                self._take(i)
+                return i, "skip"
+        return None, "none"
+
+    def _take(self, index: int) -> None:
+        self.last = index
+        self.served.add(index)
+        while self.pos in self.served:
+            self.served.discard(self.pos)
+            self.pos += 1
+
+
+class _ReplayBackend:
+    def __init__(self, path: str, speed: float):
+        self.path = path
+        self.speed = speed
+        # (bus, ce, RST pin HIGH or None) -> frames; traces without "line" records
+        # (older recorders) keep one stream per bus with the pin always None
+        self.streams: dict[Tuple[int, int, Optional[int]], _ReplayStream] = {}
+        self.bus_lines: dict[Tuple[int, int], list[int]] = {}
+        self.levels: dict[int, int] = {}  # pin -> level written by the bridge (now) / recorder (loading)
+        self.reads: dict[int, list[int]] = {}  # pin -> recorded gpio_read levels
+        self.callbacks: dict[int, object] = {}
+        self.frames = 0
+        self.divergences = 0
+        self.repeats = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        last_stream: dict[Tuple[int, int], _ReplayStream] = {}
+        for kind, t_us, fields, tx, rx in read_trace(path):
+            if kind == REC_XFER:
+                dur, bus, ce, _ = fields
+                stream = self.streams.setdefault(self._key((bus, ce)), _ReplayStream())
+                stream.frames.append((t_us, dur, tx, rx))
+                last_stream[(bus, ce)] = stream
+            elif kind == REC_EDGE:
+                bus, ce, pin, level = fields
+                stream = last_stream.get((bus, ce))
+                if stream is not None:
+                    last_t, last_dur = stream.frames[-1][0], stream.frames[-1][1]
+                    delay = max(0, t_us - (last_t + last_dur))
+                    stream.edges.setdefault(len(stream.frames) - 1, []).append((delay, pin, level))
+            elif kind == REC_WRITE:
+                pin, level = fields
+                self.levels[pin] = level
+            elif kind == REC_LINE:
+                bus, ce, pin = fields
+                self.bus_lines.setdefault((bus, ce), []).append(pin)
+            elif kind == REC_READ:
+                pin, level = fields
+                self.reads.setdefault(pin, []).append(level)
+        self.levels = {}  # from here on: what the replayed bridge drives
+        atexit.register(self.report)
+
+    def _key(self, bus: Tuple[int, int]) -> Tuple[int, int, Optional[int]]:
+        selected = next((pin for pin in self.bus_lines.get(bus, ()) if self.levels.get(pin)), None)
+        return bus[0], bus[1], selected
+
+    def write_level(self, pin: int, level: int) -> None:
+        self.levels[pin] = 1 if level else 0
+
+    def next_frame(self, bus: Tuple[int, int], tx: list[int]) -> list[int]:
+        key = self._key(bus)
+        where = f"spidev{bus[0]}.{bus[1]}" + (f" (RST GPIO{key[2]})" if key[2] is not None else "")
+        stream = self.streams.get(key)
+        if stream is None:
+            raise ReplayExhausted(f"trace has no traffic for {where}")
+        tx_bytes = bytes(tx)
+        with stream.lock:
+            index, how = stream.match(tx_bytes)
+            pos = stream.pos
+        with self._lock:
+            self.frames += 1
+            if how == "repeat":
+                self.repeats += 1
+            elif how == "skip":
+                self.skipped += 1
+            elif how == "none":
+                self.divergences += 1
+                if self.divergences <= 5:
+                    print(f"[PY] replay divergence on {where} at frame {pos}: tx {tx_bytes.hex()} not in trace",
+                          file=sys.stderr, flush=True)
+        if index is None:
+            if pos >= len(stream.frames):
+                raise ReplayExhausted(f"trace exhausted on {where} after {pos} frames")
+            raise ReplayDiverged(f"replay diverged on {where}: tx {tx_bytes.hex()} not in trace")
+        _, dur, _, rx = stream.frames[index]
+        if self.speed > 0 and dur:
+            time.sleep(dur * self.speed / 1_000_000)
+        if how != "repeat":
+            for delay_us, pin, level in stream.edges.get(index, ()):
+                self._fire(pin, level, delay_us * self.speed / 1_000_000)
+        return list(rx)
+
+    def _fire(self, pin: int, level: int, delay_s: float) -> None:
+        func = self.callbacks.get(pin)
+        if func is None:
+            return
+        args = (0, pin, level, int(time.monotonic() * 1e9))
+        if delay_s <= 0:
+            func(*args)
+        else:
+            threading.Timer(delay_s, func, args).start()
+
+    def read_level(self, pin: int) -> int:
+        with self._lock:
+            levels = self.reads.get(pin)
+            return levels.pop(0) if levels else 1  # idle: open-drain line pulled high
+
+    def report(self) -> None:
+        print(f"[PY] replayed {self.frames} SPI frames from {self.path}, {self.divergences} divergent "
+              f"({self.repeats} repeated, {self.skipped} resynced by skipping)", file=sys.stderr, flush=True)
+
+
+class _ReplaySpiDev:
+    def __init__(self, backend: _ReplayBackend):
+        self._backend = backend
+        self._bus = (0, 0)
+        self.max_speed_hz = 0
+        self.mode = 0
+
+    def open(self, bus: int, ce: int) -> None:
+        self._bus = (bus, ce)
+
+    def xfer2(self, data: list[int]) -> list[int]:
+        return self._backend.next_frame(self._bus, data)
+
+    def close(self) -> None:
+        pass
+
+
+class _ReplaySpiModule:
+    def __init__(self, backend: _ReplayBackend):
+        self._backend = backend
+
+    def SpiDev(self) -> _ReplaySpiDev:
+        return _ReplaySpiDev(self._backend)
+
+
+class _ReplayGpioModule:
+    """lgpio stand-in: claims and writes are accepted, reads and IRQ edges come from the trace."""
+
+    def __init__(self, backend: _ReplayBackend):
+        self._backend = backend
+        self._groups: dict[int, list[int]] = {}  # leader pin -> group pins, bit order
+        for name, value in LGPIO_CONSTANTS.items():
+            setattr(self, name, value)
+
+    def gpiochip_open(self, chip: int) -> int:
+        return 0
+
+    def gpio_read(self, handle: int, pin: int) -> int:
+        return self._backend.read_level(pin)
+
+    def callback(self, handle: int, pin: int, edge: int, func) -> _ReplayCallback:
+        self._backend.callbacks[pin] = func
+        return _ReplayCallback(self._backend, pin)
+
+    def group_claim_output(self, handle: int, gpios: list[int], levels: list[int] = (0,), flags: int = 0) -> int:
+        self._groups[gpios[0]] = list(gpios)
+        for i, pin in enumerate(gpios):
+            self._backend.write_level(pin, levels[i] if i < len(levels) else 0)
+        return 0
+
+    def group_write(self, handle: int, gpio: int, group_bits: int, group_mask: int = GROUP_ALL) -> int:
+        # RST levels pick which recorded reader answers the next frames
+        for i, pin in enumerate(self._groups.get(gpio, ())):
+            if group_mask >> i & 1:
+                self._backend.write_level(pin, group_bits >> i & 1)
+        return 0
+
+    def gpio_write(self, handle: int, pin: int, level: int) -> int:
+        self._backend.write_level(pin, level)
+        return 0
+
+    def __getattr__(self, name):
+        # gpiochip_close, gpio_claim_*, gpio_free, group_free, ...: nothing to drive
+        if name.startswith(("gpio", "group")):
+            return lambda *args, **kwargs: 0
+        raise AttributeError(name)
+
+
+def replay_backend(path: str, speed: float = 1.0):
+    """spidev/lgpio stand-ins that serve the recorded trace at path."""
+    backend = _ReplayBackend(path, speed)
+    per_bus: dict[Tuple[int, int], int] = {}
+    for (b, c, _), stream in backend.streams.items():
+        per_bus[(b, c)] = per_bus.get((b, c), 0) + len(stream.frames)
+    buses = ", ".join(f"{b}.{c}:{n}" for (b, c), n in sorted(per_bus.items()))
+    print(f"[PY] replaying {path} (frames per bus {buses or 'none'}, speed {speed:g})", file=sys.stderr, flush=True)
+    return _ReplaySpiModule(backend), _ReplayGpioModule(backend)
+
+
+# --- CLI ------------------------------------------------------------------------
+
+def _summary(records: list[tuple]) -> None:
+    counts: dict[str, int] = {}
+    per_bus: dict[Tuple[int, int], list[int]] = {}
+    for kind, _, fields, _, _ in records:
+        counts[REC_NAMES[kind]] = counts.get(REC_NAMES[kind], 0) + 1
+        if kind == REC_XFER:
+            per_bus.setdefault((fields[1], fields[2]), []).append(fields[0])
+    span = records[-1][1] / 1e6 if records else 0.0
+    print(f"records: {len(records)} over {span:.3f} s  " + " ".join(f"{k}={v}" for k, v in sorted(counts.items())))
+    for (bus, ce), durs in sorted(per_bus.items()):
+        durs.sort()
+        print(f"spidev{bus}.{ce}: {len(durs)} frames, busy {sum(durs) / 1e3:.1f} ms, "
+              f"p50 {durs[len(durs) // 2]} us, max {durs[-1]} us")
+
+
+def _dump(records: list[tuple], limit: Optional[int]) -> None:
+    for kind, t_us, fields, tx, rx in records[:limit]:
+        t = f"{t_us / 1000:10.3f}"
+        if kind == REC_XFER:
+            print(f"{t} xfer  {fields[1]}.{fields[2]} {fields[0]:5d}us tx={tx.hex()} rx={rx.hex()}")
+        elif kind == REC_SPEED:
+            print(f"{t} speed {fields[0]}.{fields[1]} {fields[2]} Hz")
+        elif kind == REC_EDGE:
+            print(f"{t} edge  {fields[0]}.{fields[1]} GPIO{fields[2]}={fields[3]}")
+        elif kind == REC_LINE:
+            print(f"{t} line  {fields[0]}.{fields[1]} GPIO{fields[2]}")
+        else:
+            print(f"{t} {REC_NAMES[kind]:5s} GPIO{fields[0]}={fields[1]}")
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect an NFC bridge SPI/GPIO trace")
+    parser.add_argument("action", choices=("summary", "dump"))
+    parser.add_argument("trace")
+    parser.add_argument("--limit", type=int, default=None, help="dump only the first N records")
+    args = parser.parse_args(argv)
+    records = read_trace(args.trace)
+    if args.action == "summary":
+        _summary(records)
+    else:
+        _dump(records, args.limit)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())